@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_IP_PATTERN = re.compile(r"\[ (\S+) \]")
+
+# Быстрые команды CLI и модули, которые они не должны загружать
+STARTUP_COMMANDS = (("status",), ("list-objects",))
+HEAVY_MODULES = ("telegram", "httpx", "processing", "notifier", "supervisor", "cluster")
+STARTUP_RUNS = 10
+# Допустимое превышение медианного времени запуска над запуском пустого интерпретатора, с
+STARTUP_BUDGET = 0.15
+
+_MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Запуск main.py как скрипта с выводом загруженных модулей из списка HEAVY_MODULES
+_LOADED_MODULES_CODE = """
+import json, runpy, sys
+sys.argv = [{path!r}, *{command!r}]
+sys.path.insert(0, {directory!r})
+try:
+    runpy.run_path({path!r}, run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))), file=sys.__stderr__)
+"""
+
+
+class FakePinger:
+    """Имитация движка проверок с интерфейсом ProbeEngine.
+
+    RTT ответивших хостов распределены логнормально вокруг rtt_median мс,
+    каждый запрос теряется с вероятностью loss, а хосты из flap_hosts не
+    отвечают в интервале [flap_at, flap_at + flap_duration) от начала теста.
+    Пакет завершается по последнему ответу или по таймауту, если есть потери.
+    Способ проверки хостов (methods) на результат не влияет. Если задано
+    total_hosts, запоминается время, за которое проверены все хосты.
+    """
+
+    def __init__(self, timeout=1.0, rtt_median=20.0, rtt_sigma=0.5, loss=0.0,
+                 flap_hosts=(), flap_at=None, flap_duration=None, seed=1, total_hosts=None):
+        from probe import ProbeResult, UNREACHABLE
+        self._result = ProbeResult
+        self._unreachable = UNREACHABLE
+        self.timeout = timeout
+        self.rtt_median = rtt_median
+        self.rtt_sigma = rtt_sigma
+        self.loss = loss
+        self.flap_hosts = set(flap_hosts)
+        self.flap_at = flap_at
+        self.flap_duration = flap_duration
+        self.total_hosts = total_hosts
+        self.started_at = time.monotonic()
+        self.probes = 0
+        self.batches = 0
+        self.batch_time = 0.0
+        self.probed = set()
+        self.coverage_time = None
+        self._random = random.Random(seed)
+
+    def flap_active(self, now=None):
+        if self.flap_at is None:
+            return False
+        elapsed = (time.monotonic() if now is None else now) - self.started_at
+        return self.flap_at <= elapsed < self.flap_at + self.flap_duration
+
+    async def sweep(self, ip_addresses, methods=None):
+        ip_addresses = list(ip_addresses)
+        if not ip_addresses:
+            return {}
+        started = time.monotonic()
+        flapping = self.flap_active(started)
+        results = {}
+        slowest = 0.0
+        for ip in ip_addresses:
+            if (flapping and ip in self.flap_hosts) or self._random.random() < self.loss:
+                results[ip] = self._unreachable
+                slowest = self.timeout * 1000
+            else:
+                rtt = self._random.lognormvariate(0, self.rtt_sigma) * self.rtt_median
+                results[ip] = self._result(True, rtt)
+                slowest = max(slowest, rtt)
+        await asyncio.sleep(min(slowest / 1000, self.timeout))
+
+        self.probes += len(ip_addresses)
+        self.batches += 1
+        self.batch_time += time.monotonic() - started
+        if self.coverage_time is None and self.total_hosts:
+            self.probed.update(ip_addresses)
+            if len(self.probed) >= self.total_hosts:
+                self.coverage_time = time.monotonic() - self.started_at
+                self.probed = set()
+        return results
+
+    async def probe(self, ip, method=None):
+        return (await self.sweep([ip]))[ip]
+
+    def close(self):
+        pass
+
+
+class DbWriteCounter:
+    """Подсчет записывающих запросов и транзакций через trace-callback соединения SQLite."""
+
+    def __init__(self):
+        self.statements = 0
+        self.transactions = 0
+
+    def __call__(self, statement):
+        keyword = statement.lstrip()[:6].upper()
+        if keyword in ("INSERT", "UPDATE", "DELETE"):
+            self.statements += 1
+        elif keyword == "COMMIT":
+            self.transactions += 1
+
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 3)
+    return {"count": len(values), "p50": pick(0.5), "p95": pick(0.95), "max": round(values[-1], 3)}
+
+
+async def _run_monitor(config, db_path):
+    import db_manager
+    import processing
+    from notifier import TelegramDispatcher, DIGEST_SEPARATOR
+    from replay import CapturingSink
+    from targets import HostSet, TargetRange
+
+    first = ipaddress.IPv4Address("10.0.0.1")
+    hosts = HostSet([TargetRange(first, first + config["hosts"] - 1)])
+    db_manager.DB_NAME = db_path
+    db_manager.initialize_db()
+    db_manager.save_object_config("bench", [TargetRange(first, first + config["hosts"] - 1)], "token", ["1"], config["delay"])
+
+    flap_count = int(config["hosts"] * config["flap_fraction"])
+    flap_hosts = random.Random(config["seed"]).sample(list(hosts), flap_count) if flap_count else []
+    engine = FakePinger(config["timeout"], config["rtt_median"], config["rtt_sigma"], config["loss"],
+                        flap_hosts, config["flap_at"], config["flap_duration"], config["seed"], len(hosts))
+    sink = CapturingSink(time.monotonic)
+    dispatcher = TelegramDispatcher(global_rate=10 ** 6, per_chat_rate=10 ** 6, bot_factory=sink.create_bot)
+
+    conn = db_manager.get_connection()
+    counter = DbWriteCounter()
+    conn.set_trace_callback(counter)
+    rows_before = conn.total_changes
+
+    object_data = {"object_name": "bench", "ip_list": hosts, "telegram_token": "token", "telegram_chat_ids": ["1"]}
+    processing.service_running = True
+    started = time.monotonic()
+    engine.started_at = started
+    monitor = asyncio.ensure_future(processing.monitor_ips_with_telegram_delay(object_data, config["delay"], engine, dispatcher))
+    await asyncio.sleep(config["duration"])
+    processing.service_running = False
+    await monitor
+    await dispatcher.drain(timeout=10)
+    elapsed = time.monotonic() - started
+    conn.set_trace_callback(None)
+
+    # Задержка обнаружения: от начала/конца отключения до уведомления по каждому хосту
+    flap_set = set(flap_hosts)
+    flap_down_at = started + config["flap_at"] if config["flap_at"] is not None else None
+    flap_up_at = flap_down_at + config["flap_duration"] if flap_down_at is not None else None
+    down_latency, up_latency = [], []
+    alerts = 0
+    for received_at, _, text in sink.messages:
+        for message in text.split(DIGEST_SEPARATOR):
+            alerts += 1
+            match = _IP_PATTERN.search(message)
+            if not match or match.group(1) not in flap_set:
+                continue
+            if "нет соединения" in message and flap_down_at is not None:
+                down_latency.append(received_at - flap_down_at)
+            elif "соединение восстановлено" in message and flap_up_at is not None and received_at >= flap_up_at:
+                up_latency.append(received_at - flap_up_at)
+
+    sweeps = elapsed / config["delay"]
+    return {
+        "elapsed": round(elapsed, 3),
+        "probes": engine.probes,
+        "probes_per_second": round(engine.probes / elapsed, 1),
+        "probe_batches": engine.batches,
+        "batch_duration_avg": round(engine.batch_time / engine.batches, 4) if engine.batches else None,
+        "coverage_time": round(engine.coverage_time, 3) if engine.coverage_time is not None else None,
+        "detection_latency_down": _percentiles(down_latency),
+        "detection_latency_up": _percentiles(up_latency),
+        "flapping_hosts": flap_count,
+        "alerts": alerts,
+        "telegram_messages": len(sink.messages),
+        "db_write_statements": counter.statements,
+        "db_transactions": counter.transactions,
+        "db_rows_changed": conn.total_changes - rows_before,
+        "db_write_statements_per_sweep": round(counter.statements / sweeps, 1),
+        "db_transactions_per_sweep": round(counter.transactions / sweeps, 1),
+    }
+
+
+def run_scenario(config):
+    """Один сценарий в чистом рабочем каталоге; возвращает словарь метрик."""
+    from log_config import setup_logging, stop_logging
+    with tempfile.TemporaryDirectory(prefix="ping_bench_") as workdir:
+        os.chdir(workdir)
+        # Журнал сценария пишется так же, как журнал сервиса: через очередь и поток записи
+        setup_logging(os.path.join(workdir, "bench.log"))
+        if config["tracemalloc"]:
+            tracemalloc.start()
+        try:
+            result = asyncio.run(_run_monitor(config, os.path.join(workdir, "bench.db")))
+        finally:
+            stop_logging()
+        if config["tracemalloc"]:
+            result["tracemalloc_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+        result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result["hosts"] = config["hosts"]
+    return result
+
+
+def _median_runtime(command, workdir, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def measure_startup(runs=STARTUP_RUNS):
+    """Время запуска быстрых команд main.py и загружаемые ими тяжелые модули."""
+    with tempfile.TemporaryDirectory(prefix="ping_startup_") as workdir:
+        baseline = _median_runtime([sys.executable, "-c", "pass"], workdir, runs)
+        commands = {}
+        for command in STARTUP_COMMANDS:
+            median = _median_runtime([sys.executable, _MAIN_PATH, *command], workdir, runs)
+            code = _LOADED_MODULES_CODE.format(path=_MAIN_PATH, directory=os.path.dirname(_MAIN_PATH),
+                                               command=list(command), heavy=list(HEAVY_MODULES))
+            completed = subprocess.run([sys.executable, "-c", code], cwd=workdir, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, text=True)
+            loaded = json.loads(completed.stderr.strip().splitlines()[-1])
+            commands[" ".join(command)] = {
+                "median_s": round(median, 3),
+                "overhead_s": round(median - baseline, 3),
+                "heavy_modules": loaded,
+                "ok": not loaded and median - baseline <= STARTUP_BUDGET,
+            }
+    return {"interpreter_s": round(baseline, 3), "budget_s": STARTUP_BUDGET, "commands": commands}
+
+
+def _run_isolated(config):
+    """Запуск сценария в отдельном процессе, чтобы пиковая память не накапливалась между сценариями."""
+    # Процесс завершается штатно: terminate() при выходе из with не останавливает его,
+    # так как processing перехватывает SIGTERM
+    pool = multiprocessing.get_context("spawn").Pool(1)
+    try:
+        return pool.apply(run_scenario, (config,))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест мониторинга на имитации сети: ObjectMonitor с поддельным пингером "
+                    "(задержки, потери и отключения хостов), поддельным Telegram и временной базой SQLite. "
+                    "Результаты выводятся в JSON, чтобы отслеживать регрессии между версиями.",
+        epilog="Пример: python3 benchmark.py --hosts 1000 10000 50000 --duration 30 --output bench.json")
+    parser.add_argument("--hosts", type=int, nargs="+", default=[1000, 10000, 50000], help="размеры объекта")
+    parser.add_argument("--duration", type=float, default=30, help="длительность сценария, с")
+    parser.add_argument("--delay", type=int, default=5, help="задержка объекта (интервал проверок), с")
+    parser.add_argument("--timeout", type=float, default=1.0, help="таймаут проверки, с")
+    parser.add_argument("--rtt-median", type=float, default=20.0, help="медиана RTT, мс")
+    parser.add_argument("--rtt-sigma", type=float, default=0.5, help="разброс логнормального RTT")
+    parser.add_argument("--loss", type=float, default=0.0, help="вероятность потери запроса")
+    parser.add_argument("--flap-fraction", type=float, default=0.05, help="доля отключаемых хостов")
+    parser.add_argument("--flap-at", type=float, default=8.0, help="начало отключения от старта, с")
+    parser.add_argument("--flap-duration", type=float, default=12.0, help="длительность отключения, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="измерять пик памяти Python (замедляет работу)")
+    parser.add_argument("--startup", action="store_true",
+                        help="измерить время запуска быстрых команд main.py; код завершения 1, если они "
+                             "загружают модули мониторинга или не укладываются в бюджет")
+    parser.add_argument("--output", help="файл для JSON с результатами (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    exit_code = 0
+    if args.startup:
+        startup = measure_startup()
+        for command, result in startup["commands"].items():
+            print(f"main.py {command}: {result['median_s']} с (интерпретатор {startup['interpreter_s']} с), "
+                  f"тяжелые модули: {', '.join(result['heavy_modules']) or 'нет'}", file=sys.stderr)
+            if not result["ok"]:
+                exit_code = 1
+        report = {"timestamp": int(time.time()), "python": sys.version.split()[0], "startup": startup}
+    else:
+        base_config = {key: value for key, value in vars(args).items() if key not in ("hosts", "output", "startup")}
+        results = []
+        for hosts in args.hosts:
+            result = _run_isolated(dict(base_config, hosts=hosts))
+            results.append(result)
+            print(f"{hosts} хостов: {result['probes_per_second']} проверок/с, "
+                  f"обнаружение p95 {result['detection_latency_down']['p95']} с", file=sys.stderr)
+        report = {"timestamp": int(time.time()), "python": sys.version.split()[0], "config": base_config,
+                  "results": results}
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,673 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import socket
+import struct
+import zlib
+import processing
+from probe import ProbeEngine, parse_probe_method, format_probe_method
+from processing import ObjectMonitor, sleep_while_running, reset_ip_statuses
+from supervisor import load_all_objects, run_objects
+from db_manager import record_rtt_sample
+from debounce import HostState, Transition, INIT, CONFIRMED
+from latency import LatencySummary, DEGRADED, NORMAL
+from targets import HostSet, parse_target, format_target
+from metrics import (METRICS_PORT, AGENTS_CONNECTED, AGENT_ERRORS, PROBE_INTERVAL, PROBE_TIMEOUTS,
+                     start_metrics_server)
+from status_api import register_monitor, unregister_monitor
+from endpoints import COLLECTOR_HOST, COLLECTOR_PORT
+
+# Интервал служебных сообщений и время молчания, после которого соединение считается потерянным (в секундах)
+HEARTBEAT_INTERVAL = 5
+AGENT_TIMEOUT = 15
+# Интервал отправки отчетов агента и сводок RTT в них (в секундах)
+REPORT_INTERVAL = 1
+RTT_REPORT_INTERVAL = 10
+# Задержка повторного подключения агента (удваивается до максимума)
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Кадр: длина данных, тип сообщения
+_HEADER = struct.Struct("!IB")
+MSG_HELLO = 1
+# Назначение объекта агенту или новая конфигурация уже назначенного объекта
+MSG_ASSIGN = 2
+# Отчеты агента: переходы, статусы и сводки RTT по объектам
+MSG_REPORT = 3
+MSG_HEARTBEAT = 4
+# Объект снят с агента: данные — имя объекта
+MSG_RELEASE = 5
+
+
+def parse_address(value, default_port=COLLECTOR_PORT):
+    """Разбор адреса вида host:port, [ipv6]:port или host."""
+    host, separator, port = value.rpartition(":")
+    if not separator or (host.count(":") and not host.startswith("[")):
+        host, port = value, default_port
+    host = host.strip("[]") or COLLECTOR_HOST
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"Некорректный порт в адресе {value}")
+    return host, port
+
+
+async def read_frame(reader):
+    """Чтение одного кадра. Возвращает (тип, данные)."""
+    length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Слишком большой кадр: {length} байт")
+    return kind, await reader.readexactly(length) if length else b""
+
+
+def write_frame(writer, kind, payload=b""):
+    writer.write(_HEADER.pack(len(payload), kind) + payload)
+
+
+def encode_message(data):
+    return zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+def decode_message(payload):
+    """Разбор сжатого JSON-сообщения. ValueError, если данные повреждены."""
+    try:
+        return json.loads(zlib.decompress(payload))
+    except zlib.error as e:
+        raise ValueError(f"поврежденное сообщение: {e}")
+
+
+def _weight(object_name, agent_name):
+    digest = hashlib.blake2b(f"{object_name}\0{agent_name}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ReportedLatency:
+    """Качество связи хостов по отчетам агента: последний RTT, деградация и сводка для уведомлений.
+
+    Заменяет LatencyStats в мониторе коллектора: замеры и оценку деградации ведет агент.
+    """
+
+    def __init__(self, rtt_threshold=None, loss_threshold=None):
+        self.rtt_threshold = rtt_threshold
+        self.loss_threshold = loss_threshold
+        self._last = {}
+        self._summaries = {}
+        self._degraded = set()
+
+    def set_thresholds(self, rtt_threshold=None, loss_threshold=None):
+        self.rtt_threshold = rtt_threshold
+        self.loss_threshold = loss_threshold
+
+    def update(self, ip, rtt):
+        self._last[ip] = rtt
+
+    def set_quality(self, ip, is_degraded, summary):
+        self._summaries[ip] = summary
+        if is_degraded:
+            self._degraded.add(ip)
+        else:
+            self._degraded.discard(ip)
+
+    def remove(self, ip):
+        self._last.pop(ip, None)
+        self._summaries.pop(ip, None)
+        self._degraded.discard(ip)
+
+    def last(self, ip):
+        return self._last.get(ip)
+
+    def is_degraded(self, ip):
+        return ip in self._degraded
+
+    def summary(self, ip):
+        return self._summaries.get(ip)
+
+
+class RemoteMonitor(ObjectMonitor):
+    """Монитор объекта на коллекторе.
+
+    Расписание проверок, подавление дребезга и учет родительских узлов ведет
+    агент, которому назначен объект, а коллектор применяет его отчеты:
+    записывает статусы и историю, отправляет уведомления и держит копию
+    состояний хостов для снимков, /status и передачи объекта другому агенту.
+    """
+
+    def __init__(self, collector, object_data, delay, notifier):
+        super().__init__(object_data, delay, None, notifier)
+        self.collector = collector
+        self.latency = ReportedLatency(self.latency.rtt_threshold, self.latency.loss_threshold)
+
+    def _set_trace(self, enabled):
+        # Трассу пишет агент: результаты отдельных проверок до коллектора не доходят
+        self.probe_trace = bool(enabled)
+
+    async def run(self):
+        """Назначение объекта агенту и применение отчетов до остановки сервиса."""
+        if not self.restore_state():
+            reset_ip_statuses(self.object_name)
+        self._schedule_hosts()
+        PROBE_INTERVAL.set(self.delay, self.object_name)
+        register_monitor(self)
+        self.collector.attach(self)
+        try:
+            await asyncio.gather(self._config_loop(), self._snapshot_loop())
+        finally:
+            self.collector.detach(self)
+            unregister_monitor(self)
+            self.save_state()
+
+    def reload(self):
+        super().reload()
+        self.collector.push(self.object_name)
+
+    def assignment(self):
+        """Конфигурация и текущее состояние хостов объекта для агента."""
+        return {
+            "object": self.object_name,
+            "targets": [format_target(target_range) for target_range in self.ip_addresses.ranges()],
+            "config": {
+                "delay": self.delay,
+                "config_version": self.config_version,
+                "extended_logging": self.extended_logging,
+                "probe_log_sample_rate": self.probe_log_sample_rate,
+                "degraded_rtt": self.latency.rtt_threshold,
+                "degraded_loss": self.latency.loss_threshold,
+                "probe_method": format_probe_method(self.probe_method),
+                "probe_trace": self.probe_trace,
+            },
+            "overrides": {ip: list(override) for ip, override in self._overrides.items()},
+            "methods": {ip: format_probe_method(method) for ip, method in self._probe_methods.items()},
+            "parents": self.topology.parents,
+            "states": self.tracker.snapshot(),
+            "via_parent": sorted(self.unreachable_via_parent),
+        }
+
+    def apply_report(self, report):
+        """Применение отчета агента: переходы, качество связи, статусы и сводки RTT."""
+        confirmed = []
+        now = report.get("time")
+        hosts = self.tracker.hosts
+        for ip, kind, is_reachable, state, ts in report.get("transitions", ()):
+            # Хост мог быть удален из конфигурации, пока отчет был в пути
+            if ip not in self.scheduler:
+                continue
+            host = hosts.get(ip)
+            if host is None:
+                host = hosts[ip] = HostState()
+            host.state = state
+            if kind in (INIT, CONFIRMED):
+                host.changed_at = ts
+            transition = Transition(ip, kind, is_reachable, state)
+            if self._handle_transition(transition, ts):
+                confirmed.append(transition)
+        for ip, kind, summary in report.get("quality", ()):
+            if ip not in self.scheduler:
+                continue
+            self.latency.set_quality(ip, kind == DEGRADED, LatencySummary(*summary) if summary else None)
+            self._log_quality(ip, kind)
+            confirmed.append(Transition(ip, kind, True, kind))
+        for ip, status in report.get("statuses", {}).items():
+            if ip not in self.scheduler:
+                continue
+            self._pending_statuses[ip] = status
+            if status == processing.VIA_PARENT_STATUS:
+                self.unreachable_via_parent.add(ip)
+            else:
+                self.unreachable_via_parent.discard(ip)
+        lost_total = 0
+        for ip, (count, lost, rtt_sum, last) in report.get("rtt", {}).items():
+            if ip not in self.scheduler:
+                continue
+            self.latency.update(ip, last)
+            lost_total += lost
+            if self.record_rtt:
+                # В истории RTT распределенного мониторинга — среднее за интервал отчета
+                record_rtt_sample(self.object_name, ip, rtt_sum / (count - lost) if count > lost else None, now)
+        if lost_total:
+            PROBE_TIMEOUTS.inc(self.object_name, amount=lost_total)
+        self._commit(confirmed, now)
+
+
+class AgentMonitor(ObjectMonitor):
+    """Проверки назначенного объекта на агенте.
+
+    Агент ведет расписание проверок, подавление дребезга и учет родительских
+    узлов так же, как локальный мониторинг, но вместо записи в базу и
+    уведомлений накапливает переходы, статусы и сводки RTT для отчета
+    коллектору. База данных агенту не нужна: конфигурация и начальное
+    состояние хостов приходят в назначении.
+    """
+
+    def __init__(self, assignment, engine):
+        self.assignment = assignment
+        object_data = {"object_name": assignment["object"], "ip_list": self._load_hosts()}
+        super().__init__(object_data, assignment["config"]["delay"], engine, None)
+        self.tracker.restore(assignment["states"])
+        self.unreachable_via_parent = set(assignment["via_parent"])
+        self._transitions = []
+        self._quality = []
+        self._statuses = {}
+        # ip -> [проверок, без ответа, сумма RTT, последний RTT] с момента предыдущей сводки
+        self._rtt = {}
+        self._error = None
+        self._failing = False
+
+    def _load_config(self):
+        config = dict(self.assignment["config"])
+        config["probe_method"] = parse_probe_method(config["probe_method"])
+        # История RTT ведется коллектором по сводкам агента
+        config["rtt_history"] = False
+        config["telegram_token"] = None
+        config["telegram_chat_ids"] = []
+        return config
+
+    def _load_hosts(self):
+        return HostSet(map(parse_target, self.assignment["targets"]))
+
+    def _load_host_settings(self):
+        assignment = self.assignment
+        return ({ip: tuple(override) for ip, override in assignment["overrides"].items()},
+                {ip: parse_probe_method(spec) for ip, spec in assignment["methods"].items()},
+                assignment["parents"])
+
+    def apply(self, assignment):
+        """Новая конфигурация объекта: применяется без потери расписания и состояний хостов."""
+        self.assignment = assignment
+        self.reload()
+
+    async def run(self):
+        """Проверки объекта до снятия назначения или остановки сервиса."""
+        self._schedule_hosts()
+        try:
+            await asyncio.gather(self._sweep_loop(), self._confirm_loop())
+        finally:
+            for batch in list(self._batches):
+                batch.cancel()
+            self._set_trace(False)
+
+    async def _timed_sweep(self, ip_addresses, kind):
+        try:
+            results = await super()._timed_sweep(ip_addresses, kind)
+        except Exception as e:
+            # Коллектор узнает об ошибке из отчета один раз, пока проверки не восстановятся
+            if not self._failing:
+                self._failing = True
+                self._error = str(e)
+                logging.error(f"Ошибка проверок объекта '{self.object_name}': {e}")
+            return {}
+        self._failing = False
+        return results
+
+    async def _process_results(self, results):
+        for ip, probe_result in results.items():
+            entry = self._rtt.get(ip)
+            if entry is None:
+                entry = self._rtt[ip] = [0, 0, 0.0, None]
+            entry[0] += 1
+            if probe_result.reachable and probe_result.rtt is not None:
+                entry[2] += probe_result.rtt
+                entry[3] = probe_result.rtt
+            else:
+                entry[1] += 1
+                entry[3] = None
+        await super()._process_results(results)
+
+    def _handle_transition(self, transition, now=None):
+        self._transitions.append([transition.ip, transition.kind, transition.is_reachable, transition.state, now])
+        if transition.kind != CONFIRMED:
+            return False
+        if transition.is_reachable:
+            self.latency.remove(transition.ip)
+        else:
+            self._degraded_alerted.discard(transition.ip)
+        return True
+
+    def _log_quality(self, ip, quality):
+        # Изменение качества связи журналирует коллектор
+        pass
+
+    def _commit(self, confirmed, now=None):
+        for transition in confirmed:
+            if transition.kind in (DEGRADED, NORMAL):
+                summary = self.latency.summary(transition.ip)
+                self._quality.append([transition.ip, transition.kind, list(summary) if summary else None])
+        if self._pending_statuses:
+            self._statuses.update(self._pending_statuses)
+            self._pending_statuses = {}
+
+    def take_report(self, with_rtt=False):
+        """Накопленные с прошлого отчета изменения или None, если отправлять нечего."""
+        report = {}
+        if self._transitions:
+            report["transitions"], self._transitions = self._transitions, []
+        if self._quality:
+            report["quality"], self._quality = self._quality, []
+        if self._statuses:
+            report["statuses"], self._statuses = self._statuses, {}
+        if with_rtt and self._rtt:
+            report["rtt"], self._rtt = self._rtt, {}
+        if self._error is not None:
+            report["error"], self._error = self._error, None
+        if not report:
+            return None
+        report["object"] = self.object_name
+        report["time"] = self.clock()
+        return report
+
+
+class _AgentConnection:
+    """Подключенный агент."""
+
+    __slots__ = ("name", "writer")
+
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+
+
+class Collector:
+    """Коллектор распределенного мониторинга.
+
+    Коллектор ведет статусы, историю и уведомления всех объектов, а
+    проверки с расписанием и подавлением дребезга выполняют подключенные
+    агенты и присылают только переходы, статусы и сводки RTT. Каждый объект
+    назначается одному агенту по rendezvous-хешированию: при отключении
+    агента его объекты вместе с последними состояниями хостов переходят к
+    остальным, при подключении нового переносится только часть объектов.
+    Пока агентов нет, проверки не выполняются и статусы хостов не меняются.
+    """
+
+    def __init__(self, host=COLLECTOR_HOST, port=COLLECTOR_PORT, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.agents = {}
+        self.assignments = {}
+        self.monitors = {}
+        self._server = None
+        self._warned = set()
+        # Задачи обработки подключенных агентов, которые отменяются при остановке
+        self._handlers = set()
+
+    def monitor(self, object_data, delay, engine, notifier):
+        """Монитор объекта для run_objects: проверки выполняет назначенный агент."""
+        return RemoteMonitor(self, object_data, delay, notifier)
+
+    def attach(self, monitor):
+        self.monitors[monitor.object_name] = monitor
+        self._rebalance()
+
+    def detach(self, monitor):
+        if self.monitors.get(monitor.object_name) is not monitor:
+            return
+        del self.monitors[monitor.object_name]
+        agent = self.agents.get(self.assignments.pop(monitor.object_name, None))
+        if agent is not None:
+            write_frame(agent.writer, MSG_RELEASE, monitor.object_name.encode("utf-8"))
+
+    def push(self, object_name):
+        """Отправка изменившейся конфигурации объекта назначенному агенту."""
+        agent = self.agents.get(self.assignments.get(object_name))
+        if agent is not None:
+            self._assign(agent, self.monitors[object_name])
+
+    def _assign(self, agent, monitor):
+        write_frame(agent.writer, MSG_ASSIGN, encode_message(monitor.assignment()))
+
+    def _rebalance(self, connected=None):
+        """Назначение объектов агентам. Объекты агента connected назначаются заново, даже если не переходят."""
+        for object_name, monitor in self.monitors.items():
+            agent_name = max(self.agents, key=lambda name: _weight(object_name, name)) if self.agents else None
+            previous = self.assignments.get(object_name)
+            if previous == agent_name and agent_name != connected:
+                continue
+            self.assignments[object_name] = agent_name
+            if previous != agent_name and previous in self.agents:
+                write_frame(self.agents[previous].writer, MSG_RELEASE, object_name.encode("utf-8"))
+            if agent_name is None:
+                if object_name not in self._warned:
+                    self._warned.add(object_name)
+                    logging.warning(f"Нет подключенных агентов для объекта '{object_name}', проверки приостановлены.")
+                continue
+            self._warned.discard(object_name)
+            logging.info(f"Объект '{object_name}' назначен агенту {agent_name}.")
+            self._assign(self.agents[agent_name], monitor)
+        AGENTS_CONNECTED.set(len(self.agents))
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_agent, self.host, self.port)
+        # Порт 0 — любой свободный порт
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Коллектор принимает подключения агентов на {self.host}:{self.port}.")
+
+    async def close(self):
+        """Остановка приема подключений и завершение обработки подключенных агентов."""
+        if self._server is not None:
+            self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    async def _heartbeat(self, writer):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            write_frame(writer, MSG_HEARTBEAT)
+
+    async def _handle_agent(self, reader, writer):
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        try:
+            await self._serve_agent(reader, writer)
+        except asyncio.CancelledError:
+            # Отмена при остановке коллектора: задача завершается штатно, иначе asyncio журналирует ошибку
+            pass
+        finally:
+            self._handlers.discard(handler)
+
+    async def _serve_agent(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            kind, payload = await asyncio.wait_for(read_frame(reader), AGENT_TIMEOUT)
+            hello = json.loads(payload) if kind == MSG_HELLO else {}
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logging.warning(f"Подключение {peer} отклонено: {e}")
+            writer.close()
+            return
+        name = str(hello.get("name") or peer)
+        if self.token and not hmac.compare_digest(str(hello.get("token") or ""), self.token):
+            logging.warning(f"Агент {name} ({peer}) отклонен: неверный токен.")
+            writer.close()
+            return
+
+        previous = self.agents.get(name)
+        if previous is not None:
+            previous.writer.close()
+        agent = self.agents[name] = _AgentConnection(name, writer)
+        logging.info(f"Агент {name} подключен ({peer}).")
+        self._rebalance(connected=name)
+        heartbeat = asyncio.ensure_future(self._heartbeat(writer))
+        try:
+            while True:
+                kind, payload = await asyncio.wait_for(read_frame(reader), AGENT_TIMEOUT)
+                if kind == MSG_REPORT:
+                    self._apply_reports(agent, payload)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logging.warning(f"Соединение с агентом {name} потеряно: {e or type(e).__name__}")
+        finally:
+            heartbeat.cancel()
+            writer.close()
+            if self.agents.get(name) is agent:
+                del self.agents[name]
+                self._rebalance()
+
+    def _apply_reports(self, agent, payload):
+        try:
+            reports = decode_message(payload)
+        except ValueError as e:
+            logging.error(f"Отчет агента {agent.name} отброшен: {e}")
+            return
+        for report in reports:
+            object_name = report.get("object")
+            monitor = self.monitors.get(object_name)
+            # Отчет, отправленный до передачи объекта другому агенту, не применяется
+            if monitor is None or self.assignments.get(object_name) != agent.name:
+                continue
+            if report.get("error"):
+                AGENT_ERRORS.inc(object_name)
+                logging.error(f"Агент {agent.name} не выполняет проверки объекта '{object_name}': {report['error']}")
+            try:
+                monitor.apply_report(report)
+            except Exception as e:
+                logging.error(f"Ошибка применения отчета агента {agent.name} для объекта '{object_name}': {e}")
+
+
+class ProbeAgent:
+    """Агент проверок: ведет назначенные коллектором объекты своим движком и отправляет отчеты.
+
+    Назначения живут, пока есть соединение: после переподключения коллектор
+    назначает объекты заново вместе с последними известными ему состояниями хостов.
+    """
+
+    def __init__(self, host=COLLECTOR_HOST, port=COLLECTOR_PORT, name=None, token=None, engine=None):
+        self.host = host
+        self.port = port
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.token = token
+        self.engine = engine
+        # object_name -> (AgentMonitor, задача проверок)
+        self.monitors = {}
+        self.reports = 0
+        self._frames = 0
+
+    async def run(self):
+        """Подключение к коллектору и выполнение назначенных проверок до остановки сервиса."""
+        delay = RECONNECT_DELAY
+        while processing.service_running:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                logging.warning(f"Коллектор {self.host}:{self.port} недоступен ({e}), повтор через {delay} с.")
+                await sleep_while_running(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            logging.info(f"Агент {self.name} подключен к коллектору {self.host}:{self.port}.")
+            self._frames = 0
+            try:
+                await self._serve(reader, writer)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+                logging.warning(f"Соединение с коллектором потеряно: {e or type(e).__name__}")
+            finally:
+                writer.close()
+                await self._stop_all()
+            # Коллектор, закрывший соединение без единого сообщения (например, из-за токена), опрашивается реже
+            delay = RECONNECT_DELAY if self._frames else min(delay * 2, MAX_RECONNECT_DELAY)
+            if processing.service_running:
+                await sleep_while_running(delay)
+
+    async def _heartbeat(self, writer):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            write_frame(writer, MSG_HEARTBEAT)
+
+    async def _report_loop(self, writer):
+        """Отправка накопленных изменений всех объектов одним кадром; сводки RTT — раз в RTT_REPORT_INTERVAL."""
+        loop = asyncio.get_running_loop()
+        next_rtt = loop.time() + RTT_REPORT_INTERVAL
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            with_rtt = loop.time() >= next_rtt
+            if with_rtt:
+                next_rtt += RTT_REPORT_INTERVAL
+            self._send_reports(writer, [monitor for monitor, _ in self.monitors.values()], with_rtt)
+
+    def _send_reports(self, writer, monitors, with_rtt=False):
+        reports = [report for report in (monitor.take_report(with_rtt) for monitor in monitors) if report]
+        if reports and not writer.is_closing():
+            write_frame(writer, MSG_REPORT, encode_message(reports))
+            self.reports += 1
+
+    async def _serve(self, reader, writer):
+        hello = {"name": self.name}
+        if self.token:
+            hello["token"] = self.token
+        write_frame(writer, MSG_HELLO, json.dumps(hello).encode("utf-8"))
+        tasks = [asyncio.ensure_future(self._heartbeat(writer)), asyncio.ensure_future(self._report_loop(writer))]
+        try:
+            while processing.service_running:
+                kind, payload = await asyncio.wait_for(read_frame(reader), AGENT_TIMEOUT)
+                self._frames += 1
+                if kind == MSG_ASSIGN:
+                    self._assign(decode_message(payload))
+                elif kind == MSG_RELEASE:
+                    await self._release(payload.decode("utf-8"))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _assign(self, assignment):
+        object_name = assignment["object"]
+        running = self.monitors.get(object_name)
+        if running is not None:
+            running[0].apply(assignment)
+            return
+        monitor = AgentMonitor(assignment, self.engine)
+        task = asyncio.ensure_future(monitor.run())
+        task.add_done_callback(lambda done: self._finished(object_name, done))
+        self.monitors[object_name] = (monitor, task)
+        logging.info(f"Агент {self.name} начал проверки объекта '{object_name}': хостов {len(monitor.ip_addresses)}.")
+
+    def _finished(self, object_name, task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Проверки объекта '{object_name}' завершились с ошибкой: {task.exception()}")
+
+    async def _release(self, object_name):
+        running = self.monitors.pop(object_name, None)
+        if running is None:
+            return
+        _, task = running
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        logging.info(f"Объект '{object_name}' снят с агента {self.name}.")
+
+    async def _stop_all(self):
+        running, self.monitors = self.monitors, {}
+        for _, task in running.values():
+            task.cancel()
+        if running:
+            await asyncio.gather(*(task for _, task in running.values()), return_exceptions=True)
+
+
+async def run_collector(host=COLLECTOR_HOST, port=COLLECTOR_PORT, token=None, metrics_port=METRICS_PORT):
+    """Мониторинг всех объектов из базы данных с проверками на подключенных агентах."""
+    objects = load_all_objects()
+    if not objects:
+        logging.error("Объекты для мониторинга отсутствуют в базе данных.")
+        return
+    collector = Collector(host, port, token)
+    await collector.start()
+    try:
+        await run_objects(objects, metrics_port=metrics_port, monitor_factory=collector.monitor)
+    finally:
+        await collector.close()
+
+
+async def run_agent(host=COLLECTOR_HOST, port=COLLECTOR_PORT, name=None, token=None, engine=None, metrics_port=None):
+    """Работа агента проверок до остановки сервиса. Метрики проверок публикуются на metrics_port, если он задан."""
+    own_engine = engine is None
+    if own_engine:
+        engine = ProbeEngine()
+    metrics_server = await start_metrics_server(metrics_port) if metrics_port else None
+    try:
+        await ProbeAgent(host, port, name, token, engine).run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        if own_engine:
+            engine.close()
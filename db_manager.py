@@ -1,11 +1,29 @@
 ### db_manager.py
+import os
+import time
+import json
+import zlib
 import sqlite3
 import logging
+import ipaddress
+import threading
 from datetime import datetime
+from targets import TargetRange, HostSet, coalesce_ranges, format_target, parse_target, check_host_count
+from metrics import DB_QUERY_DURATION
+from probe import ICMP, parse_probe_method, format_probe_method
 
 DB_NAME = "config.db"
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Размер кэша подготовленных выражений на одно соединение
+STATEMENT_CACHE_SIZE = 256
+
+# Долгоживущее соединение на поток; после fork соединение открывается заново
+_local = threading.local()
+
+# Кэш имен IP: (ip_address, object_name) -> ip_name
+_ip_name_cache = {}
+# Объекты, имена IP которых уже загружены в кэш целиком
+_loaded_name_objects = set()
 
 def ensure_column_exists(table_name, column_name, column_definition):
     """
@@ -23,10 +41,38 @@ def ensure_column_exists(table_name, column_name, column_definition):
         logging.error(f"Ошибка при добавлении колонки '{column_name}' в таблицу '{table_name}': {e}")
 
 
+def get_connection():
+    """Долгоживущее соединение с базой данных для текущего потока и процесса."""
+    key = (os.getpid(), DB_NAME)
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        if _local.key == key:
+            return conn
+        # Путь к базе изменился (например, копия при воспроизведении трассы): прежнее соединение закрывается.
+        # Соединение, унаследованное через fork, принадлежит родительскому процессу
+        if _local.key[0] == key[0]:
+            conn.close()
+        _local.conn = None
+    conn = sqlite3.connect(DB_NAME, cached_statements=STATEMENT_CACHE_SIZE)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    except sqlite3.Error as e:
+        logging.error(f"Не удалось включить режим WAL: {e}")
+    _local.conn = conn
+    _local.key = key
+    return conn
+
+def close_connection():
+    """Закрытие соединения текущего потока."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key[0] == os.getpid():
+        conn.close()
+    _local.conn = None
+
 def initialize_db():
-    ensure_column_exists("ip_names", "connection_status", "TEXT DEFAULT NULL")
     """Инициализация базы данных."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     c = conn.cursor()
     try:
         c.execute("""
@@ -48,43 +94,355 @@ def initialize_db():
             PRIMARY KEY (ip_address, object_name)
         )
         """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS object_targets (
+            object_name TEXT NOT NULL,
+            start_ip NOT NULL,
+            end_ip NOT NULL,
+            PRIMARY KEY (object_name, start_ip)
+        ) WITHOUT ROWID
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS monitor_snapshots (
+            object_name TEXT PRIMARY KEY,
+            saved_at REAL NOT NULL,
+            data BLOB NOT NULL
+        )
+        """)
+        create_history_tables(c)
         logging.info("База данных успешно инициализирована.")
     except sqlite3.Error as e:
         logging.error(f"Ошибка при создании базы данных: {e}")
     finally:
         conn.commit()
-        conn.close()
+    # Колонки, добавленные после первых версий: добавляются после создания таблиц
+    ensure_column_exists("ip_names", "connection_status", "TEXT DEFAULT NULL")
+    ensure_column_exists("objects", "rtt_history", "INTEGER DEFAULT 0")
+    ensure_column_exists("ip_names", "probe_interval", "INTEGER DEFAULT NULL")
+    ensure_column_exists("ip_names", "probe_priority", "INTEGER DEFAULT 0")
+    ensure_column_exists("objects", "config_version", "INTEGER DEFAULT 0")
+    ensure_column_exists("ip_names", "parent_ip", "TEXT DEFAULT NULL")
+    ensure_column_exists("objects", "degraded_rtt", "REAL DEFAULT NULL")
+    ensure_column_exists("objects", "degraded_loss", "REAL DEFAULT NULL")
+    ensure_column_exists("objects", "probe_method", "TEXT DEFAULT NULL")
+    ensure_column_exists("ip_names", "probe_method", "TEXT DEFAULT NULL")
+    ensure_column_exists("objects", "probe_trace", "INTEGER DEFAULT 0")
+    ensure_column_exists("objects", "probe_log_sample_rate", "REAL DEFAULT NULL")
+    migrate_object_targets()
 
 def execute_query(query, params=None):
     """Выполнение запроса к базе данных."""
-    conn = sqlite3.connect(DB_NAME)
+    started = time.perf_counter()
+    conn = get_connection()
     c = conn.cursor()
     try:
         if params:
             c.execute(query, params)
         else:
             c.execute(query)
-        conn.commit()
-        return c.fetchall()
+        rows = c.fetchall()
+        if conn.in_transaction:
+            conn.commit()
+        return rows
     except sqlite3.Error as e:
         logging.error(f"Ошибка выполнения запроса: {e}")
+        if conn.in_transaction:
+            conn.rollback()
         return None
     finally:
-        conn.close()
+        c.close()
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, "query")
+
+def execute_many(query, params_seq):
+    """Выполнение запроса для набора параметров в одной транзакции."""
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        with conn:
+            conn.executemany(query, params_seq)
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка пакетного выполнения запроса: {e}")
+        return False
+    finally:
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, "many")
+
+def invalidate_ip_names(object_name=None):
+    """Сброс кэша имен IP для объекта (или целиком)."""
+    if object_name is None:
+        _ip_name_cache.clear()
+        _loaded_name_objects.clear()
+        return
+    for key in [key for key in _ip_name_cache if key[1] == object_name]:
+        del _ip_name_cache[key]
+    _loaded_name_objects.discard(object_name)
+
+def load_ip_names(object_name):
+    """Загрузка всех имен IP объекта в кэш одним запросом."""
+    query = "SELECT ip_address, ip_name FROM ip_names WHERE object_name = ?"
+    results = execute_query(query, (object_name,))
+    if results is None:
+        return
+    for ip_address, ip_name in results:
+        _ip_name_cache[(ip_address, object_name)] = ip_name
+    _loaded_name_objects.add(object_name)
+
+def get_ip_name(ip_address, object_name):
+    """Имя IP из кэша. Возвращает None, если имя не задано."""
+    if object_name not in _loaded_name_objects:
+        load_ip_names(object_name)
+    return _ip_name_cache.get((ip_address, object_name))
+
+def peek_ip_name(ip_address, object_name):
+    """Имя IP, если оно уже загружено в кэш; к базе не обращается."""
+    return _ip_name_cache.get((ip_address, object_name))
+
+def save_ip_statuses(object_name, statuses):
+    """Пакетная запись статусов: statuses — последовательность пар (ip_address, connection_status)."""
+    query = """
+    INSERT INTO ip_names (ip_address, object_name, connection_status) VALUES (?, ?, ?)
+    ON CONFLICT (ip_address, object_name) DO UPDATE SET connection_status = excluded.connection_status
+    """
+    return execute_many(query, [(ip_address, object_name, status) for ip_address, status in statuses])
+
+def load_ip_statuses(object_name):
+    """Сохраненные статусы IP объекта: {ip: статус}."""
+    query = "SELECT ip_address, connection_status FROM ip_names WHERE object_name = ? AND connection_status IS NOT NULL"
+    return dict(execute_query(query, (object_name,)) or [])
+
+def save_monitor_snapshot(object_name, hosts, schedule=None):
+    """Запись снимка состояния мониторинга.
+
+    hosts — список [ip, состояние, подтверждения, время изменения],
+    schedule — положение хостов в расписании (ProbeScheduler.snapshot).
+    """
+    snapshot = {"hosts": hosts, "schedule": schedule or {}}
+    data = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode())
+    query = """
+    INSERT INTO monitor_snapshots (object_name, saved_at, data) VALUES (?, ?, ?)
+    ON CONFLICT (object_name) DO UPDATE SET saved_at = excluded.saved_at, data = excluded.data
+    """
+    execute_query(query, (object_name, time.time(), data))
+
+def load_monitor_snapshot(object_name):
+    """Снимок состояния мониторинга объекта: (время записи, список хостов, расписание) или None."""
+    result = execute_query("SELECT saved_at, data FROM monitor_snapshots WHERE object_name = ?", (object_name,))
+    if not result:
+        return None
+    saved_at, data = result[0]
+    try:
+        snapshot = json.loads(zlib.decompress(data))
+        # Снимки прежнего формата содержат только список хостов
+        if isinstance(snapshot, list):
+            snapshot = {"hosts": snapshot}
+        hosts, schedule = snapshot["hosts"], snapshot.get("schedule") or {}
+        if not isinstance(hosts, list) or not isinstance(schedule, dict):
+            raise ValueError("неверная структура снимка")
+        return saved_at, hosts, schedule
+    except (zlib.error, ValueError, TypeError, KeyError) as e:
+        logging.error(f"Снимок состояния объекта '{object_name}' поврежден: {e}")
+        return None
+
+def load_probe_overrides(object_name):
+    """Индивидуальные интервалы и приоритеты проверок: {ip: (интервал или None, приоритет)}."""
+    query = """
+    SELECT ip_address, probe_interval, probe_priority FROM ip_names
+    WHERE object_name = ? AND (probe_interval IS NOT NULL OR probe_priority != 0)
+    """
+    rows = execute_query(query, (object_name,))
+    return {ip_address: (interval, priority or 0) for ip_address, interval, priority in rows or []}
+
+def parse_probe_interval(value):
+    """Интервал проверок IP в секундах (целое больше 0); пустое значение — None."""
+    if value in (None, ""):
+        return None
+    try:
+        interval = int(str(value).strip())
+    except ValueError:
+        interval = 0
+    if interval < 1:
+        raise ValueError(f"Некорректный интервал проверок: {value}")
+    return interval
+
+def parse_probe_priority(value):
+    """Приоритет проверок IP (целое не меньше 0); пустое значение — None."""
+    if value in (None, ""):
+        return None
+    try:
+        priority = int(str(value).strip())
+    except ValueError:
+        priority = -1
+    if priority < 0:
+        raise ValueError(f"Некорректный приоритет проверок: {value}")
+    return priority
+
+def set_probe_override(ip_address, object_name, interval=None, priority=0):
+    """Задание интервала (в секундах) и приоритета проверок IP. Приоритет выше 0 отключает замедление."""
+    interval = parse_probe_interval(interval)
+    priority = parse_probe_priority(priority) or 0
+    query = """
+    INSERT INTO ip_names (ip_address, object_name, probe_interval, probe_priority) VALUES (?, ?, ?, ?)
+    ON CONFLICT (ip_address, object_name) DO UPDATE
+    SET probe_interval = excluded.probe_interval, probe_priority = excluded.probe_priority
+    """
+    execute_query(query, (ip_address, object_name, interval, priority))
+    bump_config_version(object_name)
+
+def _parse_stored_probe_method(spec, owner):
+    try:
+        return parse_probe_method(spec)
+    except ValueError as e:
+        logging.error(f"{owner}: {e}. Используется ICMP.")
+        return ICMP
+
+def load_probe_methods(object_name):
+    """Индивидуальные способы проверки IP: {ip: ProbeMethod}."""
+    query = "SELECT ip_address, probe_method FROM ip_names WHERE object_name = ? AND probe_method IS NOT NULL AND probe_method != ''"
+    return {ip_address: _parse_stored_probe_method(spec, f"IP {ip_address} ({object_name})")
+            for ip_address, spec in execute_query(query, (object_name,)) or []}
+
+def set_probe_method(ip_address, object_name, spec=None):
+    """Задание способа проверки IP (icmp, tcp[:порт], udp[:порт]); None — как у объекта."""
+    spec = format_probe_method(parse_probe_method(spec)) if spec else None
+    query = """
+    INSERT INTO ip_names (ip_address, object_name, probe_method) VALUES (?, ?, ?)
+    ON CONFLICT (ip_address, object_name) DO UPDATE SET probe_method = excluded.probe_method
+    """
+    execute_query(query, (ip_address, object_name, spec))
+    bump_config_version(object_name)
+
+def set_object_probe_method(object_name, spec=None):
+    """Задание способа проверки хостов объекта по умолчанию; None — ICMP."""
+    spec = format_probe_method(parse_probe_method(spec)) if spec else None
+    query = "UPDATE objects SET probe_method = ?, config_version = config_version + 1 WHERE object_name = ?"
+    execute_query(query, (spec, object_name))
+
+def load_host_parents(object_name):
+    """Зависимости хостов объекта: {ip: ip родительского узла}."""
+    query = "SELECT ip_address, parent_ip FROM ip_names WHERE object_name = ? AND parent_ip IS NOT NULL AND parent_ip != ''"
+    return dict(execute_query(query, (object_name,)) or [])
+
+def set_host_parent(ip_address, object_name, parent_ip=None):
+    """Задание родительского узла IP (None — зависимость снимается)."""
+    query = """
+    INSERT INTO ip_names (ip_address, object_name, parent_ip) VALUES (?, ?, ?)
+    ON CONFLICT (ip_address, object_name) DO UPDATE SET parent_ip = excluded.parent_ip
+    """
+    execute_query(query, (ip_address, object_name, parent_ip))
+    bump_config_version(object_name)
+
+def bump_config_version(object_name):
+    """Увеличение версии конфигурации объекта: запущенный мониторинг применит изменения."""
+    execute_query("UPDATE objects SET config_version = config_version + 1 WHERE object_name = ?", (object_name,))
+
+def get_config_version(object_name):
+    """Текущая версия конфигурации объекта или None, если объект не найден."""
+    result = execute_query("SELECT config_version FROM objects WHERE object_name = ?", (object_name,))
+    return (result[0][0] or 0) if result else None
+
+def load_object_config(object_name):
+    """Настройки объекта, которые мониторинг применяет без перезапуска, или None."""
+    query = """
+    SELECT telegram_token, telegram_chat_ids, delay, extended_logging, rtt_history, config_version,
+           degraded_rtt, degraded_loss, probe_method, probe_trace, probe_log_sample_rate
+    FROM objects WHERE object_name = ?
+    """
+    result = execute_query(query, (object_name,))
+    if not result:
+        return None
+    (telegram_token, telegram_chat_ids, delay, extended_logging, rtt_history, config_version,
+     degraded_rtt, degraded_loss, probe_method, probe_trace, probe_log_sample_rate) = result[0]
+    return {
+        "telegram_token": telegram_token,
+        "telegram_chat_ids": telegram_chat_ids.split(",") if telegram_chat_ids else [],
+        "delay": delay,
+        "extended_logging": extended_logging == 1,
+        "rtt_history": rtt_history == 1,
+        "config_version": config_version or 0,
+        "degraded_rtt": degraded_rtt,
+        "degraded_loss": degraded_loss,
+        "probe_method": _parse_stored_probe_method(probe_method, f"Объект '{object_name}'"),
+        "probe_trace": probe_trace == 1,
+        "probe_log_sample_rate": probe_log_sample_rate,
+    }
+
+def set_degraded_thresholds(object_name, rtt=None, loss=None):
+    """Пороги деградации связи объекта: EWMA RTT в мс и доля потерь (0..1). None отключает порог."""
+    query = """
+    UPDATE objects SET degraded_rtt = ?, degraded_loss = ?, config_version = config_version + 1
+    WHERE object_name = ?
+    """
+    execute_query(query, (rtt, loss, object_name))
 
 def save_object_config(object_name, ip_list, telegram_token, telegram_chat_ids, delay):
-    """Сохранение или обновление конфигурации объекта."""
-    ip_list_str = ",".join(ip_list)
+    """Сохранение или обновление конфигурации объекта.
+
+    ip_list — IP, диапазоны start-end, подсети CIDR или TargetRange. В колонке
+    ip_list сохраняется их компактная запись, а сами диапазоны — в object_targets.
+    """
+    ranges = coalesce_ranges(ip_list)
+    # Объект, который нельзя развернуть в памяти, не сохраняется
+    check_host_count(ranges)
+    ip_list_str = ",".join(format_target(target_range) for target_range in ranges)
     telegram_chat_ids_str = ",".join(telegram_chat_ids)
+    # Диапазоны сохраняются до увеличения версии, чтобы мониторинг не прочитал старые
+    save_object_targets(object_name, ranges)
     query = """
-    INSERT OR REPLACE INTO objects (object_name, ip_list, telegram_token, telegram_chat_ids, delay)
+    INSERT INTO objects (object_name, ip_list, telegram_token, telegram_chat_ids, delay)
     VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (object_name) DO UPDATE SET
+        ip_list = excluded.ip_list, telegram_token = excluded.telegram_token,
+        telegram_chat_ids = excluded.telegram_chat_ids, delay = excluded.delay,
+        config_version = objects.config_version + 1
     """
     execute_query(query, (object_name, ip_list_str, telegram_token, telegram_chat_ids_str, delay))
+    invalidate_ip_names(object_name)
+
+def save_object_targets(object_name, ranges):
+    """Замена диапазонов адресов объекта одной транзакцией."""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM object_targets WHERE object_name = ?", (object_name,))
+            conn.executemany(
+                "INSERT INTO object_targets (object_name, start_ip, end_ip) VALUES (?, ?, ?)",
+                [(object_name, ip_to_key(r.first), ip_to_key(r.last)) for r in coalesce_ranges(ranges)])
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка сохранения диапазонов объекта '{object_name}': {e}")
+        return False
+
+def load_object_targets(object_name):
+    """Диапазоны адресов объекта в виде списка TargetRange."""
+    query = "SELECT start_ip, end_ip FROM object_targets WHERE object_name = ? ORDER BY start_ip"
+    rows = execute_query(query, (object_name,))
+    return [TargetRange(ipaddress.ip_address(key_to_ip(start_ip)), ipaddress.ip_address(key_to_ip(end_ip)))
+            for start_ip, end_ip in rows or []]
+
+def load_object_hosts(object_name):
+    """Адреса объекта в компактном представлении HostSet."""
+    return HostSet(load_object_targets(object_name))
+
+def migrate_object_targets():
+    """Перенос адресов из колонки ip_list в object_targets для объектов, сохраненных ранее."""
+    query = """
+    SELECT object_name, ip_list FROM objects
+    WHERE object_name NOT IN (SELECT DISTINCT object_name FROM object_targets)
+    """
+    for object_name, ip_list in execute_query(query) or []:
+        try:
+            ranges = coalesce_ranges(item for item in (ip_list or "").split(",") if item.strip())
+        except ValueError as e:
+            logging.error(f"Не удалось перенести адреса объекта '{object_name}': {e}")
+            continue
+        if save_object_targets(object_name, ranges):
+            ip_list_str = ",".join(format_target(target_range) for target_range in ranges)
+            execute_query("UPDATE objects SET ip_list = ? WHERE object_name = ?", (ip_list_str, object_name))
+            logging.info(f"Адреса объекта '{object_name}' перенесены в таблицу диапазонов.")
 
 def update_object_delay(object_name, new_delay):
     """Обновление времени задержки."""
-    query = "UPDATE objects SET delay = ? WHERE object_name = ?"
+    query = "UPDATE objects SET delay = ?, config_version = config_version + 1 WHERE object_name = ?"
     execute_query(query, (new_delay, object_name))
 
 def is_logging_enabled(object_name):
@@ -93,14 +451,485 @@ def is_logging_enabled(object_name):
     result = execute_query(query, (object_name,))
     return result and result[0][0] == 1
 
-def toggle_logging(object_name, enable):
-    """Включение или отключение логирования."""
-    query = "UPDATE objects SET extended_logging = ? WHERE object_name = ?"
-    execute_query(query, (1 if enable else 0, object_name))
+def toggle_logging(object_name, enable, sample_rate=None):
+    """Включение или отключение логирования.
+
+    sample_rate — доля записываемых результатов проверок (0 < sample_rate <= 1); None — все.
+    """
+    if sample_rate is not None and not 0 < sample_rate <= 1:
+        raise ValueError(f"Доля записываемых результатов должна быть больше 0 и не больше 100%: {sample_rate:.0%}")
+    query = """
+    UPDATE objects SET extended_logging = ?, probe_log_sample_rate = ?, config_version = config_version + 1
+    WHERE object_name = ?
+    """
+    execute_query(query, (1 if enable else 0, sample_rate, object_name))
 
 
 def save_ip_name(ip_address, object_name, ip_name):
     """Сохранение или обновление имени IP."""
-    query = "INSERT OR REPLACE INTO ip_names (ip_address, object_name, ip_name) VALUES (?, ?, ?)"
+    query = """
+    INSERT INTO ip_names (ip_address, object_name, ip_name) VALUES (?, ?, ?)
+    ON CONFLICT (ip_address, object_name) DO UPDATE SET ip_name = excluded.ip_name
+    """
     execute_query(query, (ip_address, object_name, ip_name))
+    _ip_name_cache[(ip_address, object_name)] = ip_name
+    bump_config_version(object_name)
     logging.info(f"Имя для IP {ip_address} ({object_name}) обновлено/добавлено как '{ip_name}'.")
+
+
+# --- Импорт и экспорт объектов ---
+
+# Поля строки импорта/экспорта: конфигурация объекта, адрес или диапазон и имя IP
+TRANSFER_FIELDS = ("object_name", "target", "ip_name", "parent_ip", "probe", "probe_interval", "probe_priority",
+                   "telegram_token", "telegram_chat_ids", "delay")
+
+def import_object_rows(rows):
+    """Импорт объектов, диапазонов и имен IP одной транзакцией.
+
+    rows — поток словарей с ключами TRANSFER_FIELDS; пустые поля не меняют
+    сохраненные значения. Поле probe в строке без target задает способ проверки
+    объекта, а в строке с одним IP — способ проверки этого IP; probe_interval
+    и probe_priority задаются только в строке с одним IP.
+    Имена и родительские узлы IP записываются по мере чтения потока,
+    диапазоны добавляются к уже сохраненным, а конфигурация объекта
+    обновляется (upsert). При ошибке в любой строке транзакция откатывается.
+    Возвращает (число объектов, число имен).
+    """
+    configs = {}
+    new_ranges = {}
+    imported_names = [0]
+
+    def name_rows():
+        for line, row in enumerate(rows, start=1):
+            object_name = (row.get("object_name") or "").strip()
+            if not object_name:
+                raise ValueError(f"Строка {line}: не указано имя объекта.")
+            config = configs.setdefault(object_name, {})
+            for field in ("telegram_token", "telegram_chat_ids", "delay"):
+                value = row.get(field)
+                if isinstance(value, (list, tuple)):
+                    value = ",".join(str(item).strip() for item in value)
+                if value not in (None, ""):
+                    config[field] = str(value).strip()
+
+            target = (row.get("target") or "").strip()
+            ip_name = (row.get("ip_name") or "").strip()
+            parent_ip = (row.get("parent_ip") or "").strip()
+            probe = (row.get("probe") or "").strip()
+            try:
+                if probe:
+                    probe = format_probe_method(parse_probe_method(probe))
+                interval = parse_probe_interval(row.get("probe_interval"))
+                priority = parse_probe_priority(row.get("probe_priority"))
+            except ValueError as e:
+                raise ValueError(f"Строка {line}: {e}")
+            if not target:
+                if ip_name or parent_ip or interval is not None or priority is not None:
+                    raise ValueError(f"Строка {line}: имя, родительский узел, интервал или приоритет указаны без IP.")
+                if probe:
+                    config["probe"] = probe
+                continue
+            try:
+                target_range = parse_target(target)
+            except ValueError as e:
+                raise ValueError(f"Строка {line}: {e}")
+            new_ranges.setdefault(object_name, []).append(target_range)
+            if ip_name or parent_ip or probe or interval is not None or priority is not None:
+                if target_range.first != target_range.last:
+                    raise ValueError(f"Строка {line}: имя, родительский узел, способ, интервал и приоритет проверки "
+                                     f"задаются только для одного IP, а не для {target}.")
+                if parent_ip:
+                    try:
+                        parent_ip = str(ipaddress.ip_address(parent_ip))
+                    except ValueError:
+                        raise ValueError(f"Строка {line}: некорректный IP родительского узла: {parent_ip}")
+                if ip_name:
+                    imported_names[0] += 1
+                yield (str(target_range.first), object_name, ip_name or None, parent_ip or None, probe or None,
+                       interval, priority)
+
+    conn = get_connection()
+    try:
+        with conn:
+            conn.executemany("""
+            INSERT INTO ip_names (ip_address, object_name, ip_name, parent_ip, probe_method, probe_interval, probe_priority)
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, 0))
+            ON CONFLICT (ip_address, object_name) DO UPDATE SET
+                ip_name = COALESCE(excluded.ip_name, ip_names.ip_name),
+                parent_ip = COALESCE(excluded.parent_ip, ip_names.parent_ip),
+                probe_method = COALESCE(excluded.probe_method, ip_names.probe_method),
+                probe_interval = COALESCE(excluded.probe_interval, ip_names.probe_interval),
+                probe_priority = COALESCE(?7, ip_names.probe_priority)
+            """, name_rows())
+
+            for object_name, config in configs.items():
+                delay = config.get("delay")
+                if delay is not None:
+                    try:
+                        delay = int(delay)
+                    except ValueError:
+                        raise ValueError(f"Некорректная задержка объекта '{object_name}': {delay}")
+                ip_list_str = None
+                if object_name in new_ranges:
+                    rows_before = conn.execute(
+                        "SELECT start_ip, end_ip FROM object_targets WHERE object_name = ?", (object_name,)).fetchall()
+                    ranges = coalesce_ranges(
+                        [TargetRange(ipaddress.ip_address(key_to_ip(first)), ipaddress.ip_address(key_to_ip(last)))
+                         for first, last in rows_before] + new_ranges[object_name])
+                    try:
+                        check_host_count(ranges)
+                    except ValueError as e:
+                        raise ValueError(f"Объект '{object_name}': {e}")
+                    conn.execute("DELETE FROM object_targets WHERE object_name = ?", (object_name,))
+                    conn.executemany(
+                        "INSERT INTO object_targets (object_name, start_ip, end_ip) VALUES (?, ?, ?)",
+                        [(object_name, ip_to_key(r.first), ip_to_key(r.last)) for r in ranges])
+                    ip_list_str = ",".join(format_target(target_range) for target_range in ranges)
+                conn.execute("""
+                INSERT INTO objects (object_name, ip_list, telegram_token, telegram_chat_ids, delay, probe_method)
+                VALUES (?, ?, ?, ?, COALESCE(?, 10), ?)
+                ON CONFLICT (object_name) DO UPDATE SET
+                    ip_list = COALESCE(excluded.ip_list, objects.ip_list),
+                    telegram_token = COALESCE(?, objects.telegram_token),
+                    telegram_chat_ids = COALESCE(?, objects.telegram_chat_ids),
+                    delay = COALESCE(?, objects.delay),
+                    probe_method = COALESCE(excluded.probe_method, objects.probe_method),
+                    config_version = objects.config_version + 1
+                """, (object_name, ip_list_str, config.get("telegram_token"), config.get("telegram_chat_ids"), delay,
+                      config.get("probe"), config.get("telegram_token"), config.get("telegram_chat_ids"), delay))
+    finally:
+        invalidate_ip_names()
+    return len(configs), imported_names[0]
+
+def export_objects(object_names=None):
+    """Поток конфигураций объектов для экспорта: словари с диапазонами и именами IP."""
+    query = "SELECT object_name, telegram_token, telegram_chat_ids, delay, probe_method FROM objects ORDER BY object_name"
+    for object_name, telegram_token, telegram_chat_ids, delay, probe_method in execute_query(query) or []:
+        if object_names and object_name not in object_names:
+            continue
+        names = execute_query(
+            "SELECT ip_address, ip_name FROM ip_names WHERE object_name = ? AND ip_name IS NOT NULL AND ip_name != ''",
+            (object_name,))
+        overrides = load_probe_overrides(object_name)
+        yield {
+            "object_name": object_name,
+            "telegram_token": telegram_token,
+            "telegram_chat_ids": telegram_chat_ids.split(",") if telegram_chat_ids else [],
+            "delay": delay,
+            "probe": probe_method or None,
+            "targets": [format_target(target_range) for target_range in load_object_targets(object_name)],
+            "ip_names": dict(names or []),
+            "parents": load_host_parents(object_name),
+            "probes": {ip: format_probe_method(method) for ip, method in load_probe_methods(object_name).items()},
+            "intervals": {ip: interval for ip, (interval, _) in overrides.items() if interval is not None},
+            "priorities": {ip: priority for ip, (_, priority) in overrides.items() if priority},
+        }
+
+
+# --- История статусов ---
+
+# Коды статусов в истории
+HISTORY_DOWN = 0
+HISTORY_UP = 1
+
+# Размер буфера истории, при котором он записывается в базу, не дожидаясь flush_history
+HISTORY_FLUSH_SIZE = 10000
+
+# Периоды агрегации RTT (в секундах)
+ROLLUP_HOUR = 3600
+ROLLUP_DAY = 86400
+
+# Сроки хранения по умолчанию (в днях)
+RAW_SAMPLES_RETENTION_DAYS = 2
+HOURLY_ROLLUP_RETENTION_DAYS = 30
+DAILY_ROLLUP_RETENTION_DAYS = 365
+TRANSITIONS_RETENTION_DAYS = 365
+
+# Числовые идентификаторы объектов в таблицах истории: object_name -> object_id
+_history_object_ids = {}
+# Буферы записей истории, ожидающих записи в базу
+_transition_buffer = []
+_rtt_buffer = []
+_history_lock = threading.Lock()
+
+_STATUS_TRANSITIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    object_id INTEGER NOT NULL,
+    ip INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    PRIMARY KEY (object_id, ip, ts, seq)
+) WITHOUT ROWID
+"""
+# Статус на момент среза хранения: seq меньше, чем у переходов той же секунды
+_RETENTION_SEQ = -1
+
+def create_history_tables(c):
+    """Создание таблиц истории. Все ключи целочисленные, таблицы без rowid."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS history_objects (
+        object_id INTEGER PRIMARY KEY,
+        object_name TEXT UNIQUE NOT NULL
+    )
+    """)
+    # seq упорядочивает переходы хоста в пределах одной секунды
+    c.execute(_STATUS_TRANSITIONS_TABLE.format(name="status_transitions"))
+    columns = [column[1] for column in c.execute("PRAGMA table_info(status_transitions)")]
+    if "seq" not in columns:
+        c.execute(_STATUS_TRANSITIONS_TABLE.format(name="status_transitions_new"))
+        c.execute("INSERT INTO status_transitions_new SELECT object_id, ip, ts, 0, status FROM status_transitions")
+        c.execute("DROP TABLE status_transitions")
+        c.execute("ALTER TABLE status_transitions_new RENAME TO status_transitions")
+        logging.info("Таблица 'status_transitions' переведена на ключ с номером перехода.")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS rtt_samples (
+        object_id INTEGER NOT NULL,
+        ip INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        rtt_us INTEGER,
+        PRIMARY KEY (object_id, ip, ts)
+    ) WITHOUT ROWID
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS rtt_rollups (
+        object_id INTEGER NOT NULL,
+        ip INTEGER NOT NULL,
+        period INTEGER NOT NULL,
+        bucket_ts INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        lost INTEGER NOT NULL,
+        rtt_min_us INTEGER,
+        rtt_avg_us INTEGER,
+        rtt_max_us INTEGER,
+        PRIMARY KEY (object_id, ip, period, bucket_ts)
+    ) WITHOUT ROWID
+    """)
+
+def ip_to_key(ip_address):
+    """Компактный ключ IP для таблиц истории: int для IPv4, 16 байт для IPv6."""
+    address = ipaddress.ip_address(ip_address)
+    return int(address) if address.version == 4 else address.packed
+
+def key_to_ip(key):
+    """Обратное преобразование ключа истории в строку IP."""
+    if isinstance(key, int):
+        return str(ipaddress.IPv4Address(key))
+    return str(ipaddress.IPv6Address(bytes(key)))
+
+def get_history_object_id(object_name):
+    """Числовой идентификатор объекта в таблицах истории."""
+    object_id = _history_object_ids.get(object_name)
+    if object_id is None:
+        execute_query("INSERT OR IGNORE INTO history_objects (object_name) VALUES (?)", (object_name,))
+        result = execute_query("SELECT object_id FROM history_objects WHERE object_name = ?", (object_name,))
+        if not result:
+            raise sqlite3.OperationalError(f"Не удалось зарегистрировать объект '{object_name}' в истории.")
+        object_id = _history_object_ids[object_name] = result[0][0]
+    return object_id
+
+def record_transition(object_name, ip_address, status, ts=None):
+    """Добавление перехода статуса в буфер истории."""
+    row = (get_history_object_id(object_name), ip_to_key(ip_address), int(time.time() if ts is None else ts), status)
+    with _history_lock:
+        _transition_buffer.append(row)
+        full = len(_transition_buffer) >= HISTORY_FLUSH_SIZE
+    if full:
+        flush_history()
+
+def record_rtt_sample(object_name, ip_address, rtt, ts=None):
+    """Добавление замера RTT (в мс, None — ответа нет) в буфер истории."""
+    rtt_us = None if rtt is None else int(rtt * 1000)
+    row = (get_history_object_id(object_name), ip_to_key(ip_address), int(time.time() if ts is None else ts), rtt_us)
+    with _history_lock:
+        _rtt_buffer.append(row)
+        full = len(_rtt_buffer) >= HISTORY_FLUSH_SIZE
+    if full:
+        flush_history()
+
+def flush_history():
+    """Запись накопленной истории в базу одной транзакцией."""
+    global _transition_buffer, _rtt_buffer
+    with _history_lock:
+        transitions, _transition_buffer = _transition_buffer, []
+        samples, _rtt_buffer = _rtt_buffer, []
+    if not transitions and not samples:
+        return True
+    conn = get_connection()
+    try:
+        with conn:
+            # Переход в ту же секунду, что и предыдущий, получает следующий номер, а не заменяет его
+            conn.executemany("""
+            INSERT INTO status_transitions (object_id, ip, ts, seq, status)
+            SELECT ?1, ?2, ?3, COALESCE(MAX(seq) + 1, 0), ?4 FROM status_transitions
+            WHERE object_id = ?1 AND ip = ?2 AND ts = ?3
+            """, transitions)
+            conn.executemany("INSERT OR REPLACE INTO rtt_samples VALUES (?, ?, ?, ?)", samples)
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка записи истории статусов: {e}")
+        return False
+
+def rollup_rtt(period, source_before_ts):
+    """Агрегация RTT старше source_before_ts в корзины длиной period.
+
+    Часовые корзины строятся из сырых замеров, дневные — из часовых.
+    Обработанные исходные строки удаляются.
+    """
+    conn = get_connection()
+    try:
+        with conn:
+            if period == ROLLUP_HOUR:
+                conn.execute("""
+                INSERT OR REPLACE INTO rtt_rollups
+                SELECT object_id, ip, ?, ts / ? * ?, COUNT(*), COUNT(*) - COUNT(rtt_us),
+                       MIN(rtt_us), CAST(AVG(rtt_us) AS INTEGER), MAX(rtt_us)
+                FROM rtt_samples WHERE ts < ?
+                GROUP BY object_id, ip, ts / ?
+                """, (period, period, period, source_before_ts, period))
+                conn.execute("DELETE FROM rtt_samples WHERE ts < ?", (source_before_ts,))
+            else:
+                conn.execute("""
+                INSERT OR REPLACE INTO rtt_rollups
+                SELECT object_id, ip, ?, bucket_ts / ? * ?, SUM(samples), SUM(lost),
+                       MIN(rtt_min_us),
+                       CAST(SUM(rtt_avg_us * (samples - lost)) / NULLIF(SUM(samples - lost), 0) AS INTEGER),
+                       MAX(rtt_max_us)
+                FROM rtt_rollups WHERE period = ? AND bucket_ts < ?
+                GROUP BY object_id, ip, bucket_ts / ?
+                """, (period, period, period, ROLLUP_HOUR, source_before_ts, period))
+                conn.execute("DELETE FROM rtt_rollups WHERE period = ? AND bucket_ts < ?", (ROLLUP_HOUR, source_before_ts))
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка агрегации RTT: {e}")
+        return False
+
+def apply_history_retention(now=None, raw_days=RAW_SAMPLES_RETENTION_DAYS, hourly_days=HOURLY_ROLLUP_RETENTION_DAYS,
+                            daily_days=DAILY_ROLLUP_RETENTION_DAYS, transitions_days=TRANSITIONS_RETENTION_DAYS):
+    """Агрегация и удаление устаревшей истории."""
+    now = int(time.time() if now is None else now)
+    flush_history()
+    # Границы выравниваются по корзинам, чтобы не агрегировать неполные часы и дни
+    rollup_rtt(ROLLUP_HOUR, (now - raw_days * ROLLUP_DAY) // ROLLUP_HOUR * ROLLUP_HOUR)
+    rollup_rtt(ROLLUP_DAY, (now - hourly_days * ROLLUP_DAY) // ROLLUP_DAY * ROLLUP_DAY)
+
+    cutoff = now - transitions_days * ROLLUP_DAY
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM rtt_rollups WHERE period = ? AND bucket_ts < ?", (ROLLUP_DAY, now - daily_days * ROLLUP_DAY))
+            # Статус на момент среза сохраняется, чтобы расчет доступности после среза оставался корректным
+            conn.execute("""
+            INSERT OR REPLACE INTO status_transitions (object_id, ip, ts, seq, status)
+            SELECT object_id, ip, ?, ?, status FROM (
+                SELECT object_id, ip, status,
+                       ROW_NUMBER() OVER (PARTITION BY object_id, ip ORDER BY ts DESC, seq DESC) AS position
+                FROM status_transitions WHERE ts < ?
+            ) WHERE position = 1
+            """, (cutoff, _RETENTION_SEQ, cutoff))
+            conn.execute("DELETE FROM status_transitions WHERE ts < ?", (cutoff,))
+        logging.info("Устаревшая история статусов агрегирована и удалена.")
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка очистки истории статусов: {e}")
+        return False
+
+def _host_timeline(object_id, ip_key, start_ts, end_ts):
+    """Статус на начало периода и изменения внутри периода (по первичному ключу)."""
+    initial = execute_query(
+        "SELECT status FROM status_transitions WHERE object_id = ? AND ip = ? AND ts <= ? ORDER BY ts DESC, seq DESC LIMIT 1",
+        (object_id, ip_key, start_ts))
+    changes = execute_query(
+        "SELECT ts, status FROM status_transitions WHERE object_id = ? AND ip = ? AND ts > ? AND ts < ? ORDER BY ts, seq",
+        (object_id, ip_key, start_ts, end_ts))
+    return (initial[0][0] if initial else None), (changes or [])
+
+def _summarize_timeline(initial_status, changes, start_ts, end_ts):
+    """Подсчет (секунд доступности, секунд с известным статусом, интервалов недоступности)."""
+    up_seconds = 0
+    known_seconds = 0
+    outages = []
+    status, since = initial_status, start_ts
+    down_since = start_ts if status == HISTORY_DOWN else None
+
+    for ts, new_status in changes:
+        if status is not None:
+            known_seconds += ts - since
+            if status == HISTORY_UP:
+                up_seconds += ts - since
+        if status != HISTORY_DOWN and new_status == HISTORY_DOWN:
+            down_since = ts
+        elif status == HISTORY_DOWN and new_status != HISTORY_DOWN:
+            outages.append((down_since, ts))
+            down_since = None
+        status, since = new_status, ts
+
+    if status is not None:
+        known_seconds += end_ts - since
+        if status == HISTORY_UP:
+            up_seconds += end_ts - since
+    if down_since is not None:
+        outages.append((down_since, end_ts))
+    return up_seconds, known_seconds, outages
+
+def get_host_history(object_name, ip_address, start_ts, end_ts):
+    """Доступность хоста за период: (процент доступности или None, интервалы недоступности)."""
+    flush_history()
+    object_id = get_history_object_id(object_name)
+    initial, changes = _host_timeline(object_id, ip_to_key(ip_address), start_ts, end_ts)
+    up_seconds, known_seconds, outages = _summarize_timeline(initial, changes, start_ts, end_ts)
+    availability = 100.0 * up_seconds / known_seconds if known_seconds else None
+    return availability, outages
+
+def get_host_availability(object_name, ip_address, start_ts, end_ts):
+    """Процент доступности хоста за период (None, если статус неизвестен)."""
+    return get_host_history(object_name, ip_address, start_ts, end_ts)[0]
+
+def get_host_outages(object_name, ip_address, start_ts, end_ts):
+    """Интервалы недоступности хоста за период: список пар (начало, конец)."""
+    return get_host_history(object_name, ip_address, start_ts, end_ts)[1]
+
+def get_object_availability(object_name, start_ts, end_ts, ip_addresses=None):
+    """Доступность всех хостов объекта за период: {ip: (процент, интервалы недоступности)}.
+
+    Для каждого хоста выполняются два запроса по первичному ключу, поэтому
+    время ответа зависит от числа хостов и изменений в периоде, а не от
+    общего объема истории.
+    """
+    if ip_addresses is None:
+        rows = execute_query("SELECT ip_address FROM ip_names WHERE object_name = ?", (object_name,))
+        ip_addresses = [row[0] for row in rows or []]
+    return {ip: get_host_history(object_name, ip, start_ts, end_ts) for ip in ip_addresses}
+
+def get_rtt_rollups(object_name, ip_address, period, start_ts, end_ts):
+    """Агрегаты RTT хоста: список (начало корзины, замеров, потерь, min, avg, max в мс)."""
+    rows = execute_query("""
+    SELECT bucket_ts, samples, lost, rtt_min_us, rtt_avg_us, rtt_max_us FROM rtt_rollups
+    WHERE object_id = ? AND ip = ? AND period = ? AND bucket_ts >= ? AND bucket_ts < ?
+    ORDER BY bucket_ts
+    """, (get_history_object_id(object_name), ip_to_key(ip_address), period, start_ts, end_ts))
+    to_ms = lambda value: None if value is None else value / 1000
+    return [(bucket_ts, samples, lost, to_ms(rtt_min), to_ms(rtt_avg), to_ms(rtt_max))
+            for bucket_ts, samples, lost, rtt_min, rtt_avg, rtt_max in rows or []]
+
+def is_rtt_history_enabled(object_name):
+    """Проверка, записываются ли замеры RTT объекта в историю."""
+    query = "SELECT rtt_history FROM objects WHERE object_name = ?"
+    result = execute_query(query, (object_name,))
+    return bool(result and result[0][0] == 1)
+
+def toggle_rtt_history(object_name, enable):
+    """Включение или отключение записи замеров RTT в историю."""
+    query = "UPDATE objects SET rtt_history = ?, config_version = config_version + 1 WHERE object_name = ?"
+    execute_query(query, (1 if enable else 0, object_name))
+
+def is_probe_trace_enabled(object_name):
+    """Проверка, записываются ли результаты проверок объекта в файл трассы."""
+    query = "SELECT probe_trace FROM objects WHERE object_name = ?"
+    result = execute_query(query, (object_name,))
+    return bool(result and result[0][0] == 1)
+
+def toggle_probe_trace(object_name, enable):
+    """Включение или отключение записи трассы проверок объекта."""
+    query = "UPDATE objects SET probe_trace = ?, config_version = config_version + 1 WHERE object_name = ?"
+    execute_query(query, (1 if enable else 0, object_name))
@@ -0,0 +1,121 @@
+import time
+from collections import namedtuple
+
+# Состояния хоста
+UP = "up"
+SUSPECT_DOWN = "suspect-down"
+DOWN = "down"
+SUSPECT_UP = "suspect-up"
+
+SUSPECT_STATES = (SUSPECT_DOWN, SUSPECT_UP)
+
+# Типы переходов, которые возвращает DebounceTracker.observe
+INIT = "init"
+SUSPECT = "suspect"
+REVERTED = "reverted"
+CONFIRMED = "confirmed"
+
+Transition = namedtuple("Transition", ["ip", "kind", "is_reachable", "state"])
+Transition.__doc__ = "Переход хоста: тип перехода, наблюдаемая доступность и новое состояние."
+
+
+def is_up(state):
+    """Считается ли состояние доступным с точки зрения последнего подтвержденного статуса."""
+    return state in (UP, SUSPECT_DOWN)
+
+
+class HostState:
+    """Состояние одного хоста в автомате подавления дребезга."""
+
+    __slots__ = ("state", "confirmations", "changed_at")
+
+    def __init__(self, state=None, confirmations=0, changed_at=None):
+        self.state = state
+        self.confirmations = confirmations
+        self.changed_at = changed_at
+
+
+class DebounceTracker:
+    """Автомат up / suspect-down / down / suspect-up для каждого хоста.
+
+    Изменение статуса подтверждается, только если `required` повторных
+    проверок подряд дали тот же результат. Каждый хост продвигается
+    независимо, поэтому проверка одного хоста не задерживает остальные.
+    """
+
+    def __init__(self, required):
+        self.required = required
+        self.hosts = {}
+
+    def state_of(self, ip):
+        host = self.hosts.get(ip)
+        return host.state if host else None
+
+    def snapshot(self):
+        """Состояние всех хостов в виде списка [ip, состояние, подтверждения, время изменения]."""
+        return [[ip, host.state, host.confirmations, host.changed_at]
+                for ip, host in self.hosts.items() if host.state is not None]
+
+    def restore(self, rows):
+        """Восстановление состояния хостов из снимка. Возвращает число восстановленных хостов."""
+        count = 0
+        for ip, state, confirmations, changed_at in rows:
+            if state in (UP, DOWN, SUSPECT_UP, SUSPECT_DOWN):
+                self.hosts[ip] = HostState(state, confirmations, changed_at)
+                count += 1
+        return count
+
+    def cancel(self, ip):
+        """Отмена неподтвержденного изменения: хост возвращается к последнему подтвержденному состоянию."""
+        host = self.hosts.get(ip)
+        if host is not None and host.state in SUSPECT_STATES:
+            host.state = UP if host.state == SUSPECT_DOWN else DOWN
+            host.confirmations = 0
+
+    def forget(self, ip):
+        """Удаление хоста, исключенного из мониторинга."""
+        self.hosts.pop(ip, None)
+
+    def suspects(self):
+        """Хосты, ожидающие подтверждения изменения статуса."""
+        return [ip for ip, host in self.hosts.items() if host.state in SUSPECT_STATES]
+
+    def observe(self, ip, is_reachable, now=None):
+        """Учет результата проверки. Возвращает Transition или None, если ничего не изменилось."""
+        now = time.time() if now is None else now
+        host = self.hosts.get(ip)
+        if host is None:
+            host = self.hosts[ip] = HostState()
+
+        if host.state is None:
+            host.state = UP if is_reachable else DOWN
+            host.changed_at = now
+            return Transition(ip, INIT, is_reachable, host.state)
+
+        if host.state in (UP, DOWN):
+            if is_up(host.state) == is_reachable:
+                return None
+            host.state = SUSPECT_UP if is_reachable else SUSPECT_DOWN
+            host.confirmations = 0
+            if self.required > 0:
+                return Transition(ip, SUSPECT, is_reachable, host.state)
+            return self._confirm(ip, host, is_reachable, now)
+
+        # Хост в состоянии suspect-*: результат либо подтверждает, либо отменяет изменение
+        expected = host.state == SUSPECT_UP
+        if is_reachable != expected:
+            host.state = DOWN if host.state == SUSPECT_UP else UP
+            host.confirmations = 0
+            return Transition(ip, REVERTED, is_reachable, host.state)
+
+        host.confirmations += 1
+        if host.confirmations >= self.required:
+            return self._confirm(ip, host, is_reachable, now)
+        return None
+
+    @staticmethod
+    def _confirm(ip, host, is_reachable, now):
+        host.state = UP if is_reachable else DOWN
+        host.confirmations = 0
+        host.changed_at = now
+        return Transition(ip, CONFIRMED, is_reachable, host.state)
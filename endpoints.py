@@ -0,0 +1,10 @@
+# Адреса служб мониторинга. Модуль не импортирует ничего, чтобы быстрые команды CLI
+# (status, stop) могли узнать адреса, не загружая asyncio и модули мониторинга.
+
+# HTTP-сервер метрик и API состояния: только локальный интерфейс; рабочий процесс супервизора N — порт METRICS_PORT + N
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Адрес, на котором коллектор принимает подключения агентов
+COLLECTOR_HOST = "127.0.0.1"
+COLLECTOR_PORT = 9200
@@ -0,0 +1,162 @@
+import math
+from array import array
+from collections import namedtuple
+from probe import RTT_SCALE, RESULT_LOST
+
+# Размер окна последних замеров на хост
+DEFAULT_WINDOW = 32
+# Вес нового замера в экспоненциальном среднем RTT
+EWMA_ALPHA = 0.2
+# Минимум замеров в окне для оценки деградации
+MIN_SAMPLES = 10
+# Гистерезис: выход из деградации, когда показатели опускаются ниже этой доли порога
+RECOVERY_RATIO = 0.8
+
+# События изменения качества связи
+DEGRADED = "degraded"
+NORMAL = "normal"
+
+LatencySummary = namedtuple("LatencySummary", ["ewma", "loss", "p50", "p95", "samples"])
+LatencySummary.__doc__ = "Сводка по хосту: EWMA RTT и перцентили (мс), доля потерь и число замеров в окне."
+
+
+class LatencyStats:
+    """Потоковая статистика RTT и потерь для множества хостов.
+
+    Каждому хосту выделяется слот в общих массивах: кольцевой буфер
+    последних `window` замеров по 2 байта, EWMA RTT, счетчики замеров и
+    потерь в окне и флаг деградации. При окне 32 на 50 тысяч хостов
+    приходится около 4 МБ. Доля потерь и EWMA обновляются за O(1),
+    а перцентили вычисляются по окну только при запросе сводки.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, alpha=EWMA_ALPHA, rtt_threshold=None, loss_threshold=None,
+                 min_samples=MIN_SAMPLES):
+        self.window = window
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.rtt_threshold = rtt_threshold
+        self.loss_threshold = loss_threshold
+        self._index = {}
+        self._free = []
+        self._samples = array("H")
+        self._ewma = array("f")
+        self._position = array("H")
+        self._count = array("H")
+        self._lost = array("H")
+        self._degraded = array("b")
+        self._blank = array("H", [RESULT_LOST]) * window
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, ip):
+        return ip in self._index
+
+    def set_thresholds(self, rtt_threshold=None, loss_threshold=None):
+        """Пороги деградации: EWMA RTT в мс и доля потерь (0..1); None отключает порог."""
+        self.rtt_threshold = rtt_threshold
+        self.loss_threshold = loss_threshold
+
+    def _slot(self, ip):
+        slot = self._index.get(ip)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            self._samples[slot * self.window:(slot + 1) * self.window] = self._blank
+            self._ewma[slot] = math.nan
+            self._position[slot] = self._count[slot] = self._lost[slot] = self._degraded[slot] = 0
+        else:
+            slot = len(self._ewma)
+            self._samples.extend(self._blank)
+            self._ewma.append(math.nan)
+            self._position.append(0)
+            self._count.append(0)
+            self._lost.append(0)
+            self._degraded.append(0)
+        self._index[ip] = slot
+        return slot
+
+    def remove(self, ip):
+        slot = self._index.pop(ip, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def record(self, ip, rtt):
+        """Учет замера (rtt в мс или None при потере). Возвращает DEGRADED, NORMAL или None."""
+        slot = self._slot(ip)
+        index = slot * self.window + self._position[slot]
+        if self._count[slot] == self.window:
+            if self._samples[index] == RESULT_LOST:
+                self._lost[slot] -= 1
+        else:
+            self._count[slot] += 1
+
+        if rtt is None:
+            self._samples[index] = RESULT_LOST
+            self._lost[slot] += 1
+        else:
+            self._samples[index] = min(int(rtt * RTT_SCALE), RESULT_LOST - 1)
+            ewma = self._ewma[slot]
+            self._ewma[slot] = rtt if math.isnan(ewma) else ewma + self.alpha * (rtt - ewma)
+        self._position[slot] = (self._position[slot] + 1) % self.window
+        return self._evaluate(slot)
+
+    def _evaluate(self, slot):
+        if self.rtt_threshold is None and self.loss_threshold is None:
+            return None
+        count = self._count[slot]
+        if count < self.min_samples:
+            return None
+        loss = self._lost[slot] / count
+        ewma = self._ewma[slot]
+        if self._degraded[slot]:
+            if not self._exceeds(ewma, loss, RECOVERY_RATIO):
+                self._degraded[slot] = 0
+                return NORMAL
+        elif self._exceeds(ewma, loss, 1):
+            self._degraded[slot] = 1
+            return DEGRADED
+        return None
+
+    def _exceeds(self, ewma, loss, ratio):
+        if self.rtt_threshold is not None and not math.isnan(ewma) and ewma > self.rtt_threshold * ratio:
+            return True
+        return self.loss_threshold is not None and loss > self.loss_threshold * ratio
+
+    def last(self, ip):
+        """Последний замер хоста: RTT в мс или None, если ответа не было или замеров нет."""
+        slot = self._index.get(ip)
+        if slot is None or not self._count[slot]:
+            return None
+        value = self._samples[slot * self.window + (self._position[slot] - 1) % self.window]
+        return None if value == RESULT_LOST else value / RTT_SCALE
+
+    def clear_degraded(self, ip):
+        """Сброс флага деградации: следующий замер оценивается заново."""
+        slot = self._index.get(ip)
+        if slot is not None:
+            self._degraded[slot] = 0
+
+    def is_degraded(self, ip):
+        slot = self._index.get(ip)
+        return slot is not None and bool(self._degraded[slot])
+
+    def summary(self, ip):
+        """Сводка по хосту или None, если замеров нет."""
+        slot = self._index.get(ip)
+        if slot is None or not self._count[slot]:
+            return None
+        count = self._count[slot]
+        start = slot * self.window
+        received = sorted(value for value in self._samples[start:start + count] if value != RESULT_LOST)
+        ewma = self._ewma[slot]
+
+        def percentile(q):
+            if not received:
+                return None
+            return received[min(len(received) - 1, int(q * len(received)))] / RTT_SCALE
+
+        return LatencySummary(None if math.isnan(ewma) else round(ewma, 1), self._lost[slot] / count,
+                              percentile(0.5), percentile(0.95), count)
@@ -0,0 +1,197 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+
+LOG_FILE = "service.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# Ротация файла журнала: по размеру или раз в сутки, в зависимости от того, что наступит раньше
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_ROTATE_INTERVAL = 24 * 3600
+LOG_BACKUP_COUNT = 7
+# Предел очереди записей: при переполнении записи отбрасываются, а не блокируют цикл событий
+LOG_QUEUE_SIZE = 10000
+
+# Дополнительные поля записи (logging extra), попадающие в JSON
+STRUCTURED_FIELDS = ("object", "ip", "event", "status", "rtt")
+
+_listener = None
+_worker_listener = None
+_queue_handler = None
+_settings = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала в виде одной строки JSON."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    """Файловый обработчик с ротацией по размеру и по времени."""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, interval=LOG_ROTATE_INTERVAL, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Постановка записи в очередь без ожидания; при переполнении запись отбрасывается."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Сообщение и трассировка вычисляются сразу, а JSON формируется в потоке записи
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start():
+    global _listener, _queue_handler
+    log_file, console, level = _settings
+    handlers = []
+    file_handler = RotatingLogHandler(log_file)
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # Поток записи не переживает fork: дочерний процесс запускает собственный
+    global _listener
+    if _settings is None:
+        return
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    _start()
+
+
+def start_worker_logging():
+    """Очередь журнала для рабочих процессов супервизора.
+
+    Записи рабочих процессов пишет в файл поток записи родительского
+    процесса, поэтому ротацию файла выполняет только один процесс.
+    Возвращает очередь для log_to_queue или None, если журнал не настроен.
+    """
+    global _worker_listener
+    if _listener is None:
+        return None
+    stop_worker_logging()
+    worker_queue = multiprocessing.Queue(LOG_QUEUE_SIZE)
+    _worker_listener = logging.handlers.QueueListener(worker_queue, *_listener.handlers, respect_handler_level=True)
+    _worker_listener.start()
+    return worker_queue
+
+
+def stop_worker_logging():
+    """Запись оставшихся записей рабочих процессов и остановка их очереди."""
+    global _worker_listener
+    if _worker_listener is None:
+        return
+    try:
+        _worker_listener.stop()
+    except Exception as e:
+        print(f"Ошибка остановки журнала рабочих процессов: {e}", file=sys.stderr)
+    _worker_listener = None
+
+
+def log_to_queue(worker_queue):
+    """Журнал рабочего процесса: записи передаются в очередь родительского процесса."""
+    global _queue_handler
+    stop_logging()
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    _queue_handler = _DroppingQueueHandler(worker_queue)
+    root.addHandler(_queue_handler)
+
+
+def setup_logging(log_file=LOG_FILE, console=False, level=logging.INFO):
+    """Настройка журнала: записи ставятся в очередь, а пишет их в файл отдельный поток.
+
+    Повторный вызов заменяет настройки. После fork (демонизация) поток записи
+    запускается в дочернем процессе заново; рабочие процессы супервизора
+    передают записи в его очередь (см. start_worker_logging).
+    """
+    global _settings
+    first_call = _settings is None
+    stop_logging()
+    _settings = (log_file, console, level)
+    _start()
+    if first_call:
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Запись оставшихся в очереди записей и остановка потока записи."""
+    global _listener
+    if _queue_handler is not None and _queue_handler.dropped:
+        logging.warning(f"Отброшено записей журнала при переполнении очереди: {_queue_handler.dropped}.")
+        _queue_handler.dropped = 0
+    if _listener is None:
+        return
+    try:
+        _listener.stop()
+    except Exception as e:
+        print(f"Ошибка остановки журнала: {e}", file=sys.stderr)
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -1,28 +1,50 @@
 import os
 import sys
+import time
+import argparse
 import signal
-import asyncio
 import logging
-from processing import monitor_ips_with_telegram_delay
-from objects import add_new_object, update_existing_object, choose_object_name
-from db_manager import initialize_db, execute_query, toggle_logging, is_logging_enabled
+from log_config import setup_logging, LOG_FILE
+from endpoints import METRICS_HOST, METRICS_PORT, COLLECTOR_HOST, COLLECTOR_PORT
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    filename="service.log"
-)
+# Модули мониторинга (Telegram, asyncio) и база данных импортируются в функциях,
+# которым они нужны: команды status и stop запускаются без них
 
 LOCK_FILE = "/tmp/monitor_service.lock"
 
 
+SUPERVISOR_MODE = "supervisor"
+
+# Журнал воспроизведения трассы: переходы воспроизведения не смешиваются с журналом сервиса
+REPLAY_LOG_FILE = "replay.log"
+
+# Время на штатную остановку сервиса (запись снимка состояния и очереди уведомлений), затем SIGKILL
+STOP_TIMEOUT = 20
+
+
+def write_lock(mode):
+    """Запись lock-файла: PID сервиса и режим работы."""
+    with open(LOCK_FILE, "w") as f:
+        f.write(f"{os.getpid()}\n{mode}")
+
+
+def read_lock():
+    """Чтение lock-файла. Возвращает (pid, режим) или (None, None)."""
+    if not os.path.exists(LOCK_FILE):
+        return None, None
+    with open(LOCK_FILE, "r") as f:
+        lines = f.read().strip().splitlines()
+    if not lines:
+        return None, None
+    mode = lines[1] if len(lines) > 1 else None
+    return int(lines[0]), mode
+
+
 def is_service_running():
     """Проверяет, запущен ли сервис."""
-    if os.path.exists(LOCK_FILE):
-        with open(LOCK_FILE, "r") as f:
-            pid = int(f.read().strip())
-        if os.path.exists(f"/proc/{pid}"):
-            return pid
+    pid, _ = read_lock()
+    if pid and os.path.exists(f"/proc/{pid}"):
+        return pid
     return None
 
 
@@ -54,13 +76,14 @@ def start_service(object_name, object_data, delay):
         return
 
     daemonize()
+    setup_logging()
+    write_lock(object_name)
 
-    with open(LOCK_FILE, "w") as f:
-        f.write(str(os.getpid()))
-
+    import asyncio
+    from processing import monitor_ips_with_telegram_delay
     logging.info(f"Сервис запущен для объекта '{object_name}' с PID {os.getpid()}.")
     try:
-        asyncio.run(monitor_ips_with_telegram_delay(object_data, delay))
+        asyncio.run(monitor_ips_with_telegram_delay(object_data, delay, metrics_port=METRICS_PORT))
     except Exception as e:
         logging.error(f"Ошибка в сервисе: {e}")
     finally:
@@ -68,35 +91,143 @@ def start_service(object_name, object_data, delay):
             os.remove(LOCK_FILE)
 
 
+def start_supervisor_service(workers):
+    """Запуск сервиса мониторинга всех объектов."""
+    pid = is_service_running()
+    if pid:
+        print(f"Сервис уже запущен с PID {pid}.")
+        return
+
+    daemonize()
+    setup_logging()
+    write_lock(SUPERVISOR_MODE)
+
+    from supervisor import run_supervisor
+    logging.info(f"Сервис запущен для всех объектов с PID {os.getpid()}, рабочих процессов: {workers}.")
+    try:
+        run_supervisor(workers)
+    except Exception as e:
+        logging.error(f"Ошибка в сервисе: {e}")
+    finally:
+        if os.path.exists(LOCK_FILE):
+            os.remove(LOCK_FILE)
+
+
+def wait_for_exit(pid, timeout):
+    """Ожидание завершения процесса. Возвращает False, если он работает дольше timeout секунд."""
+    deadline = time.monotonic() + timeout
+    while os.path.exists(f"/proc/{pid}"):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.2)
+    return True
+
+
 def stop_service():
     """Остановка запущенного сервиса."""
     pid = is_service_running()
     if pid:
-        os.kill(pid, signal.SIGTERM)
-        os.remove(LOCK_FILE)
-        print(f"Сервис с PID {pid} остановлен.")
+        _, mode = read_lock()
+        # Демон работает в собственной группе процессов: сигнал получают и рабочие процессы супервизора
+        pgid = os.getpgid(pid)
+        own_group = pgid == os.getpgrp()
+        if not own_group:
+            os.killpg(pgid, signal.SIGTERM)
+        else:
+            os.kill(pid, signal.SIGTERM)
+        if not wait_for_exit(pid, STOP_TIMEOUT):
+            logging.warning(f"Сервис с PID {pid} не завершился за {STOP_TIMEOUT} с, принудительная остановка.")
+            if not own_group:
+                os.killpg(pgid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGKILL)
+        if os.path.exists(LOCK_FILE):
+            os.remove(LOCK_FILE)
+        if mode == SUPERVISOR_MODE:
+            print(f"Сервис мониторинга всех объектов с PID {pid} остановлен.")
+        else:
+            print(f"Сервис с PID {pid} остановлен.")
         logging.info(f"Сервис с PID {pid} остановлен.")
     else:
         print("Сервис не запущен.")
 
 
+def fetch_status(port, timeout=1):
+    """Сводка по объектам из API состояния запущенного сервиса или None, если он не отвечает."""
+    import json
+    import socket
+    chunks = []
+    try:
+        with socket.create_connection((METRICS_HOST, port), timeout=timeout) as sock:
+            sock.sendall(b"GET /status HTTP/1.0\r\n\r\n")
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        return None
+    try:
+        return json.loads(body)["objects"]
+    except (ValueError, KeyError):
+        return None
+
+
+def print_status():
+    """Состояние сервиса и сводка по объектам. Возвращает 0, если сервис запущен, иначе 3."""
+    pid = is_service_running()
+    if not pid:
+        print("Сервис не запущен.")
+        return 3
+    _, mode = read_lock()
+    target = "всех объектов" if mode == SUPERVISOR_MODE else f"объекта '{mode}'"
+    print(f"Сервис мониторинга {target} запущен с PID {pid}.")
+    # Рабочий процесс супервизора N публикует состояние на порту METRICS_PORT + N
+    port = METRICS_PORT
+    while port < METRICS_PORT + 256:
+        objects = fetch_status(port)
+        if objects is None:
+            break
+        for summary in objects:
+            print(f"  {summary['object']}: хостов {summary['hosts']}, доступны {summary['up']}, "
+                  f"недоступны {summary['down']}, проверяются {summary['suspect']}, "
+                  f"недоступны через родительский узел {summary['via_parent']}, деградация {summary['degraded']}")
+        if mode != SUPERVISOR_MODE:
+            break
+        port += 1
+    if port == METRICS_PORT and fetch_status(port) is None:
+        print("API состояния не отвечает.")
+    return 0
+
+
 def choose_monitoring_object():
     """Выбор объекта для мониторинга и запуск сервиса."""
+    from objects import choose_object_name
+    from db_manager import execute_query, load_object_hosts, is_logging_enabled, toggle_logging
+    from db_manager import is_rtt_history_enabled, toggle_rtt_history, is_probe_trace_enabled, toggle_probe_trace
     object_name = choose_object_name()
     if not object_name:
         return
 
     delay = int(input("Введите задержку между проверками (в секундах, по умолчанию 10): ") or 10)
-    query = "SELECT ip_list, telegram_token, telegram_chat_ids FROM objects WHERE object_name = ?"
+    query = "SELECT telegram_token, telegram_chat_ids FROM objects WHERE object_name = ?"
     result = execute_query(query, (object_name,))
     if not result:
         print(f"Объект '{object_name}' не найден.")
         return
 
-    ip_list, telegram_token, telegram_chat_ids = result[0]
+    telegram_token, telegram_chat_ids = result[0]
+    try:
+        hosts = load_object_hosts(object_name)
+    except ValueError as e:
+        print(e)
+        return
     object_data = {
         "object_name": object_name,
-        "ip_list": ip_list.split(","),
+        "ip_list": hosts,
         "telegram_token": telegram_token,
         "telegram_chat_ids": telegram_chat_ids.split(","),
     }
@@ -105,10 +236,17 @@ def choose_monitoring_object():
     print("1. Запустить мониторинг вручную (нажмите Ctrl+C для остановки).")
     print("2. Запустить как сервис.")
     print("3. Включить/выключить логирование.")
+    print("4. Включить/выключить запись RTT в историю.")
+    print("5. Настроить пороги деградации связи.")
+    print("6. Настроить способ проверки (ICMP, TCP, UDP).")
+    print("7. Включить/выключить запись трассы проверок.")
+    print("8. Настроить интервал и приоритет проверки IP.")
     choice = input("Введите номер действия: ").strip()
 
     if choice == "1":
         print("Запуск мониторинга вручную...")
+        import asyncio
+        from processing import monitor_ips_with_telegram_delay
         try:
             asyncio.run(monitor_ips_with_telegram_delay(object_data, delay))
         except KeyboardInterrupt:
@@ -117,21 +255,108 @@ def choose_monitoring_object():
         start_service(object_name, object_data, delay)
     elif choice == "3":
         current_logging = is_logging_enabled(object_name)
-        toggle_logging(object_name, enable=not current_logging)
-        print(f"Логирование {'включено' if not current_logging else 'отключено'} для объекта '{object_name}'.")
+        sample_rate = None
+        if not current_logging:
+            try:
+                percent = input("Доля записываемых результатов проверок в % (пусто - все): ").strip()
+                sample_rate = float(percent) / 100 if percent else None
+                toggle_logging(object_name, enable=True, sample_rate=sample_rate)
+            except ValueError as e:
+                print(f"Некорректный ввод: {e}")
+                return
+        else:
+            toggle_logging(object_name, enable=False)
+        print(f"Логирование {'включено' if not current_logging else 'отключено'} для объекта '{object_name}'"
+              f"{f' (записывается {sample_rate:.0%} результатов)' if sample_rate else ''}.")
+    elif choice == "4":
+        current_rtt_history = is_rtt_history_enabled(object_name)
+        toggle_rtt_history(object_name, enable=not current_rtt_history)
+        print(f"Запись RTT в историю {'включена' if not current_rtt_history else 'отключена'} для объекта '{object_name}'.")
+    elif choice == "5":
+        configure_degraded_thresholds(object_name)
+    elif choice == "6":
+        configure_probe_method(object_name)
+    elif choice == "7":
+        from probe_trace import trace_path
+        current_trace = is_probe_trace_enabled(object_name)
+        toggle_probe_trace(object_name, enable=not current_trace)
+        print(f"Запись трассы проверок {'включена' if not current_trace else 'отключена'} для объекта '{object_name}'"
+              f"{' (файл ' + trace_path(object_name) + ')' if not current_trace else ''}.")
+    elif choice == "8":
+        configure_probe_schedule(object_name)
     else:
         print("Некорректный выбор.")
 
 
+def configure_degraded_thresholds(object_name):
+    """Настройка порогов деградации связи: пустой ввод отключает порог."""
+    from db_manager import set_degraded_thresholds
+    try:
+        rtt = input("Порог среднего RTT в мс (пусто - не проверять): ").strip()
+        loss = input("Порог потерь в % (пусто - не проверять): ").strip()
+        rtt = float(rtt) if rtt else None
+        loss = float(loss) / 100 if loss else None
+    except ValueError:
+        print("Некорректный ввод.")
+        return
+    set_degraded_thresholds(object_name, rtt=rtt, loss=loss)
+    print(f"Пороги деградации для объекта '{object_name}' сохранены.")
+
+
+def configure_probe_method(object_name):
+    """Настройка способа проверки объекта или отдельного IP. TCP и UDP не требуют прав root."""
+    from db_manager import set_object_probe_method, set_probe_method
+    ip = input("IP для индивидуальной настройки (пусто - для всего объекта): ").strip()
+    spec = input("Способ проверки: icmp, tcp[:порт] или udp[:порт] (пусто - по умолчанию): ").strip()
+    try:
+        if ip:
+            set_probe_method(ip, object_name, spec or None)
+        else:
+            set_object_probe_method(object_name, spec or None)
+    except ValueError as e:
+        print(f"Некорректный ввод: {e}")
+        return
+    print(f"Способ проверки {'IP ' + ip if ip else 'объекта'} '{object_name}' сохранен.")
+
+
+def configure_probe_schedule(object_name):
+    """Настройка интервала и приоритета проверок отдельного IP. Приоритет выше 0 отключает замедление."""
+    from db_manager import set_probe_override
+    ip = input("IP для настройки: ").strip()
+    interval = input("Интервал проверок в секундах (пусто - как у объекта): ").strip()
+    priority = input("Приоритет (0 - замедлять недоступный хост, больше 0 - не замедлять): ").strip()
+    if not ip:
+        print("IP не указан.")
+        return
+    try:
+        set_probe_override(ip, object_name, interval or None, priority or 0)
+    except ValueError as e:
+        print(f"Некорректный ввод: {e}")
+        return
+    print(f"Интервал и приоритет проверки IP {ip} объекта '{object_name}' сохранены.")
+
+
+def choose_supervisor_workers():
+    """Запуск мониторинга всех объектов с выбором числа рабочих процессов."""
+    try:
+        workers = int(input("Введите количество рабочих процессов (по умолчанию 1): ").strip() or 1)
+    except ValueError:
+        print("Некорректный ввод.")
+        return
+    start_supervisor_service(max(workers, 1))
+
+
 def main_menu():
     """Главное меню программы."""
+    from objects import add_new_object, update_existing_object
     while True:
         print("\nГлавное меню:")
         print("1. Добавить новый объект")
         print("2. Обновить существующий объект")
         print("3. Выбрать объект для мониторинга")
-        print("4. Остановить сервис")
-        print("5. Выход")
+        print("4. Запустить мониторинг всех объектов как сервис")
+        print("5. Остановить сервис")
+        print("6. Выход")
         choice = input("Введите номер действия: ").strip()
 
         if choice == "1":
@@ -141,16 +366,111 @@ def main_menu():
         elif choice == "3":
             choose_monitoring_object()
         elif choice == "4":
-            stop_service()
+            choose_supervisor_workers()
         elif choice == "5":
+            stop_service()
+        elif choice == "6":
             print("Выход из программы.")
             break
         else:
             print("Некорректный выбор. Попробуйте снова.")
 
 
+def parse_args(argv=None):
+    """Разбор аргументов командной строки. Без команды запускается интерактивное меню."""
+    parser = argparse.ArgumentParser(description="Мониторинг доступности IP-адресов с уведомлениями в Telegram.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("status", help="состояние сервиса и сводка по объектам")
+    subparsers.add_parser("stop", help="остановка сервиса")
+    subparsers.add_parser("list-objects", help="список объектов")
+
+    import_parser = subparsers.add_parser("import", help="импорт объектов, диапазонов и имен IP из CSV/JSON")
+    import_parser.add_argument("path", help="файл для импорта ('-' — стандартный ввод)")
+    import_parser.add_argument("--format", choices=("csv", "json"), help="формат файла (по умолчанию по расширению)")
+
+    export_parser = subparsers.add_parser("export", help="экспорт объектов, диапазонов и имен IP в CSV/JSON")
+    export_parser.add_argument("path", help="файл для экспорта ('-' — стандартный вывод)")
+    export_parser.add_argument("--format", choices=("csv", "json"), help="формат файла (по умолчанию по расширению)")
+    export_parser.add_argument("--object", action="append", dest="objects", help="экспортировать только этот объект")
+
+    collector_parser = subparsers.add_parser("collector", help="коллектор: состояние, история и уведомления, "
+                                                               "проверки выполняют агенты")
+    collector_parser.add_argument("--listen", help="адрес для подключения агентов (host:port, по умолчанию 127.0.0.1:9200)")
+    collector_parser.add_argument("--token", help="общий токен агентов и коллектора")
+
+    agent_parser = subparsers.add_parser("agent", help="агент проверок, подключающийся к коллектору")
+    agent_parser.add_argument("--collector", help="адрес коллектора (host:port, по умолчанию 127.0.0.1:9200)")
+    agent_parser.add_argument("--name", help="имя агента (по умолчанию имя хоста и PID)")
+    agent_parser.add_argument("--token", help="общий токен агентов и коллектора")
+    agent_parser.add_argument("--metrics-port", type=int, help="порт метрик проверок агента (по умолчанию не публикуются)")
+    replay_parser = subparsers.add_parser("replay", help="воспроизведение трассы проверок на копии базы данных")
+    replay_parser.add_argument("path", help="файл трассы (traces/<объект>.trace)")
+    replay_parser.add_argument("--speed", type=float, help="ускорение относительно реального времени "
+                                                            "(по умолчанию без пауз между пакетами)")
+    return parser.parse_args(argv)
+
+
+def run_command(args):
+    """Выполнение команды командной строки. Возвращает код завершения."""
+    try:
+        if args.command == "status":
+            return print_status()
+        elif args.command == "stop":
+            # Журнал открывается, только если сервис действительно останавливается
+            if is_service_running():
+                setup_logging()
+            stop_service()
+        elif args.command == "list-objects":
+            from objects import print_objects
+            print_objects()
+        elif args.command == "import":
+            from objects import import_objects_file
+            objects_count, names_count = import_objects_file(args.path, args.format)
+            print(f"Импортировано объектов: {objects_count}, имен IP: {names_count}.", file=sys.stderr)
+        elif args.command == "export":
+            from objects import export_objects_file
+            count = export_objects_file(args.path, args.format, args.objects)
+            print(f"Экспортировано объектов: {count}.", file=sys.stderr)
+        elif args.command == "collector":
+            import asyncio
+            from cluster import run_collector, parse_address
+            host, port = parse_address(args.listen) if args.listen else (COLLECTOR_HOST, COLLECTOR_PORT)
+            asyncio.run(run_collector(host, port, args.token))
+        elif args.command == "agent":
+            import asyncio
+            from cluster import run_agent, parse_address
+            host, port = parse_address(args.collector) if args.collector else (COLLECTOR_HOST, COLLECTOR_PORT)
+            asyncio.run(run_agent(host, port, args.name, args.token, metrics_port=args.metrics_port))
+        elif args.command == "replay":
+            from replay import run_replay
+            report, messages = run_replay(args.path, args.speed)
+            for _, chat_id, text in messages:
+                print(f"--- {chat_id}\n{text}\n")
+            print(f"Пакетов: {report['sweeps']}, проверок: {report['probes']}, уведомлений: {report['alerts']}, "
+                  f"изменено строк базы: {report['db_rows_changed']}. Трасса {report['trace_duration']} с "
+                  f"воспроизведена за {report['elapsed']} с ({report['probes_per_second']} проверок/с).",
+                  file=sys.stderr)
+    except Exception as e:
+        logging.error(f"Ошибка выполнения команды {args.command}: {e}")
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
 if __name__ == "__main__":
-    initialize_db()
+    args = parse_args()
+    # status и stop работают с lock-файлом и API состояния: журнал и база не нужны
+    if args.command in ("status", "stop"):
+        sys.exit(run_command(args))
+    setup_logging(log_file=REPLAY_LOG_FILE if args.command == "replay" else LOG_FILE,
+                  console=args.command in (None, "collector", "agent"))
+    # Агенту база данных не нужна: конфигурацию и состояние ведет коллектор
+    if args.command != "agent":
+        from db_manager import initialize_db
+        initialize_db()
+    if args.command:
+        sys.exit(run_command(args))
 
     pid = is_service_running()
     if pid:
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from urllib.parse import parse_qsl
+from endpoints import METRICS_HOST, METRICS_PORT
+
+# Границы корзин гистограмм (в секундах)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Время ожидания следующего запроса в открытом соединении (в секундах)
+KEEPALIVE_TIMEOUT = 5
+
+# Дополнительные пути HTTP-сервера: путь -> функция(параметры запроса) -> (статус, тип содержимого, тело)
+_ROUTES = {}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(ABC):
+    """Базовый класс метрики: значения по наборам меток, изменяемые под блокировкой.
+
+    Метрика регистрируется при создании, а текст для Prometheus формируется
+    только при запросе /metrics, поэтому без опроса учет стоит одного
+    сложения на событие.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def _samples(self):
+        """Значения метрики: список (суффикс имени, метки, доп. метки, значение)."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [("", labels, (), value) for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Метрика с текущим значением; может вычисляться функцией в момент опроса."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                return [("", (), (), self._function())]
+            except Exception as e:
+                logging.error(f"Ошибка вычисления метрики {self.name}: {e}")
+                return []
+        with self._lock:
+            return [("", labels, (), value) for labels, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами: наблюдение — поиск корзины и два сложения."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _series(self, labels):
+        series = self._values.get(labels)
+        if series is None:
+            # Счетчики корзин (последняя — +Inf) и сумма наблюдений
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        return series
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, _ = series = self._series(labels)
+            counts[bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def observe_many(self, values, *labels):
+        """Учет набора наблюдений за одно взятие блокировки."""
+        buckets = self.buckets
+        with self._lock:
+            counts, _ = series = self._series(labels)
+            total = 0.0
+            for value in values:
+                counts[bisect_left(buckets, value)] += 1
+                total += value
+            series[1] += total
+
+    def _samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        samples = []
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", labels, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", labels, (), total))
+            samples.append(("_count", labels, (), cumulative))
+        return samples
+
+
+REGISTRY = []
+
+
+def render_metrics():
+    """Текст всех зарегистрированных метрик в формате Prometheus."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Метрики сервиса
+SWEEP_DURATION = Histogram("ping_sweep_duration_seconds", "Длительность пакетной проверки хостов.",
+                           ("object", "kind"))
+SWEEP_HOSTS = Counter("ping_sweep_hosts_total", "Количество проверенных хостов.", ("object", "kind"))
+SCHEDULER_LAG = Gauge("ping_scheduler_lag_seconds", "Отставание такта планировщика от расписания.", ("object",))
+BATCHES_IN_FLIGHT = Gauge("ping_batches_in_flight", "Количество незавершенных пакетов проверок.", ("object",))
+PROBE_INTERVAL = Gauge("ping_probe_interval_seconds", "Интервал проверок объекта (задержка).", ("object",))
+PROBE_RTT = Histogram("ping_probe_rtt_seconds", "RTT ответивших хостов.", ("object",), RTT_BUCKETS)
+PROBE_TIMEOUTS = Counter("ping_probe_timeouts_total", "Проверки без ответа до таймаута.", ("object",))
+PROBES_SKIPPED = Counter("ping_probes_skipped_total", "Проверки, пропущенные из-за недоступного родительского узла.",
+                         ("object",))
+DB_QUERY_DURATION = Histogram("ping_db_query_duration_seconds", "Длительность запросов к базе данных.",
+                              ("operation",), QUERY_BUCKETS)
+NOTIFY_QUEUE_DEPTH = Gauge("ping_notification_queue_depth", "Сообщения, ожидающие отправки в Telegram.")
+NOTIFY_SEND_DURATION = Histogram("ping_notification_send_duration_seconds",
+                                 "Длительность отправки сообщения в Telegram.")
+NOTIFY_SENT = Counter("ping_notifications_sent_total", "Отправленные сообщения Telegram.")
+NOTIFY_FAILED = Counter("ping_notifications_failed_total", "Сообщения Telegram, не отправленные после всех попыток.")
+AGENTS_CONNECTED = Gauge("ping_agents_connected", "Агенты проверок, подключенные к коллектору.")
+AGENT_ERRORS = Counter("ping_agent_errors_total", "Ошибки проверок, о которых сообщили агенты.", ("object",))
+
+
+def register_route(path, handler):
+    """Регистрация обработчика GET-запросов на сервере метрик.
+
+    handler получает словарь параметров запроса и возвращает (статус, тип содержимого, тело в байтах).
+    """
+    _ROUTES[path] = handler
+
+
+def _respond(method, target):
+    path, _, query = target.partition("?")
+    if method != "GET":
+        return "405 Method Not Allowed", "text/plain", b"Method Not Allowed\n"
+    if path in ("/metrics", "/"):
+        return "200 OK", _CONTENT_TYPE, render_metrics().encode()
+    handler = _ROUTES.get(path)
+    if handler is None:
+        return "404 Not Found", "text/plain", b"Not Found\n"
+    try:
+        return handler(dict(parse_qsl(query)))
+    except Exception as e:
+        logging.error(f"Ошибка обработки запроса {target}: {e}")
+        return "500 Internal Server Error", "text/plain", b"Internal Server Error\n"
+
+
+async def _handle_request(reader, writer):
+    # Соединение HTTP/1.1 остается открытым для следующих запросов, пока клиент его не закроет
+    try:
+        while True:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=KEEPALIVE_TIMEOUT)
+            if not request_line:
+                break
+            parts = request_line.decode("latin-1").split()
+            keep_alive = len(parts) >= 3 and parts[2] == "HTTP/1.1"
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "connection":
+                    keep_alive = value.strip().lower() == "keep-alive" or (keep_alive and value.strip().lower() != "close")
+            if len(parts) >= 2:
+                status, content_type, body = _respond(parts[0], parts[1])
+            else:
+                status, content_type, body = "400 Bad Request", "text/plain", b"Bad Request\n"
+                keep_alive = False
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except asyncio.TimeoutError:
+        pass
+    except ConnectionError as e:
+        logging.warning(f"Ошибка обработки запроса метрик: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Запуск HTTP-сервера метрик. Возвращает сервер или None, если порт недоступен."""
+    try:
+        server = await asyncio.start_server(_handle_request, host, port)
+    except OSError as e:
+        logging.error(f"Не удалось запустить сервер метрик на {host}:{port}: {e}")
+        return None
+    logging.info(f"Сервер метрик запущен на http://{host}:{port}/metrics.")
+    return server
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from telegram import Bot
+from telegram.error import RetryAfter, NetworkError, TimedOut, TelegramError
+from metrics import NOTIFY_QUEUE_DEPTH, NOTIFY_SEND_DURATION, NOTIFY_SENT, NOTIFY_FAILED
+
+# Ограничения Telegram: около 30 сообщений в секунду на бота и 1 сообщение в секунду в один чат
+GLOBAL_RATE = 25
+PER_CHAT_RATE = 1
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n"
+
+
+class RateLimiter:
+    """Ограничитель частоты по алгоритму token bucket."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def split_digest(messages, limit=MAX_MESSAGE_LENGTH):
+    """Объединение сообщений в дайджесты, не превышающие лимит длины Telegram."""
+    chunks = []
+    current = ""
+    for message in messages:
+        message = message[:limit]
+        candidate = f"{current}{DIGEST_SEPARATOR}{message}" if current else message
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = message
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class _ChatChannel:
+    """Очередь сообщений одного чата с собственным ограничителем частоты."""
+
+    def __init__(self, token, chat_id, per_chat_rate):
+        self.token = token
+        self.chat_id = chat_id
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.limiter = RateLimiter(per_chat_rate)
+        self.sending = False
+        self.task = None
+
+
+class TelegramDispatcher:
+    """Фоновая отправка уведомлений в Telegram.
+
+    Сообщения ставятся в очередь без ожидания отправки, поэтому цикл проверок
+    не блокируется. На каждый токен создается один клиент Bot, для каждого чата
+    работает отдельная задача с ограничением частоты, а все чаты вместе
+    ограничены общей частотой. Сообщения, накопившиеся в очереди чата, пока
+    он ждет своей очереди, уходят одним дайджестом.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE, max_retries=MAX_RETRIES,
+                 base_url=None, bot_factory=None):
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self._bot_factory = bot_factory or self._create_bot
+        self._global_limiter = RateLimiter(global_rate, burst=global_rate)
+        self._bots = {}
+        self._channels = {}
+        self.sent = 0
+        self.failed = 0
+        NOTIFY_QUEUE_DEPTH.set_function(self.queue_depth)
+
+    def _create_bot(self, token):
+        if self.base_url:
+            return Bot(token, base_url=self.base_url)
+        return Bot(token)
+
+    def get_bot(self, token):
+        """Клиент Bot для токена. Создается один раз и переиспользуется."""
+        bot = self._bots.get(token)
+        if bot is None:
+            bot = self._bots[token] = self._bot_factory(token)
+        return bot
+
+    def queue_depth(self):
+        """Количество сообщений, ожидающих отправки."""
+        return sum(len(channel.pending) for channel in self._channels.values())
+
+    def submit(self, token, chat_ids, messages):
+        """Постановка сообщений в очередь всех указанных чатов без ожидания отправки."""
+        if isinstance(messages, str):
+            messages = [messages]
+        if not messages:
+            return
+        for chat_id in chat_ids:
+            key = (token, chat_id)
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _ChatChannel(token, chat_id, self.per_chat_rate)
+            channel.pending.extend(messages)
+            if channel.task is None or channel.task.done():
+                channel.task = asyncio.ensure_future(self._run_channel(channel))
+            channel.wakeup.set()
+
+    async def _run_channel(self, channel):
+        while True:
+            if not channel.pending:
+                channel.wakeup.clear()
+                await channel.wakeup.wait()
+                continue
+            await channel.limiter.acquire()
+            messages, channel.pending = channel.pending, []
+            channel.sending = True
+            try:
+                for index, digest in enumerate(split_digest(messages)):
+                    if index:
+                        await channel.limiter.acquire()
+                    await self._send_with_retry(channel, digest)
+            except Exception as e:
+                # Непредвиденная ошибка не должна останавливать очередь чата
+                self.failed += 1
+                NOTIFY_FAILED.inc()
+                logging.error(f"Ошибка отправки сообщений в чат {channel.chat_id}: {e}")
+            finally:
+                channel.sending = False
+
+    async def _send_with_retry(self, channel, text):
+        bot = self.get_bot(channel.token)
+        delay = RETRY_BASE_DELAY
+        for attempt in range(1, self.max_retries + 1):
+            await self._global_limiter.acquire()
+            try:
+                # Первый вызов проверяет токен и открывает HTTP-сессию; дальше он ничего не делает
+                await bot.initialize()
+                started = time.monotonic()
+                await bot.send_message(chat_id=channel.chat_id, text=text)
+                NOTIFY_SEND_DURATION.observe(time.monotonic() - started)
+                NOTIFY_SENT.inc()
+                self.sent += 1
+                return True
+            except RetryAfter as e:
+                logging.warning(f"Превышен лимит Telegram для {channel.chat_id}, повтор через {e.retry_after} с.")
+                await asyncio.sleep(e.retry_after)
+            except (TimedOut, NetworkError) as e:
+                logging.warning(f"Ошибка сети при отправке в Telegram для {channel.chat_id} (попытка {attempt}): {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+            except TelegramError as e:
+                logging.error(f"Ошибка при отправке сообщения в Telegram для {channel.chat_id}: {e}")
+                break
+        self.failed += 1
+        NOTIFY_FAILED.inc()
+        logging.error(f"Сообщение для {channel.chat_id} не отправлено.")
+        return False
+
+    async def drain(self, timeout=None):
+        """Ожидание отправки всех сообщений из очереди."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(channel.pending or channel.sending for channel in self._channels.values()):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def close(self, timeout=10):
+        """Отправка оставшихся сообщений, остановка задач и закрытие клиентов."""
+        if not await self.drain(timeout):
+            logging.warning(f"Не отправлено сообщений при остановке: {self.queue_depth()}.")
+        for channel in self._channels.values():
+            if channel.task is not None:
+                channel.task.cancel()
+        for bot in self._bots.values():
+            try:
+                await bot.shutdown()
+            except Exception as e:
+                logging.error(f"Ошибка при закрытии клиента Telegram: {e}")
+        self._bots = {}
+        self._channels = {}
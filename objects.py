@@ -1,22 +1,21 @@
-import ipaddress
+import csv
+import json
 import logging
-from db_manager import save_object_config, execute_query, update_object_delay, toggle_logging
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-def parse_ip_range(ip_input):
-    """Парсинг диапазона IP."""
-    try:
-        if '-' in ip_input:
-            start_ip, end_ip = ip_input.split('-')
-            start_ip = ipaddress.IPv4Address(start_ip.strip())
-            end_ip = ipaddress.IPv4Address(end_ip.strip())
-            return [str(ipaddress.IPv4Address(ip)) for ip in range(int(start_ip), int(end_ip) + 1)]
-        else:
-            ipaddress.IPv4Address(ip_input)  # Проверка корректности
-            return [ip_input.strip()]
-    except ValueError:
-        raise ValueError(f"Некорректный ввод IP или диапазона: {ip_input}")
+import os
+import sys
+from db_manager import save_object_config, save_ip_name, execute_query, update_object_delay, toggle_logging
+from db_manager import get_ip_name, load_object_targets
+from db_manager import import_object_rows, export_objects, TRANSFER_FIELDS
+from targets import parse_target, coalesce_ranges, iter_targets, range_size, check_host_count
+
+def parse_ip_range(ip_input, ip_list=()):
+    """Парсинг IP, диапазона start-end или подсети CIDR в TargetRange без разворачивания адресов.
+
+    ValueError, если вместе с уже введенными ip_list адресов больше, чем можно мониторить.
+    """
+    target_range = parse_target(ip_input)
+    check_host_count(coalesce_ranges(list(ip_list) + [target_range]))
+    return target_range
 
 def get_all_objects():
     """Получение списка всех объектов."""
@@ -24,6 +23,17 @@ def get_all_objects():
     results = execute_query(query)
     return [row[0] for row in results] if results else []
 
+def print_objects():
+    """Вывод списка объектов: число адресов, задержка и способ проверки."""
+    results = execute_query("SELECT object_name, delay, probe_method FROM objects ORDER BY object_name")
+    if not results:
+        print("Объекты отсутствуют в базе данных.")
+        return 0
+    for object_name, delay, probe_method in results:
+        hosts = sum(range_size(target_range) for target_range in load_object_targets(object_name))
+        print(f"{object_name}: хостов {hosts}, задержка {delay} с, проверка {probe_method or 'icmp'}")
+    return len(results)
+
 def choose_object_name():
     """Выбор имени объекта из списка."""
     object_names = get_all_objects()
@@ -53,14 +63,14 @@ def add_new_object():
         print("Имя объекта не может быть пустым.")
         return
 
-    print("Введите IP-адреса или диапазоны (формат: start-end). Для завершения ввода оставьте строку пустой.")
+    print("Введите IP-адреса, диапазоны (формат: start-end) или подсети (формат: 10.0.0.0/24). Для завершения ввода оставьте строку пустой.")
     ip_list = []
     while True:
         ip_input = input("IP или диапазон: ").strip()
         if not ip_input:
             break
         try:
-            ip_list.extend(parse_ip_range(ip_input))
+            ip_list.append(parse_ip_range(ip_input, ip_list))
         except ValueError as e:
             print(e)
 
@@ -81,13 +91,11 @@ def add_new_object():
     delay = int(input("Введите задержку в секундах (по умолчанию 10): ").strip() or 10)
     save_object_config(object_name, ip_list, telegram_token, telegram_chat_ids, delay)
 
-    for ip in ip_list:
-        existing_name_query = "SELECT ip_name FROM ip_names WHERE ip_address = ? AND object_name = ?"
-        existing_name = execute_query(existing_name_query, (ip, object_name))
-        existing_name = existing_name[0][0] if existing_name else ""
+    for ip in iter_targets(coalesce_ranges(ip_list)):
+        existing_name = get_ip_name(ip, object_name) or ""
         ip_name = input(f"Введите имя для IP {ip} (текущий: {existing_name if existing_name else 'не задан'}): ").strip() or existing_name
-        query = "INSERT OR REPLACE INTO ip_names (ip_address, object_name, ip_name) VALUES (?, ?, ?)"
-        execute_query(query, (ip, object_name, ip_name))
+        if ip_name != existing_name:
+            save_ip_name(ip, object_name, ip_name)
 
     logging.info(f"Объект '{object_name}' успешно добавлен.")
     print(f"Объект '{object_name}' успешно добавлен.")
@@ -114,12 +122,12 @@ def update_existing_object():
         parsed_ips = []
         for ip_input in new_ip_list.split(","):
             try:
-                parsed_ips.extend(parse_ip_range(ip_input.strip()))
+                parsed_ips.append(parse_ip_range(ip_input.strip(), parsed_ips))
             except ValueError as e:
                 print(e)
         new_ip_list = parsed_ips
     else:
-        new_ip_list = current_ip_list.split(",")
+        new_ip_list = load_object_targets(object_name)
 
     telegram_token = input("Введите новый Telegram-токен: ").strip() or current_token
     telegram_chat_ids = input("Введите новые Chat IDs (через запятую): ").strip() or current_chat_ids
@@ -127,12 +135,97 @@ def update_existing_object():
 
     save_object_config(object_name, new_ip_list, telegram_token, telegram_chat_ids.split(","), int(delay))
 
-    for ip in new_ip_list:
-        ip_name_query = "SELECT ip_name FROM ip_names WHERE ip_address = ? AND object_name = ?"
-        existing_name = execute_query(ip_name_query, (ip, object_name))
-        existing_name = existing_name[0][0] if existing_name else ip
+    for ip in iter_targets(coalesce_ranges(new_ip_list)):
+        existing_name = get_ip_name(ip, object_name) or ip
         ip_name = input(f"Введите имя для IP {ip} (текущий: {existing_name}): ").strip() or existing_name
-        query = "INSERT OR REPLACE INTO ip_names (ip_address, object_name, ip_name) VALUES (?, ?, ?)"
-        execute_query(query, (ip, object_name, ip_name))
+        if ip_name != existing_name:
+            save_ip_name(ip, object_name, ip_name)
 
     print(f"Данные объекта '{object_name}' успешно обновлены.")
+
+def detect_format(path, file_format=None):
+    """Формат файла импорта/экспорта: явно заданный или по расширению (csv по умолчанию)."""
+    if file_format:
+        return file_format.lower()
+    return "json" if os.path.splitext(path)[1].lower() == ".json" else "csv"
+
+def _json_rows(data):
+    """Преобразование объектов из JSON в поток строк импорта."""
+    objects = data.get("objects", []) if isinstance(data, dict) else data
+    for object_data in objects:
+        object_name = object_data.get("object_name")
+        yield {field: object_data.get(field)
+               for field in ("object_name", "telegram_token", "telegram_chat_ids", "delay", "probe")}
+        for target in object_data.get("targets", []):
+            yield {"object_name": object_name, "target": target}
+        for ip, ip_name in (object_data.get("ip_names") or {}).items():
+            yield {"object_name": object_name, "target": ip, "ip_name": ip_name}
+        for ip, parent_ip in (object_data.get("parents") or {}).items():
+            yield {"object_name": object_name, "target": ip, "parent_ip": parent_ip}
+        for ip, probe in (object_data.get("probes") or {}).items():
+            yield {"object_name": object_name, "target": ip, "probe": probe}
+        for ip, interval in (object_data.get("intervals") or {}).items():
+            yield {"object_name": object_name, "target": ip, "probe_interval": interval}
+        for ip, priority in (object_data.get("priorities") or {}).items():
+            yield {"object_name": object_name, "target": ip, "probe_priority": priority}
+
+def import_objects_file(path, file_format=None):
+    """Импорт объектов, диапазонов и имен IP из CSV или JSON ("-" — стандартный ввод).
+
+    CSV содержит колонки TRANSFER_FIELDS; строки читаются потоком и
+    записываются одной транзакцией.
+    """
+    file_format = detect_format(path, file_format)
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if file_format == "json":
+            rows = _json_rows(json.load(f))
+        else:
+            rows = csv.DictReader(f)
+        objects_count, names_count = import_object_rows(rows)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    logging.info(f"Импортировано объектов: {objects_count}, имен IP: {names_count} (файл {path}).")
+    return objects_count, names_count
+
+def _csv_rows(object_data):
+    """Строки CSV одного объекта: конфигурация, диапазоны, затем имена, родительские узлы и настройки проверки IP."""
+    yield {
+        "object_name": object_data["object_name"],
+        "telegram_token": object_data["telegram_token"],
+        "telegram_chat_ids": ",".join(object_data["telegram_chat_ids"]),
+        "delay": object_data["delay"],
+        "probe": object_data["probe"],
+    }
+    for target in object_data["targets"]:
+        yield {"object_name": object_data["object_name"], "target": target}
+    names, parents, probes = object_data["ip_names"], object_data["parents"], object_data["probes"]
+    intervals, priorities = object_data["intervals"], object_data["priorities"]
+    for ip in sorted(set(names) | set(parents) | set(probes) | set(intervals) | set(priorities)):
+        yield {"object_name": object_data["object_name"], "target": ip,
+               "ip_name": names.get(ip), "parent_ip": parents.get(ip), "probe": probes.get(ip),
+               "probe_interval": intervals.get(ip), "probe_priority": priorities.get(ip)}
+
+def export_objects_file(path, file_format=None, object_names=None):
+    """Экспорт объектов в CSV или JSON ("-" — стандартный вывод). Возвращает число объектов."""
+    file_format = detect_format(path, file_format)
+    f = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+    count = 0
+    try:
+        if file_format == "json":
+            objects = list(export_objects(object_names))
+            count = len(objects)
+            json.dump({"objects": objects}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=TRANSFER_FIELDS)
+            writer.writeheader()
+            for object_data in export_objects(object_names):
+                writer.writerows(_csv_rows(object_data))
+                count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    logging.info(f"Экспортировано объектов: {count} (файл {path}).")
+    return count
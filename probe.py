@@ -0,0 +1,529 @@
+import asyncio
+import logging
+import os
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+
+# Таймаут одного пинга (в секундах)
+DEFAULT_TIMEOUT = 1
+# Одновременных TCP/UDP-проверок: каждая занимает свой сокет
+DEFAULT_SOCKET_CONCURRENCY = 1024
+# Дескрипторы, оставляемые процессу сверх сокетов проверок (база, журнал, Telegram)
+_RESERVED_FILES = 128
+
+# Способы проверки: ICMP требует прав root или разрешения ping-сокетов, TCP и UDP работают от обычного пользователя
+PROBE_ICMP = "icmp"
+PROBE_TCP = "tcp"
+PROBE_UDP = "udp"
+PROBE_TYPES = (PROBE_ICMP, PROBE_TCP, PROBE_UDP)
+DEFAULT_PORTS = {PROBE_TCP: 80, PROBE_UDP: 33434}
+_UDP_PAYLOAD = b"ping_dev"
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+_ICMP_HEADER = struct.Struct("!BBHHH")
+_ICMP_PAYLOAD = b"ping_dev"
+# Через сколько отправленных запросов отдавать управление циклу событий,
+# чтобы ответы вычитывались из сокета, не переполняя буфер приема
+_SEND_BURST = 256
+_RECV_BUFFER_SIZE = 4 * 1024 * 1024
+
+ProbeResult = namedtuple("ProbeResult", ["reachable", "rtt"])
+ProbeResult.__doc__ = "Результат проверки хоста: доступность и время ответа в мс (None, если ответа нет)."
+
+UNREACHABLE = ProbeResult(False, None)
+
+# Результат проверки в двух байтах (пакеты агентов, трасса проверок, окно замеров):
+# RTT в десятых долях миллисекунды, максимальное значение означает потерю
+RTT_SCALE = 10
+RESULT_LOST = 0xFFFF
+RESULT_NO_RTT = 0xFFFE
+
+ProbeMethod = namedtuple("ProbeMethod", ["type", "port"])
+ProbeMethod.__doc__ = "Способ проверки хоста: тип (icmp, tcp, udp) и порт (None для ICMP)."
+
+ICMP = ProbeMethod(PROBE_ICMP, None)
+
+
+def parse_probe_method(spec):
+    """Разбор способа проверки вида icmp, tcp, tcp:22, udp:161. Пустая строка означает ICMP."""
+    spec = (spec or "").strip().lower()
+    probe_type, _, port = spec.partition(":")
+    if not probe_type or probe_type == PROBE_ICMP:
+        if port:
+            raise ValueError(f"Для ICMP порт не задается: {spec}")
+        return ICMP
+    if probe_type not in PROBE_TYPES:
+        raise ValueError(f"Неизвестный способ проверки: {spec}")
+    if not port:
+        return ProbeMethod(probe_type, DEFAULT_PORTS[probe_type])
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Некорректный порт проверки: {spec}")
+    return ProbeMethod(probe_type, int(port))
+
+
+def format_probe_method(method):
+    """Запись способа проверки в виде строки, которую принимает parse_probe_method."""
+    return method.type if method.port is None else f"{method.type}:{method.port}"
+
+
+def encode_result(probe_result):
+    """Результат проверки в виде двухбайтового значения."""
+    if not probe_result.reachable:
+        return RESULT_LOST
+    if probe_result.rtt is None:
+        return RESULT_NO_RTT
+    return min(int(probe_result.rtt * RTT_SCALE), RESULT_NO_RTT - 1)
+
+
+def decode_result(value):
+    """Результат проверки из двухбайтового значения."""
+    if value == RESULT_LOST:
+        return UNREACHABLE
+    return ProbeResult(True, None if value == RESULT_NO_RTT else value / RTT_SCALE)
+
+
+def to_network_order(values):
+    """Перестановка байтов array в сетевой порядок или обратно (на месте). Возвращает values."""
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+
+def icmp_checksum(data):
+    """Контрольная сумма ICMP (RFC 1071)."""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier, sequence, payload=_ICMP_PAYLOAD):
+    """Сборка ICMP Echo Request."""
+    header = _ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = icmp_checksum(header + payload)
+    return _ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + payload
+
+
+def build_echo_request_v6(identifier, sequence, payload=_ICMP_PAYLOAD):
+    """Сборка ICMPv6 Echo Request. Контрольную сумму ICMPv6 вычисляет ядро."""
+    return _ICMP_HEADER.pack(ICMPV6_ECHO_REQUEST, 0, 0, identifier, sequence) + payload
+
+
+def parse_echo_reply(packet):
+    """Разбор пакета из raw-сокета (с IP-заголовком). Возвращает (identifier, sequence) или None."""
+    if len(packet) < 20:
+        return None
+    header_length = (packet[0] & 0x0F) * 4
+    icmp_header = packet[header_length:header_length + _ICMP_HEADER.size]
+    if len(icmp_header) < _ICMP_HEADER.size:
+        return None
+    icmp_type, _, _, identifier, sequence = _ICMP_HEADER.unpack(icmp_header)
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return identifier, sequence
+
+
+def _parse_icmp_reply(packet, reply_type):
+    if len(packet) < _ICMP_HEADER.size:
+        return None
+    icmp_type, _, _, identifier, sequence = _ICMP_HEADER.unpack(packet[:_ICMP_HEADER.size])
+    if icmp_type != reply_type:
+        return None
+    return identifier, sequence
+
+
+def parse_echo_reply_v6(packet):
+    """Разбор пакета из сокета ICMPv6 (без IP-заголовка). Возвращает (identifier, sequence) или None."""
+    return _parse_icmp_reply(packet, ICMPV6_ECHO_REPLY)
+
+
+def parse_echo_reply_dgram(packet):
+    """Разбор пакета из ping-сокета ICMP (без IP-заголовка). Возвращает (identifier, sequence) или None."""
+    return _parse_icmp_reply(packet, ICMP_ECHO_REPLY)
+
+
+def open_icmp_socket(family=socket.AF_INET, datagram=False):
+    """Открытие ICMP- или ICMPv6-сокета.
+
+    Raw-сокет требует прав root. Ping-сокет (SOCK_DGRAM) доступен обычному
+    пользователю, если его группа входит в sysctl net.ipv4.ping_group_range;
+    identifier запросов в нем заменяет ядро.
+    """
+    protocol = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    sock = socket.socket(family, socket.SOCK_DGRAM if datagram else socket.SOCK_RAW, protocol)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _RECV_BUFFER_SIZE)
+    except OSError as e:
+        logging.warning(f"Не удалось увеличить буфер приема ICMP-сокета: {e}")
+    return sock
+
+
+class _Batch:
+    """Состояние одного пакетного обхода."""
+
+    __slots__ = ("results", "remaining", "done")
+
+    def __init__(self, remaining, done):
+        self.results = {}
+        self.remaining = remaining
+        self.done = done
+
+    def resolve(self, ip, result):
+        self.results[ip] = result
+        self.remaining -= 1
+        if self.remaining <= 0 and not self.done.done():
+            self.done.set_result(None)
+
+
+class IcmpSweeper:
+    """Пакетный ICMP-обход через один сокет на семейство адресов.
+
+    Echo Request на все адреса отправляются подряд, ответы сопоставляются
+    с хостами по паре (identifier, sequence), а на весь пакет действует один
+    общий таймаут. Сокет ICMPv6 открывается при первом IPv6-адресе. Сокеты
+    можно передать явно — например, обертки над socketpair, имитирующие
+    сеть в тестах.
+
+    При datagram=True используются ping-сокеты без прав root. Identifier в
+    них задает ядро, поэтому запросы различаются только сквозным номером
+    sequence, и одновременно ожидать ответа могут не более 65536 запросов.
+    """
+
+    _PROTOCOLS = {
+        socket.AF_INET: (build_echo_request, parse_echo_reply),
+        socket.AF_INET6: (build_echo_request_v6, parse_echo_reply_v6),
+    }
+    _DATAGRAM_PROTOCOLS = {
+        socket.AF_INET: (build_echo_request, parse_echo_reply_dgram),
+        socket.AF_INET6: (build_echo_request_v6, parse_echo_reply_v6),
+    }
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, sock=None, sock6=None, datagram=False):
+        self.timeout = timeout
+        self.datagram = datagram
+        self._protocols = self._DATAGRAM_PROTOCOLS if datagram else self._PROTOCOLS
+        self._sockets = {socket.AF_INET: sock if sock is not None else open_icmp_socket(datagram=datagram)}
+        if sock6 is not None:
+            self._sockets[socket.AF_INET6] = sock6
+        for sock in self._sockets.values():
+            sock.setblocking(False)
+        self._pending = {}
+        self._next_identifier = int.from_bytes(os.urandom(2), "big")
+        self._next_sequence = 0
+        self._loop = None
+
+    def _allocate_identifier(self):
+        identifier = self._next_identifier
+        self._next_identifier = (self._next_identifier + 1) & 0xFFFF
+        return identifier
+
+    def _allocate_sequence(self):
+        sequence = self._next_sequence
+        self._next_sequence = (self._next_sequence + 1) & 0xFFFF
+        return sequence
+
+    def _get_socket(self, family):
+        """Сокет семейства адресов; ICMPv6 открывается при первом обращении."""
+        sock = self._sockets.get(family)
+        if sock is None and family not in self._sockets:
+            try:
+                sock = open_icmp_socket(family, self.datagram)
+                sock.setblocking(False)
+                if self._loop is not None:
+                    self._loop.add_reader(sock.fileno(), self._on_readable, family)
+            except OSError as e:
+                logging.error(f"Не удалось открыть ICMPv6-сокет, IPv6-адреса считаются недоступными: {e}")
+                sock = None
+            self._sockets[family] = sock
+        return sock
+
+    def _ensure_reader(self, loop):
+        if self._loop is loop:
+            return
+        self._remove_readers()
+        for family, sock in self._sockets.items():
+            if sock is not None:
+                loop.add_reader(sock.fileno(), self._on_readable, family)
+        self._loop = loop
+
+    def _remove_readers(self):
+        if self._loop is not None and not self._loop.is_closed():
+            for sock in self._sockets.values():
+                if sock is not None:
+                    self._loop.remove_reader(sock.fileno())
+        self._loop = None
+
+    def _on_readable(self, family):
+        """Чтение всех накопившихся ответов и сопоставление их с ожидающими запросами."""
+        sock = self._sockets[family]
+        parse_reply = self._protocols[family][1]
+        while True:
+            try:
+                packet, address = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.error(f"Ошибка чтения ICMP-сокета: {e}")
+                return
+            received_at = time.monotonic()
+            key = parse_reply(packet)
+            if key and self.datagram:
+                key = (0, key[1])
+            entry = self._pending.get(key) if key else None
+            if entry is None:
+                continue
+            batch, ip, sent_at = entry
+            if address[0] != ip:
+                continue
+            del self._pending[key]
+            batch.resolve(ip, ProbeResult(True, (received_at - sent_at) * 1000))
+
+    async def _send(self, sock, packet, ip):
+        while True:
+            try:
+                sock.sendto(packet, (ip, 0))
+                return True
+            except (BlockingIOError, InterruptedError):
+                # Буфер отправки переполнен — даем ядру его разгрузить
+                await asyncio.sleep(0.001)
+            except OSError as e:
+                logging.error(f"Ошибка отправки ICMP на IP {ip}: {e}")
+                return False
+
+    async def sweep(self, ip_addresses):
+        """Проверка списка IP одним пакетом. Возвращает словарь {ip: ProbeResult}."""
+        ip_addresses = list(ip_addresses)
+        if not ip_addresses:
+            return {}
+        loop = asyncio.get_running_loop()
+        self._ensure_reader(loop)
+
+        batch = _Batch(len(ip_addresses), loop.create_future())
+        keys = []
+        try:
+            for index, ip in enumerate(ip_addresses):
+                if self.datagram:
+                    key = (0, self._allocate_sequence())
+                else:
+                    # Sequence — 16 бит, поэтому на каждые 65536 хостов берется новый identifier
+                    if index % 0x10000 == 0:
+                        identifier = self._allocate_identifier()
+                    key = (identifier, index & 0xFFFF)
+                family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+                sock = self._get_socket(family)
+                if sock is None:
+                    batch.resolve(ip, UNREACHABLE)
+                    continue
+                keys.append(key)
+                self._pending[key] = (batch, ip, time.monotonic())
+                if not await self._send(sock, self._protocols[family][0](*key), ip):
+                    del self._pending[key]
+                    batch.resolve(ip, UNREACHABLE)
+                if index % _SEND_BURST == _SEND_BURST - 1:
+                    await asyncio.sleep(0)
+
+            if not batch.done.done():
+                try:
+                    await asyncio.wait_for(asyncio.shield(batch.done), self.timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for key in keys:
+                self._pending.pop(key, None)
+
+        return {ip: batch.results.get(ip, UNREACHABLE) for ip in ip_addresses}
+
+    def close(self):
+        """Закрытие сокетов."""
+        self._remove_readers()
+        for sock in self._sockets.values():
+            if sock is not None:
+                sock.close()
+
+
+def _socket_family(ip):
+    return socket.AF_INET6 if ":" in ip else socket.AF_INET
+
+
+async def tcp_probe(ip, port, timeout=DEFAULT_TIMEOUT):
+    """TCP-проверка: установка соединения с портом на неблокирующем сокете.
+
+    Отказ в соединении (RST) тоже означает, что хост доступен: ответило его ядро.
+    RTT — время установки соединения или получения отказа.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        sock = socket.socket(_socket_family(ip), socket.SOCK_STREAM)
+    except OSError as e:
+        logging.error(f"Не удалось открыть TCP-сокет для IP {ip}: {e}")
+        return UNREACHABLE
+    try:
+        sock.setblocking(False)
+        # Закрытие сбросом (RST) вместо FIN: тысячи проверок не оставляют сокетов в TIME_WAIT
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        except ConnectionRefusedError:
+            pass
+        return ProbeResult(True, (time.monotonic() - started) * 1000)
+    except (asyncio.TimeoutError, OSError):
+        return UNREACHABLE
+    finally:
+        sock.close()
+
+
+async def udp_probe(ip, port, timeout=DEFAULT_TIMEOUT):
+    """UDP-проверка: датаграмма на порт через неблокирующий сокет.
+
+    Хост доступен, если пришел ответ или ICMP port unreachable (порт закрыт,
+    но хост отвечает). Без ответа хост считается недоступным, поэтому порт
+    по умолчанию выбирается заведомо закрытым, как в traceroute.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        sock = socket.socket(_socket_family(ip), socket.SOCK_DGRAM)
+    except OSError as e:
+        logging.error(f"Не удалось открыть UDP-сокет для IP {ip}: {e}")
+        return UNREACHABLE
+    try:
+        sock.setblocking(False)
+        # connect у UDP не ждет сети, но позволяет получить ICMP-ошибку при чтении
+        sock.connect((ip, port))
+        started = time.monotonic()
+        try:
+            await loop.sock_sendall(sock, _UDP_PAYLOAD)
+            await asyncio.wait_for(loop.sock_recv(sock, 512), timeout)
+        except ConnectionRefusedError:
+            pass
+        return ProbeResult(True, (time.monotonic() - started) * 1000)
+    except (asyncio.TimeoutError, OSError):
+        return UNREACHABLE
+    finally:
+        sock.close()
+
+
+_SOCKET_PROBES = {PROBE_TCP: tcp_probe, PROBE_UDP: udp_probe}
+
+
+def raise_file_limit(needed):
+    """Увеличение мягкого лимита открытых файлов до needed (не выше жесткого). Возвращает лимит или None."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft == resource.RLIM_INFINITY or soft >= needed:
+            return None if soft == resource.RLIM_INFINITY else soft
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        return target
+    except (ImportError, ValueError, OSError) as e:
+        logging.warning(f"Не удалось увеличить лимит открытых файлов: {e}")
+        return None
+
+
+class SocketProber:
+    """TCP- и UDP-проверки на неблокирующих сокетах asyncio, не требующие прав root.
+
+    Каждая проверка занимает отдельный сокет, поэтому одновременно выполняется
+    не больше concurrency проверок; при необходимости лимит открытых файлов
+    процесса увеличивается, а если это невозможно — concurrency уменьшается.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_SOCKET_CONCURRENCY):
+        if concurrency < 1:
+            raise ValueError("Количество одновременных проверок должно быть не меньше 1.")
+        limit = raise_file_limit(concurrency + _RESERVED_FILES)
+        if limit is not None and limit - _RESERVED_FILES < concurrency:
+            concurrency = max(limit - _RESERVED_FILES, 1)
+            logging.warning(f"Лимит открытых файлов {limit}: одновременных TCP/UDP-проверок не больше {concurrency}.")
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._loop = None
+
+    async def probe(self, ip, method):
+        """Проверка одного IP способом method (ProbeMethod с типом tcp или udp)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Семафор привязан к циклу событий, в котором создан
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        async with self._semaphore:
+            return await _SOCKET_PROBES[method.type](ip, method.port, self.timeout)
+
+    async def sweep(self, methods):
+        """Проверка хостов {ip: ProbeMethod}. Возвращает словарь {ip: ProbeResult}."""
+        if not methods:
+            return {}
+        results = await asyncio.gather(*(self.probe(ip, method) for ip, method in methods.items()))
+        return dict(zip(methods, results))
+
+
+class ProbeEngine:
+    """Асинхронный движок проверок.
+
+    Все ICMP-проверки выполняются одним пакетом через IcmpSweeper: через
+    raw-сокет или, без прав root, через ping-сокет. Если недоступны оба,
+    движок не создается. Хосты со способом проверки tcp или udp
+    проверяются через SocketProber параллельно с ICMP.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, sock=None, socket_concurrency=DEFAULT_SOCKET_CONCURRENCY):
+        self.timeout = timeout
+        self.socket_concurrency = socket_concurrency
+        self._socket_prober = None
+        try:
+            self._sweeper = IcmpSweeper(timeout, sock=sock)
+        except OSError as raw_error:
+            if sock is not None:
+                raise
+            try:
+                self._sweeper = IcmpSweeper(timeout, datagram=True)
+            except OSError as e:
+                raise OSError(f"ICMP-проверки недоступны: raw-сокет требует прав root ({raw_error}), "
+                              f"а ping-сокет — группы из sysctl net.ipv4.ping_group_range ({e}).") from e
+            logging.warning(f"Raw ICMP-сокет недоступен ({raw_error}), используется ping-сокет без прав root.")
+
+    @property
+    def socket_prober(self):
+        # Создается при первой TCP/UDP-проверке
+        if self._socket_prober is None:
+            self._socket_prober = SocketProber(self.timeout, self.socket_concurrency)
+        return self._socket_prober
+
+    async def probe(self, ip, method=None):
+        """Проверка доступности одного IP (по умолчанию по ICMP)."""
+        if method is not None and method.type != PROBE_ICMP:
+            return await self.socket_prober.probe(ip, method)
+        return (await self._sweeper.sweep([ip]))[ip]
+
+    async def sweep(self, ip_addresses, methods=None):
+        """Проверка списка IP. Возвращает словарь {ip: ProbeResult}.
+
+        methods — {ip: ProbeMethod}; хосты, которых в нем нет, проверяются по ICMP.
+        """
+        if not methods:
+            return await self._sweeper.sweep(ip_addresses)
+        ip_addresses = list(ip_addresses)
+        icmp = []
+        sockets = {}
+        for ip in ip_addresses:
+            method = methods.get(ip)
+            if method is None or method.type == PROBE_ICMP:
+                icmp.append(ip)
+            else:
+                sockets[ip] = method
+        icmp_results, socket_results = await asyncio.gather(self._sweeper.sweep(icmp), self.socket_prober.sweep(sockets))
+        return {ip: socket_results[ip] if ip in sockets else icmp_results[ip] for ip in ip_addresses}
+
+    def close(self):
+        """Закрытие сокетов."""
+        self._sweeper.close()
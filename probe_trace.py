@@ -0,0 +1,168 @@
+import logging
+import os
+import re
+import struct
+from array import array
+from collections import namedtuple
+from probe import encode_result, decode_result, to_network_order
+
+# Каталог файлов трассы проверок: по файлу на объект
+TRACE_DIR = "traces"
+# Размер файла, после которого он переименовывается в *.1 и запись начинается заново (в байтах)
+TRACE_MAX_BYTES = 256 * 1024 * 1024
+
+# Файл трассы: сигнатура, затем блоки "тип, длина данных". Блок CONFIG содержит
+# задержку объекта и его имя, HOSTS — новые IP через перевод строки (индекс хоста —
+# порядковый номер в файле), SWEEP — время получения результатов пакета, число
+# хостов, индексы хостов (4 байта) и результаты (2 байта, probe.encode_result).
+_MAGIC = b"PTRACE1\n"
+_BLOCK = struct.Struct("!BI")
+_CONFIG = struct.Struct("!H")
+_SWEEP = struct.Struct("!dI")
+BLOCK_CONFIG = 1
+BLOCK_HOSTS = 2
+BLOCK_SWEEP = 3
+
+TraceSweep = namedtuple("TraceSweep", ["timestamp", "object_name", "delay", "results"])
+TraceSweep.__doc__ = "Пакет результатов из трассы: время, объект, задержка объекта и {ip: ProbeResult}."
+
+
+def trace_path(object_name):
+    """Путь к файлу трассы объекта."""
+    return os.path.join(TRACE_DIR, re.sub(r"[^\w.-]", "_", object_name) + ".trace")
+
+
+def _read_blocks(f):
+    """Блоки файла трассы: (смещение, тип, данные). Недописанный последний блок пропускается."""
+    if f.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError(f"Файл {f.name} не является трассой проверок.")
+    while True:
+        offset = f.tell()
+        header = f.read(_BLOCK.size)
+        if len(header) < _BLOCK.size:
+            return
+        kind, length = _BLOCK.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length:
+            return
+        yield offset, kind, payload
+
+
+class TraceWriter:
+    """Запись результатов проверок объекта в файл трассы.
+
+    Файл только дополняется: при повторном открытии таблица хостов
+    восстанавливается из него, а недописанный при аварийной остановке
+    блок отбрасывается. Каждый пакет записывается одним блоком по
+    6 байт на хост.
+    """
+
+    def __init__(self, path, object_name, max_bytes=TRACE_MAX_BYTES):
+        self.path = path
+        self.object_name = object_name
+        self.max_bytes = max_bytes
+        self._hosts = []
+        self._index = {}
+        self._delay = None
+        self._file = None
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            end = self._load()
+            self._file = open(self.path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(self.path, "wb")
+            self._file.write(_MAGIC)
+
+    def _load(self):
+        """Таблица хостов и задержка из существующего файла. Возвращает конец последнего целого блока."""
+        end = len(_MAGIC)
+        with open(self.path, "rb") as f:
+            for offset, kind, payload in _read_blocks(f):
+                if kind == BLOCK_CONFIG:
+                    name = payload[_CONFIG.size:].decode("utf-8")
+                    if name != self.object_name:
+                        raise ValueError(f"Файл {self.path} содержит трассу объекта '{name}'.")
+                    self._delay = _CONFIG.unpack_from(payload)[0]
+                elif kind == BLOCK_HOSTS:
+                    self._add_hosts(payload.decode("utf-8").split("\n"))
+                end = f.tell()
+        return end
+
+    def _add_hosts(self, ip_addresses):
+        for ip in ip_addresses:
+            self._index[ip] = len(self._hosts)
+            self._hosts.append(ip)
+
+    def _write_block(self, kind, *parts):
+        self._file.write(_BLOCK.pack(kind, sum(len(part) for part in parts)))
+        for part in parts:
+            self._file.write(part)
+
+    def _rollover(self):
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._file = open(self.path, "wb")
+        self._file.write(_MAGIC)
+        self._write_block(BLOCK_CONFIG, _CONFIG.pack(self._delay), self.object_name.encode("utf-8"))
+        if self._hosts:
+            self._write_block(BLOCK_HOSTS, "\n".join(self._hosts).encode("utf-8"))
+
+    def record(self, timestamp, results, delay):
+        """Запись результатов пакета проверок {ip: ProbeResult}, полученных в момент timestamp."""
+        if not results:
+            return
+        if self._file.tell() >= self.max_bytes:
+            self._rollover()
+        delay = min(int(delay), 0xFFFF)
+        if delay != self._delay:
+            self._delay = delay
+            self._write_block(BLOCK_CONFIG, _CONFIG.pack(delay), self.object_name.encode("utf-8"))
+        new_hosts = [ip for ip in results if ip not in self._index]
+        if new_hosts:
+            self._add_hosts(new_hosts)
+            self._write_block(BLOCK_HOSTS, "\n".join(new_hosts).encode("utf-8"))
+
+        index = self._index
+        indices = to_network_order(array("I", [index[ip] for ip in results]))
+        values = to_network_order(array("H", [encode_result(probe_result) for probe_result in results.values()]))
+        self._write_block(BLOCK_SWEEP, _SWEEP.pack(timestamp, len(results)), indices.tobytes(), values.tobytes())
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError as e:
+                logging.error(f"Ошибка закрытия файла трассы {self.path}: {e}")
+            self._file = None
+
+
+def read_trace(path):
+    """Пакеты результатов из файла трассы в порядке записи."""
+    hosts = []
+    object_name = None
+    delay = None
+    with open(path, "rb") as f:
+        for _, kind, payload in _read_blocks(f):
+            if kind == BLOCK_CONFIG:
+                delay = _CONFIG.unpack_from(payload)[0]
+                object_name = payload[_CONFIG.size:].decode("utf-8")
+            elif kind == BLOCK_HOSTS:
+                hosts.extend(payload.decode("utf-8").split("\n"))
+            elif kind == BLOCK_SWEEP:
+                timestamp, count = _SWEEP.unpack_from(payload)
+                indices = array("I")
+                indices.frombytes(payload[_SWEEP.size:_SWEEP.size + count * indices.itemsize])
+                values = array("H")
+                values.frombytes(payload[_SWEEP.size + count * indices.itemsize:])
+                to_network_order(indices)
+                to_network_order(values)
+                if len(indices) != count or len(values) != count:
+                    raise ValueError(f"Поврежденный блок в файле {path}: ожидалось результатов {count}.")
+                results = {hosts[i]: decode_result(value) for i, value in zip(indices, values)}
+                yield TraceSweep(timestamp, object_name, delay, results)
@@ -1,25 +1,55 @@
 import asyncio
 import logging
+import random
+import time
 import signal
 import os
 from datetime import datetime, timedelta, timezone
-from pythonping import ping
-from db_manager import execute_query
-from telegram.ext import ApplicationBuilder
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("service.log"),  # Логи сохраняются в файл
-        logging.StreamHandler()
-    ]
-)
+from db_manager import execute_query, save_ip_statuses
+from db_manager import (record_transition, record_rtt_sample, flush_history, apply_history_retention,
+                        HISTORY_UP, HISTORY_DOWN)
+from db_manager import get_ip_name as get_cached_ip_name
+from db_manager import load_probe_overrides, load_probe_methods
+from db_manager import get_config_version, load_object_config, load_object_hosts, invalidate_ip_names
+from db_manager import load_ip_statuses, save_monitor_snapshot, load_monitor_snapshot, load_host_parents
+from probe import ProbeEngine, ICMP, PROBE_ICMP
+from notifier import TelegramDispatcher
+from debounce import DebounceTracker, INIT, SUSPECT, REVERTED, CONFIRMED, UP, DOWN, SUSPECT_UP, SUSPECT_DOWN
+from debounce import SUSPECT_STATES, Transition, is_up
+from scheduler import ProbeScheduler
+from topology import Topology
+from latency import LatencyStats, DEGRADED, NORMAL
+from metrics import (start_metrics_server, SWEEP_DURATION, SWEEP_HOSTS, SCHEDULER_LAG, BATCHES_IN_FLIGHT,
+                     PROBE_INTERVAL, PROBE_RTT, PROBE_TIMEOUTS, PROBES_SKIPPED)
+from log_config import stop_logging
+from status_api import register_monitor, unregister_monitor
+from probe_trace import TraceWriter, trace_path
 
 # Глобальная переменная для отслеживания работы сервиса
 service_running = True
 
+# Интервал подтверждающих проверок хостов с изменившимся статусом (в секундах)
+CONFIRM_INTERVAL = 1
+
+# Интервал агрегации и очистки истории статусов (в секундах)
+HISTORY_MAINTENANCE_INTERVAL = 3600
+
+# Интервал проверки версии конфигурации объекта (в секундах)
+CONFIG_POLL_INTERVAL = 5
+
+# Интервал записи снимка состояния мониторинга (в секундах); снимок также записывается при остановке
+SNAPSHOT_INTERVAL = 60
+
+# Снимок старше этого срока (в секундах) не восстанавливается: состояния хостов определяются заново
+SNAPSHOT_MAX_AGE = 24 * 3600
+
+# Статус в ip_names.connection_status хоста, который не проверяется, пока недоступен его родительский узел
+VIA_PARENT_STATUS = "недоступен через родительский узел"
+
+# Доля результатов проверок, записываемых в журнал при расширенном логировании (1 — все),
+# если для объекта не задана своя (objects.probe_log_sample_rate)
+PROBE_LOG_SAMPLE_RATE = 1.0
+
 def reset_ip_statuses(object_name):
     """Сбрасывает статусы всех IP-адресов в базе данных для заданного объекта."""
     try:
@@ -30,121 +60,585 @@ def reset_ip_statuses(object_name):
         logging.error(f"Ошибка сброса статусов IP-адресов: {e}")
 
 def get_ip_name(ip, object_name):
-    """Получение имени IP из базы данных."""
-    query = "SELECT ip_name FROM ip_names WHERE ip_address = ? AND object_name = ?"
+    """Получение имени IP из кэша имен базы данных."""
     try:
-        result = execute_query(query, (ip, object_name))
-        if result:
-            return result[0][0]
-        else:
-            logging.warning(f"Имя для IP {ip} не найдено в базе. Используется IP как имя.")
-            return ip
+        ip_name = get_cached_ip_name(ip, object_name)
+        if ip_name is not None:
+            return ip_name
+        logging.warning(f"Имя для IP {ip} не найдено в базе. Используется IP как имя.")
+        return ip
     except Exception as e:
         logging.error(f"Ошибка выполнения запроса: {e}")
         return ip
 
-async def send_telegram_message(token, chat_ids, message):
-    """Отправка сообщения в Telegram."""
-    app = ApplicationBuilder().token(token).build()
-    for chat_id in chat_ids:
-        try:
-            await app.bot.send_message(chat_id=chat_id, text=message)
-        except Exception as e:
-            logging.error(f"Ошибка при отправке сообщения в Telegram для {chat_id}: {e}")
+def _format_time(timestamp=None):
+    moment = datetime.now(timezone.utc) if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc)
+    return (moment + timedelta(hours=2)).strftime("%d.%m.%Y %H:%M:%S")
 
-async def monitor_ips_with_telegram_delay(object_data, delay):
-    """Мониторинг IP-адресов с подтверждением изменения статуса перед отправкой сообщения."""
-    object_name = object_data.get("object_name")
-    ip_addresses = object_data.get("ip_list")
-    telegram_token = object_data.get("telegram_token")
-    telegram_chat_ids = object_data.get("telegram_chat_ids")
+def format_status_message(ip_name, ip, object_name, is_reachable, dependents=0, timestamp=None):
+    """Текст уведомления об изменении статуса IP; dependents — число хостов, недоступных через этот узел."""
+    current_time = _format_time(timestamp)
+    message = (
+        f"{ip_name}: [ {ip} ]\n"
+        f"Дата: [ {current_time} ]\n"
+        f"Объект: [ {object_name} ]\n"
+        f"Статус: {'соединение восстановлено! ✅' if is_reachable else 'нет соединения! ⛔'}"
+    )
+    if dependents and not is_reachable:
+        message += f"\nНедоступны через этот узел: {dependents}"
+    return message
+
+def format_quality_message(ip_name, ip, object_name, is_degraded, summary, timestamp=None):
+    """Текст уведомления о деградации или восстановлении качества связи с IP."""
+    current_time = _format_time(timestamp)
+    message = (
+        f"{ip_name}: [ {ip} ]\n"
+        f"Дата: [ {current_time} ]\n"
+        f"Объект: [ {object_name} ]\n"
+        f"Статус: {'деградация связи! ⚠️' if is_degraded else 'качество связи восстановлено ✅'}"
+    )
+    if summary is not None:
+        message += (f"\nRTT: среднее {summary.ewma} мс, p50 {summary.p50} мс, p95 {summary.p95} мс\n"
+                    f"Потери: {summary.loss:.0%} из {summary.samples}")
+    return message
+
+class ObjectMonitor:
+    """Мониторинг IP-адресов одного объекта.
+
+    Плановые и подтверждающие проверки выполняются параллельно. Плановые
+    проверки распределяются планировщиком: каждый хост проверяется со своим
+    интервалом (по умолчанию `delay` секунд), а хосты в состоянии suspect-*
+    перепроверяются раз в секунду, пока изменение не подтвердится `delay`
+    раз подряд или не отменится.
+
+    Если у хоста задан родительский узел (ip_names.parent_ip) и тот недоступен,
+    хост не проверяется и не вызывает отдельного уведомления: он отмечается
+    как недоступный через родителя, а число таких хостов указывается в
+    уведомлении о родительском узле.
+
+    Время переходов и уведомлений берется из `clock`: при воспроизведении
+    трассы (replay.py) это виртуальные часы.
+    """
+
+    def __init__(self, object_data, delay, engine, notifier):
+        self.object_name = object_data.get("object_name")
+        self.ip_addresses = object_data.get("ip_list")
+        self.telegram_token = object_data.get("telegram_token")
+        self.telegram_chat_ids = object_data.get("telegram_chat_ids")
+        self.delay = delay
+        self.engine = engine
+        self.notifier = notifier
+        self.tracker = DebounceTracker(required=delay)
+        # Статусы, ожидающие записи в базу: записываются одной транзакцией после обработки обхода
+        self._pending_statuses = {}
+        config = self._load_config() or {}
+        self.record_rtt = bool(config.get("rtt_history"))
+        # Результаты отдельных проверок журналируются только при расширенном логировании объекта
+        self.extended_logging = bool(config.get("extended_logging"))
+        self.probe_log_sample_rate = config.get("probe_log_sample_rate") or PROBE_LOG_SAMPLE_RATE
+        # Задержка из базы на момент последнего чтения: заданная при запуске задержка
+        # заменяется при перезагрузке, только если задержка объекта в базе изменилась
+        self._config_delay = config.get("delay")
+        self.latency = LatencyStats(rtt_threshold=config.get("degraded_rtt"), loss_threshold=config.get("degraded_loss"))
+        # Способ проверки хостов объекта по умолчанию и индивидуальные способы из ip_names
+        self.probe_method = config.get("probe_method", ICMP)
+        self._probe_methods = {}
+        # Хосты, о деградации которых отправлено уведомление
+        self._degraded_alerted = set()
+        self.scheduler = ProbeScheduler(delay)
+        # Положение хостов в расписании из снимка и его возраст: применяются при постановке хостов
+        self._restored_schedule = None
+        self._batches = set()
+        self._overrides = {}
+        self.config_version = config.get("config_version")
+        self.topology = Topology()
+        # Хосты, которые не проверяются, пока недоступен их родительский узел
+        self.unreachable_via_parent = set()
+        self.clock = time.time
+        # Запись результатов проверок в файл трассы (objects.probe_trace)
+        self.trace = None
+        self._set_trace(config.get("probe_trace"))
+
+    def _set_trace(self, enabled):
+        if enabled and self.trace is None:
+            path = trace_path(self.object_name)
+            try:
+                self.trace = TraceWriter(path, self.object_name)
+                logging.info(f"Запись трассы проверок объекта '{self.object_name}' в файл {path}.")
+            except (OSError, ValueError) as e:
+                logging.error(f"Ошибка открытия файла трассы {path}: {e}")
+        elif not enabled and self.trace is not None:
+            self.trace.close()
+            self.trace = None
 
-    if not all([object_name, ip_addresses, telegram_token, telegram_chat_ids]):
-        logging.error("Недостаточно данных для мониторинга.")
-        return
+    def _load_config(self):
+        """Настройки объекта (load_object_config) или None, если объект не найден."""
+        return load_object_config(self.object_name)
 
-    # Сброс статусов при первом запуске
-    reset_ip_statuses(object_name)
+    def _load_hosts(self):
+        return load_object_hosts(self.object_name)
 
-    ip_status_cache = {}
+    def _load_host_settings(self):
+        """Индивидуальные интервалы и приоритеты, способы проверки и родительские узлы хостов."""
+        return (load_probe_overrides(self.object_name), load_probe_methods(self.object_name),
+                load_host_parents(self.object_name))
 
-    for ip in ip_addresses:
-        # Инициализация статусов из базы данных
+    def _schedule_hosts(self):
+        """Постановка всех хостов в планировщик с учетом интервалов и приоритетов из ip_names."""
+        overrides, methods, parents = self._load_host_settings()
+        for ip in self.ip_addresses:
+            interval, priority = overrides.get(ip, (None, 0))
+            self.scheduler.add_host(ip, interval, priority)
+        if self._restored_schedule is not None:
+            self.scheduler.restore(*self._restored_schedule)
+            self._restored_schedule = None
+        self._overrides = overrides
+        self._probe_methods = methods
+        self.topology = Topology(parents)
+        self._release_unblocked()
+
+    def is_configured(self):
+        return all([self.object_name, self.ip_addresses, self.telegram_token, self.telegram_chat_ids])
+
+    async def run(self):
+        """Запуск обхода и подтверждающих проверок до остановки сервиса."""
+        # Без снимка состояния статусы сбрасываются и определяются заново
+        if not self.restore_state():
+            reset_ip_statuses(self.object_name)
+        self._schedule_hosts()
+        PROBE_INTERVAL.set(self.delay, self.object_name)
+        # Текущее состояние доступно через /status сервера метрик
+        register_monitor(self)
         try:
-            query = "SELECT connection_status FROM ip_names WHERE ip_address = ? AND object_name = ?"
-            result = execute_query(query, (ip, object_name))
-            if result and result[0][0] is not None:
-                ip_status_cache[ip] = result[0][0] == "доступен"
-            else:
-                ip_status_cache[ip] = None
+            await asyncio.gather(self._sweep_loop(), self._confirm_loop(), self._config_loop(), self._snapshot_loop())
+        finally:
+            unregister_monitor(self)
+            self.save_state()
+            self._set_trace(False)
+
+    def restore_state(self):
+        """Восстановление состояния хостов из снимка. Возвращает False, если снимка нет,
+        он поврежден или старше SNAPSHOT_MAX_AGE.
+
+        Подтвержденные статусы записываются в ip_names сразу, а снимок —
+        периодически, поэтому при расхождении приоритет у статуса из базы.
+        Хосты со статусом VIA_PARENT_STATUS снова считаются недоступными через
+        родительский узел; если он уже доступен, _schedule_hosts возвращает их к проверкам.
+        Положение хостов в расписании применяется при их постановке в _schedule_hosts.
+        """
+        snapshot = load_monitor_snapshot(self.object_name)
+        if snapshot is None:
+            return False
+        saved_at, rows, schedule = snapshot
+        age = max(0, time.time() - saved_at)
+        if age > SNAPSHOT_MAX_AGE:
+            logging.warning(f"Снимок состояния объекта '{self.object_name}' записан {int(age)} с назад и не восстанавливается.")
+            return False
+        hosts = set(self.ip_addresses)
+        try:
+            restored = self.tracker.restore(row for row in rows if row[0] in hosts)
+        except (TypeError, ValueError, IndexError) as e:
+            logging.error(f"Снимок состояния объекта '{self.object_name}' поврежден: {e}")
+            self.tracker.hosts.clear()
+            return False
+        self._restored_schedule = (schedule, age)
+        for ip, status in load_ip_statuses(self.object_name).items():
+            if status == VIA_PARENT_STATUS:
+                if ip in hosts:
+                    self.unreachable_via_parent.add(ip)
+                continue
+            host = self.tracker.hosts.get(ip)
+            if host is not None and is_up(host.state) != (status == "доступен"):
+                host.state = UP if status == "доступен" else DOWN
+                host.confirmations = 0
+        logging.info(f"Состояние объекта '{self.object_name}' восстановлено из снимка {int(age)} с назад: хостов {restored}.")
+        return True
+
+    def save_state(self):
+        """Запись снимка состояния хостов."""
+        try:
+            save_monitor_snapshot(self.object_name, self.tracker.snapshot(), self.scheduler.snapshot())
         except Exception as e:
-            logging.error(f"Ошибка при инициализации статуса IP {ip}: {e}")
+            logging.error(f"Ошибка записи снимка состояния объекта '{self.object_name}': {e}")
 
-    while service_running:
+    async def _snapshot_loop(self):
+        loop = asyncio.get_running_loop()
+        while service_running:
+            await sleep_while_running(SNAPSHOT_INTERVAL)
+            if not service_running:
+                break
+            # Список собирается в цикле событий, а сжатие и запись выполняются в отдельном потоке
+            hosts = self.tracker.snapshot()
+            schedule = self.scheduler.snapshot()
+            try:
+                await loop.run_in_executor(None, save_monitor_snapshot, self.object_name, hosts, schedule)
+            except Exception as e:
+                logging.error(f"Ошибка записи снимка состояния объекта '{self.object_name}': {e}")
+
+    async def _config_loop(self):
+        """Отслеживание версии конфигурации объекта и применение изменений без перезапуска."""
+        while service_running:
+            await sleep_while_running(CONFIG_POLL_INTERVAL)
+            try:
+                version = get_config_version(self.object_name)
+                if version is not None and version != self.config_version:
+                    self.reload()
+            except Exception as e:
+                logging.error(f"Ошибка применения конфигурации объекта '{self.object_name}': {e}")
+
+    def reload(self):
+        """Применение изменений конфигурации без остановки проверок.
+
+        Новые хосты добавляются в планировщик, удаленные исключаются, а остальные
+        сохраняют расписание и состояние подтверждения.
+        """
+        config = self._load_config()
+        if config is None:
+            return
+        hosts = self._load_hosts()
+        new_hosts = set(hosts)
+        removed = [ip for ip in self.scheduler if ip not in new_hosts]
+        added = [ip for ip in new_hosts if ip not in self.scheduler]
+        overrides, methods, parents = self._load_host_settings()
+
+        for ip in removed:
+            self.scheduler.remove_host(ip)
+            self.tracker.forget(ip)
+            self.latency.remove(ip)
+            self._degraded_alerted.discard(ip)
+            self._pending_statuses.pop(ip, None)
+        for ip in added:
+            interval, priority = overrides.get(ip, (None, 0))
+            self.scheduler.add_host(ip, interval, priority)
+        # Изменившиеся и снятые индивидуальные интервалы уже запланированных хостов
+        for ip in set(overrides) | set(self._overrides):
+            if overrides.get(ip) != self._overrides.get(ip) and ip in self.scheduler:
+                self.scheduler.set_override(ip, *overrides.get(ip, (None, 0)))
+        self._overrides = overrides
+        self.probe_method = config["probe_method"]
+        self._probe_methods = methods
+        self.topology = Topology(parents)
+        self._release_unblocked()
+
+        config_delay, self._config_delay = self._config_delay, config["delay"]
+        if config["delay"] and config["delay"] != config_delay and config["delay"] != self.delay:
+            self.delay = config["delay"]
+            self.scheduler.set_default_interval(self.delay)
+            self.tracker.required = self.delay
+            PROBE_INTERVAL.set(self.delay, self.object_name)
+        self.telegram_token = config["telegram_token"]
+        self.telegram_chat_ids = config["telegram_chat_ids"]
+        self.extended_logging = config["extended_logging"]
+        self.probe_log_sample_rate = config["probe_log_sample_rate"] or PROBE_LOG_SAMPLE_RATE
+        self.record_rtt = config["rtt_history"]
+        self.latency.set_thresholds(config["degraded_rtt"], config["degraded_loss"])
+        self._set_trace(config["probe_trace"])
+        self.ip_addresses = hosts
+        # Имена IP перечитываются из базы при следующем обращении
+        invalidate_ip_names(self.object_name)
+        self.config_version = config["config_version"]
+        logging.info(f"Конфигурация объекта '{self.object_name}' обновлена до версии {self.config_version}: "
+                     f"добавлено хостов {len(added)}, удалено {len(removed)}.")
+
+    async def _sweep_loop(self):
+        """Продвижение планировщика по тактам и запуск проверок хостов, срок которых наступил."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while service_running:
+            next_tick += self.scheduler.tick
+            await asyncio.sleep(max(0, next_tick - loop.time()))
+            SCHEDULER_LAG.set(max(0, loop.time() - next_tick), self.object_name)
+            due = self.scheduler.advance()
+            if due:
+                # Пакет проверяется в отдельной задаче, чтобы таймаут не задерживал следующие такты
+                batch = asyncio.ensure_future(self._probe_batch(due))
+                self._batches.add(batch)
+                batch.add_done_callback(self._batches.discard)
+            BATCHES_IN_FLIGHT.set(len(self._batches), self.object_name)
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def _probe_batch(self, ip_addresses):
+        """Плановая проверка пакета хостов и планирование следующих проверок."""
+        probe_now = []
+        skipped = 0
         for ip in ip_addresses:
+            # Хосты suspect-* проверяет _confirm_loop
+            if self.tracker.state_of(ip) in SUSPECT_STATES:
+                self.scheduler.reschedule(ip)
+            elif self.topology and self._is_blocked(ip):
+                # Родительский узел недоступен: проверка откладывается с замедлением
+                self._mark_via_parent(ip)
+                self.scheduler.reschedule(ip, is_down=True)
+                skipped += 1
+            else:
+                probe_now.append(ip)
+        if skipped:
+            PROBES_SKIPPED.inc(self.object_name, amount=skipped)
+        try:
+            # Все IP пингуются одним пакетом, не блокируя цикл событий
+            results = await self._timed_sweep(probe_now, "scheduled")
+            await self._process_results(results)
+        finally:
+            for ip in probe_now:
+                self.scheduler.reschedule(ip, is_down=self.tracker.state_of(ip) == DOWN)
+
+    async def _confirm_loop(self):
+        while service_running:
+            await asyncio.sleep(CONFIRM_INTERVAL)
+            suspects = self.tracker.suspects()
+            if suspects and self.topology:
+                suspects = self._with_parents(suspects)
+            if suspects:
+                await self._process_results(await self._timed_sweep(suspects, "confirm"))
+
+    def _is_blocked(self, ip):
+        """Недоступен ли (или проверяется на недоступность) один из родительских узлов хоста."""
+        for parent in self.topology.ancestors(ip):
+            if self.tracker.state_of(parent) in (SUSPECT_DOWN, DOWN, SUSPECT_UP):
+                return True
+        return False
+
+    def _mark_via_parent(self, ip):
+        self.tracker.cancel(ip)
+        if ip not in self.unreachable_via_parent:
+            self.unreachable_via_parent.add(ip)
+            self._pending_statuses[ip] = VIA_PARENT_STATUS
+
+    def _release(self, ip):
+        """Возврат хоста к проверкам после восстановления родительского узла."""
+        self.unreachable_via_parent.discard(ip)
+        if ip in self.scheduler:
+            # До следующей проверки в базе остается последний подтвержденный статус хоста
+            state = self.tracker.state_of(ip)
+            self._pending_statuses[ip] = None if state is None else "доступен" if is_up(state) else "недоступен"
+            self.scheduler.reschedule(ip, delay=0)
+
+    def _release_unblocked(self):
+        """Возврат к проверкам хостов, родительские узлы которых доступны или сняты."""
+        for ip in list(self.unreachable_via_parent):
+            if ip not in self.scheduler or not self._is_blocked(ip):
+                self._release(ip)
+
+    def _with_parents(self, suspects):
+        """Подтверждающие проверки вместе с родительскими узлами, чтобы причина сбоя определялась первой."""
+        probe = []
+        seen = set()
+        for ip in suspects:
+            if self._is_blocked(ip):
+                self._mark_via_parent(ip)
+                continue
+            for candidate in [ip] + self.topology.ancestors(ip):
+                if candidate not in seen and candidate in self.scheduler:
+                    seen.add(candidate)
+                    probe.append(candidate)
+        return probe
+
+    def _methods_for(self, ip_addresses):
+        """Способы проверки хостов: {ip: ProbeMethod} или None, если все проверяются по ICMP."""
+        if self.probe_method.type == PROBE_ICMP:
+            if not self._probe_methods:
+                return None
+            return {ip: self._probe_methods[ip] for ip in ip_addresses if ip in self._probe_methods}
+        get_method = self._probe_methods.get
+        return {ip: get_method(ip, self.probe_method) for ip in ip_addresses}
+
+    async def _timed_sweep(self, ip_addresses, kind):
+        """Пакетная проверка с учетом длительности в метриках."""
+        started = time.monotonic()
+        results = await self.engine.sweep(ip_addresses, self._methods_for(ip_addresses))
+        SWEEP_DURATION.observe(time.monotonic() - started, self.object_name, kind)
+        SWEEP_HOSTS.inc(self.object_name, kind, amount=len(ip_addresses))
+        return results
+
+    async def _process_results(self, results):
+        now = self.clock()
+        if self.trace is not None:
+            try:
+                self.trace.record(now, results, self.delay)
+            except (OSError, ValueError) as e:
+                logging.error(f"Ошибка записи трассы объекта '{self.object_name}': {e}")
+                self._set_trace(False)
+        rtts = [probe_result.rtt / 1000 for probe_result in results.values()
+                if probe_result.reachable and probe_result.rtt is not None]
+        PROBE_RTT.observe_many(rtts, self.object_name)
+        if len(rtts) < len(results):
+            PROBE_TIMEOUTS.inc(self.object_name, amount=len(results) - len(rtts))
+        confirmed = []
+        log_probes = self.extended_logging
+        items = results.items()
+        if self.topology:
+            # Родительские узлы обрабатываются раньше зависимых хостов
+            items = sorted(items, key=lambda item: self.topology.depth(item[0]))
+        for ip, probe_result in items:
+            # Результат для хоста, удаленного из конфигурации во время проверки
+            if ip not in self.scheduler:
+                continue
+            if not probe_result.reachable and self.topology and self._is_blocked(ip):
+                self._mark_via_parent(ip)
+                continue
             try:
-                # Пинг IP с обработкой исключений
-                try:
-                    ping_response = ping(ip, count=1, timeout=1)
-                    is_reachable = all(resp.success for resp in ping_response)
-                    logging.info(f"Результат пинга IP {ip}: {ping_response}")
-                except Exception as ping_error:
-                    is_reachable = False
-                    logging.error(f"Ошибка пинга IP {ip}: {ping_error}")
-
-                ip_name = get_ip_name(ip, object_name)
-
-                if ip_status_cache[ip] is None:
-                    # Инициализация начального статуса
-                    ip_status_cache[ip] = is_reachable
-                    status = "доступен" if is_reachable else "недоступен"
-                    query_update = "UPDATE ip_names SET connection_status = ? WHERE ip_address = ? AND object_name = ?"
-                    execute_query(query_update, (status, ip, object_name))
-                    logging.info(f"Инициализация статуса IP {ip_name} ({ip}): {status}.")
-                elif ip_status_cache[ip] != is_reachable:
-                    logging.info(f"Обнаружено изменение статуса IP {ip_name} ({ip}). Проверка стабильности...")
-
-                    # Проверка стабильности нового статуса
-                    stable_status = True
-                    for second in range(delay):
-                        await asyncio.sleep(1)
-                        try:
-                            recheck_response = ping(ip, count=1, timeout=1)
-                            recheck_status = all(resp.success for resp in recheck_response)
-                            logging.info(f"Проверка стабильности IP {ip} на {second + 1}-й секунде: {recheck_response}")
-                        except Exception as recheck_error:
-                            recheck_status = False
-                            logging.error(f"Ошибка повторного пинга IP {ip}: {recheck_error}")
-
-                        if recheck_status != is_reachable:
-                            stable_status = False
-                            logging.info(f"Статус IP {ip_name} ({ip}) вернулся к предыдущему. Прерываем проверку на {second + 1} секунде.")
-                            break
-
-                    if stable_status:
-                        # Обновление статуса и отправка сообщения
-                        ip_status_cache[ip] = is_reachable
-                        status = "доступен" if is_reachable else "недоступен"
-                        query_update = "UPDATE ip_names SET connection_status = ? WHERE ip_address = ? AND object_name = ?"
-                        execute_query(query_update, (status, ip, object_name))
-
-                        current_time = (datetime.now(timezone.utc) + timedelta(hours=2)).strftime("%d.%m.%Y %H:%M:%S")
-
-                        message = (
-                            f"{ip_name}: [ {ip} ]\n"
-                            f"Дата: [ {current_time} ]\n"
-                            f"Объект: [ {object_name} ]\n"
-                            f"Статус: {'соединение восстановлено! ✅' if is_reachable else 'нет соединения! ⛔'}"
-                        )
-                        await send_telegram_message(telegram_token, telegram_chat_ids, message)
-                        logging.info(f"Изменение статуса IP {ip_name} ({ip}) подтверждено и сообщение отправлено.")
-                else:
-                    logging.info(f"Статус IP {ip_name} ({ip}) не изменился. Текущий статус: {'доступен' if is_reachable else 'недоступен'}.")
+                if log_probes and (self.probe_log_sample_rate >= 1 or random.random() < self.probe_log_sample_rate):
+                    logging.info(f"Результат пинга IP {ip}: {'доступен' if probe_result.reachable else 'недоступен'}, RTT: {probe_result.rtt} мс",
+                                 extra={"object": self.object_name, "ip": ip, "event": "probe", "rtt": probe_result.rtt})
+                if self.record_rtt:
+                    record_rtt_sample(self.object_name, ip, probe_result.rtt, now)
+                transition = self.tracker.observe(ip, probe_result.reachable, now)
+                if transition is not None:
+                    if self._handle_transition(transition, now):
+                        confirmed.append(transition)
+                    if transition.state == UP and ip in self.topology.children:
+                        for child in self.topology.descendants(ip):
+                            if child in self.unreachable_via_parent and not self._is_blocked(child):
+                                self._release(child)
+                # Качество связи оценивается после перехода, чтобы потери при отключении не считались деградацией
+                quality = self.latency.record(ip, probe_result.rtt if probe_result.reachable else None)
+                if quality is not None:
+                    transition = self._handle_quality(ip, quality)
+                    if transition is not None:
+                        confirmed.append(transition)
             except Exception as e:
-                logging.error(f"Ошибка при обработке IP {ip}: {e}")
+                logging.error(f"Ошибка при обработке IP {ip}: {e}", extra={"object": self.object_name, "ip": ip})
+
+        self._commit(confirmed, now)
+
+    def _commit(self, confirmed, now=None):
+        """Запись статусов и истории после обработки пакета и постановка уведомлений в очередь."""
+        self._flush_statuses()
+        flush_history()
+        if confirmed:
+            self._notify(confirmed, now)
+
+    def _handle_transition(self, transition, now=None):
+        """Обработка перехода. Возвращает True, если изменение подтверждено и нужно уведомление."""
+        ip = transition.ip
+        status = "доступен" if transition.is_reachable else "недоступен"
+        extra = {"object": self.object_name, "ip": ip, "event": transition.kind, "status": status}
+
+        if transition.kind in (INIT, CONFIRMED):
+            record_transition(self.object_name, ip, HISTORY_UP if transition.is_reachable else HISTORY_DOWN, now)
+
+        if transition.kind == INIT:
+            self._pending_statuses[ip] = status
+            # Начальный статус есть у каждого хоста, поэтому он журналируется только при расширенном логировании
+            if self.extended_logging:
+                logging.info(f"Инициализация статуса IP {get_ip_name(ip, self.object_name)} ({ip}): {status}.", extra=extra)
+        elif transition.kind == SUSPECT:
+            logging.info(f"Обнаружено изменение статуса IP {get_ip_name(ip, self.object_name)} ({ip}). Проверка стабильности...", extra=extra)
+        elif transition.kind == REVERTED:
+            logging.info(f"Статус IP {get_ip_name(ip, self.object_name)} ({ip}) вернулся к предыдущему. Изменение не подтверждено.", extra=extra)
+        elif transition.kind == CONFIRMED:
+            self._pending_statuses[ip] = status
+            if transition.is_reachable:
+                # Замеры за время недоступности не относятся к качеству связи
+                self.latency.remove(ip)
+            else:
+                # Об отключении сообщает уведомление о статусе: восстановление качества не отправляется
+                self._degraded_alerted.discard(ip)
+            return True
+        return False
 
-        logging.info(f"Завершен цикл проверки для объекта '{object_name}'. Ожидание {delay} секунд.")
-        await asyncio.sleep(delay)
+    def _handle_quality(self, ip, quality):
+        """Изменение качества связи. Возвращает переход для уведомления или None.
+
+        Деградация отправляется как уведомление, только если хост в состоянии up
+        (в suspect-down потери вызваны отключением), а восстановление — только
+        если о деградации уже сообщалось.
+        """
+        if quality == DEGRADED:
+            if self.tracker.state_of(ip) != UP:
+                # Деградация будет оценена заново, когда хост вернется в состояние up
+                self.latency.clear_degraded(ip)
+                return None
+            self._degraded_alerted.add(ip)
+            self._log_quality(ip, quality)
+            return Transition(ip, DEGRADED, True, DEGRADED)
+        if ip not in self._degraded_alerted:
+            return None
+        self._degraded_alerted.discard(ip)
+        self._log_quality(ip, quality)
+        return Transition(ip, NORMAL, True, NORMAL)
+
+    def _log_quality(self, ip, quality):
+        extra = {"object": self.object_name, "ip": ip, "event": quality}
+        if quality == DEGRADED:
+            logging.info(f"Деградация связи с IP {get_ip_name(ip, self.object_name)} ({ip}): {self.latency.summary(ip)}.", extra=extra)
+        else:
+            logging.info(f"Качество связи с IP {get_ip_name(ip, self.object_name)} ({ip}) восстановлено.", extra=extra)
+
+    def _flush_statuses(self):
+        """Запись накопленных статусов в базу одной транзакцией."""
+        if not self._pending_statuses:
+            return
+        save_ip_statuses(self.object_name, self._pending_statuses.items())
+        self._pending_statuses = {}
+
+    def _notify(self, transitions, now=None):
+        """Постановка уведомлений об изменениях одного обхода в очередь: одно сообщение на чат."""
+        messages = []
+        for transition in transitions:
+            ip = transition.ip
+            ip_name = get_ip_name(ip, self.object_name)
+            if transition.kind in (DEGRADED, NORMAL):
+                messages.append(format_quality_message(
+                    ip_name, ip, self.object_name, transition.kind == DEGRADED, self.latency.summary(ip), now))
+                continue
+            dependents = len(self.topology.descendants(ip)) if not transition.is_reachable else 0
+            messages.append(format_status_message(ip_name, ip, self.object_name, transition.is_reachable, dependents, now))
+            logging.info(f"Изменение статуса IP {ip_name} ({ip}) подтверждено, сообщение поставлено в очередь.",
+                         extra={"object": self.object_name, "ip": ip, "event": transition.kind,
+                                "status": "доступен" if transition.is_reachable else "недоступен"})
+        self.notifier.submit(self.telegram_token, self.telegram_chat_ids, messages)
+
+async def sleep_while_running(seconds):
+    """Ожидание, которое прерывается в течение секунды после остановки сервиса."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    while service_running:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, 1))
+
+async def history_maintenance_loop(interval=HISTORY_MAINTENANCE_INTERVAL):
+    """Периодическая агрегация и очистка истории статусов в отдельном потоке."""
+    loop = asyncio.get_running_loop()
+    while service_running:
+        await loop.run_in_executor(None, apply_history_retention)
+        await asyncio.sleep(interval)
+
+async def run_with_maintenance(coro, metrics_port=None):
+    """Выполнение корутины мониторинга вместе с обслуживанием истории и сервером метрик."""
+    maintenance = asyncio.ensure_future(history_maintenance_loop())
+    metrics_server = await start_metrics_server(metrics_port) if metrics_port else None
+    try:
+        return await coro
+    finally:
+        maintenance.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        flush_history()
+
+async def monitor_ips_with_telegram_delay(object_data, delay, engine=None, notifier=None, metrics_port=None):
+    """Мониторинг IP-адресов с подтверждением изменения статуса перед отправкой сообщения."""
+    own_engine = engine is None
+    if own_engine:
+        engine = ProbeEngine()
+    own_notifier = notifier is None
+    if own_notifier:
+        notifier = TelegramDispatcher()
+
+    try:
+        monitor = ObjectMonitor(object_data, delay, engine, notifier)
+        if not monitor.is_configured():
+            logging.error("Недостаточно данных для мониторинга.")
+            return
+        await run_with_maintenance(monitor.run(), metrics_port)
+    finally:
+        if own_notifier:
+            await notifier.close()
+        if own_engine:
+            engine.close()
 
 # Обработка сигналов
 
@@ -153,5 +647,17 @@ def stop_service(signal_received, frame):
     service_running = False
     logging.info("Получен сигнал завершения. Сервис продолжит работать в фоне. Логи записываются в файл service.log.")
 
+def shutdown_service(signal_received, frame):
+    # Мониторинг завершается штатно: записываются снимок состояния, история и очередь уведомлений
+    global service_running
+    service_running = False
+    logging.info("Получен сигнал остановки сервиса.")
+
+def exit_immediately(signal_received, frame):
+    # Записи, оставшиеся в очереди журнала, записываются до выхода
+    stop_logging()
+    os._exit(0)
+
 signal.signal(signal.SIGQUIT, stop_service)  # Ctrl + Q для выхода из сервиса без остановки работы
-signal.signal(signal.SIGINT, lambda sig, frame: os._exit(0))  # Ctrl + C для завершения работы программы
+signal.signal(signal.SIGTERM, shutdown_service)  # Остановка сервиса из меню
+signal.signal(signal.SIGINT, exit_immediately)  # Ctrl + C для завершения работы программы
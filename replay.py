@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import db_manager
+import processing
+from notifier import TelegramDispatcher, DIGEST_SEPARATOR
+from probe_trace import read_trace
+
+# Ограничения частоты отправки при воспроизведении: уведомления не задерживаются
+REPLAY_RATE = 10 ** 6
+REPLAY_TOKEN = "replay"
+REPLAY_CHAT_ID = "replay"
+# Время на отправку оставшихся уведомлений после последнего пакета (в секундах)
+DRAIN_TIMEOUT = 10
+
+
+class VirtualClock:
+    """Часы воспроизведения: время последнего обработанного пакета трассы."""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class CapturingSink:
+    """Поддельные клиенты Telegram: уведомления сохраняются как (clock(), чат, текст).
+
+    Используется при воспроизведении трассы (виртуальные часы) и в benchmark.py.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.messages = []
+
+    def create_bot(self, token):
+        sink = self
+
+        class _Bot:
+            async def initialize(self):
+                pass
+
+            async def shutdown(self):
+                pass
+
+            async def send_message(self, chat_id, text):
+                sink.messages.append((sink.clock(), chat_id, text))
+
+        return _Bot()
+
+
+def _create_monitor(sweep, notifier, clock):
+    """Монитор объекта трассы с настройками из базы; запись трассы при воспроизведении отключена."""
+    config = db_manager.load_object_config(sweep.object_name) or {}
+    if config.get("probe_trace"):
+        db_manager.toggle_probe_trace(sweep.object_name, False)
+    object_data = {
+        "object_name": sweep.object_name,
+        "ip_list": [],
+        "telegram_token": config.get("telegram_token") or REPLAY_TOKEN,
+        "telegram_chat_ids": config.get("telegram_chat_ids") or [REPLAY_CHAT_ID],
+    }
+    monitor = processing.ObjectMonitor(object_data, sweep.delay or config.get("delay") or 10, None, notifier)
+    monitor.clock = clock
+    monitor._schedule_hosts()
+    return monitor
+
+
+async def replay_trace(path, speed=None):
+    """Воспроизведение трассы через обработку переходов, запись в базу и очередь уведомлений.
+
+    Время берется из трассы, а пакеты обрабатываются без ожидания или,
+    если задан speed, с интервалами трассы, ускоренными в speed раз.
+    Возвращает (отчет, уведомления [(время, чат, текст)]).
+    """
+    clock = VirtualClock()
+    sink = CapturingSink(clock)
+    notifier = TelegramDispatcher(global_rate=REPLAY_RATE, per_chat_rate=REPLAY_RATE, bot_factory=sink.create_bot)
+    conn = db_manager.get_connection()
+    rows_before = conn.total_changes
+    monitor = None
+    sweeps = probes = 0
+    first_at = last_at = None
+    started = time.monotonic()
+    try:
+        for sweep in read_trace(path):
+            if monitor is None:
+                monitor = _create_monitor(sweep, notifier, clock)
+                first_at = sweep.timestamp
+            # Пауза дает очереди уведомлений отправить сообщения предыдущих пакетов
+            pause = (sweep.timestamp - last_at) / speed if speed and last_at is not None else 0
+            await asyncio.sleep(max(0, pause))
+            if sweep.delay and sweep.delay != monitor.delay:
+                monitor.delay = sweep.delay
+                monitor.tracker.required = sweep.delay
+            for ip in sweep.results:
+                if ip not in monitor.scheduler:
+                    monitor.scheduler.add_host(ip)
+            clock.now = last_at = sweep.timestamp
+            await monitor._process_results(sweep.results)
+            sweeps += 1
+            probes += len(sweep.results)
+        await notifier.drain(timeout=DRAIN_TIMEOUT)
+    finally:
+        await notifier.close()
+    elapsed = time.monotonic() - started
+
+    duration = last_at - first_at if sweeps else 0
+    report = {
+        "trace": path,
+        "object": monitor.object_name if monitor is not None else None,
+        "sweeps": sweeps,
+        "probes": probes,
+        "alerts": sum(len(text.split(DIGEST_SEPARATOR)) for _, _, text in sink.messages),
+        "telegram_messages": len(sink.messages),
+        "db_rows_changed": conn.total_changes - rows_before,
+        "trace_duration": round(duration, 3),
+        "elapsed": round(elapsed, 3),
+        "speedup": round(duration / elapsed, 1) if elapsed else None,
+        "probes_per_second": round(probes / elapsed, 1) if elapsed else None,
+    }
+    return report, sink.messages
+
+
+def run_replay(path, speed=None):
+    """Воспроизведение трассы на копии базы данных: рабочая база и журнал переходов не изменяются."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл трассы {path} не найден.")
+    with tempfile.TemporaryDirectory(prefix="ping_replay_") as workdir:
+        source = db_manager.get_connection()
+        replay_db = os.path.join(workdir, "replay.db")
+        target = sqlite3.connect(replay_db)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+        db_name = db_manager.DB_NAME
+        # Соединение с рабочей базой закрывается get_connection при переключении на копию
+        db_manager.DB_NAME = replay_db
+        try:
+            db_manager.initialize_db()
+            logging.info(f"Воспроизведение трассы {path} на копии базы данных {replay_db}.")
+            report, messages = asyncio.run(replay_trace(path, speed))
+        finally:
+            db_manager.close_connection()
+            db_manager.DB_NAME = db_name
+    return report, messages
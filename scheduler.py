@@ -0,0 +1,179 @@
+import math
+import random
+
+# Длительность такта колеса и число слотов: 512 * 0.25 с ≈ 2 минуты на оборот
+DEFAULT_TICK = 0.25
+DEFAULT_SLOTS = 512
+# Случайное отклонение интервала: ±10%
+DEFAULT_JITTER = 0.1
+# Предельное замедление проверок долго недоступных хостов
+MAX_BACKOFF_FACTOR = 32
+MAX_BACKOFF_INTERVAL = 600
+
+
+class TimingWheel:
+    """Хешированное колесо таймеров.
+
+    Элемент, запланированный через delay секунд, попадает в слот
+    (текущий такт + число тактов) % slots вместе с абсолютным номером такта.
+    Постановка и извлечение выполняются за O(1) на элемент, а отмена —
+    лениво, через номер поколения элемента.
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS):
+        self.tick = tick
+        self.slots = slots
+        self.current_tick = 0
+        self._wheel = [[] for _ in range(slots)]
+        self._generations = {}
+
+    def __len__(self):
+        return len(self._generations)
+
+    def __contains__(self, item):
+        return item in self._generations
+
+    def schedule(self, item, delay):
+        """Планирование элемента через delay секунд; предыдущее планирование отменяется."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        target = self.current_tick + ticks
+        generation = self._generations.get(item, 0) + 1
+        self._generations[item] = generation
+        self._wheel[target % self.slots].append((target, item, generation))
+
+    def cancel(self, item):
+        self._generations.pop(item, None)
+
+    def pending(self):
+        """Запланированные элементы и число тактов до их срока: {элемент: тактов}."""
+        result = {}
+        for slot in self._wheel:
+            for target, item, generation in slot:
+                if self._generations.get(item) == generation:
+                    result[item] = target - self.current_tick
+        return result
+
+    def advance(self):
+        """Переход к следующему такту. Возвращает элементы, срок которых наступил."""
+        self.current_tick += 1
+        index = self.current_tick % self.slots
+        slot = self._wheel[index]
+        if not slot:
+            return []
+        due = []
+        remaining = []
+        for entry in slot:
+            target, item, generation = entry
+            if self._generations.get(item) != generation:
+                continue
+            if target <= self.current_tick:
+                del self._generations[item]
+                due.append(item)
+            else:
+                remaining.append(entry)
+        self._wheel[index] = remaining
+        return due
+
+
+class ProbeScheduler:
+    """Планировщик проверок хостов на колесе таймеров.
+
+    Каждый хост проверяется со своим интервалом (по умолчанию — задержка
+    объекта), первые проверки равномерно распределены по интервалу, а каждый
+    следующий срок смещается на случайную величину. Интервал недоступного
+    хоста удваивается после каждой неудачной проверки, пока не достигнет
+    предела; хосты с приоритетом выше 0 не замедляются.
+    """
+
+    def __init__(self, default_interval, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, jitter=DEFAULT_JITTER,
+                 max_backoff_factor=MAX_BACKOFF_FACTOR, max_backoff_interval=MAX_BACKOFF_INTERVAL):
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.max_backoff_factor = max_backoff_factor
+        self.max_backoff_interval = max_backoff_interval
+        self.wheel = TimingWheel(tick, slots)
+        # Индивидуальные интервалы хостов; None — интервал объекта по умолчанию
+        self._intervals = {}
+        self._priorities = {}
+        self._backoff = {}
+        self._random = random.Random()
+
+    @property
+    def tick(self):
+        return self.wheel.tick
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, ip):
+        return ip in self._intervals
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def add_host(self, ip, interval=None, priority=0):
+        """Добавление хоста; первая проверка — в случайный момент внутри интервала."""
+        self._intervals[ip] = interval or None
+        self._priorities[ip] = priority or 0
+        self._backoff[ip] = 0
+        self.wheel.schedule(ip, self._random.uniform(0, interval or self.default_interval))
+
+    def set_override(self, ip, interval=None, priority=0):
+        """Изменение интервала и приоритета хоста без сброса его расписания."""
+        if ip in self._intervals:
+            self._intervals[ip] = interval or None
+            self._priorities[ip] = priority or 0
+
+    def set_default_interval(self, interval):
+        """Изменение интервала по умолчанию; действует с очередного планирования хостов."""
+        self.default_interval = interval
+
+    def remove_host(self, ip):
+        self.wheel.cancel(ip)
+        self._intervals.pop(ip, None)
+        self._priorities.pop(ip, None)
+        self._backoff.pop(ip, None)
+
+    def next_interval(self, ip, is_down):
+        """Интервал до следующей проверки с учетом замедления и случайного отклонения."""
+        interval = self._intervals[ip] or self.default_interval
+        if is_down and self._priorities[ip] <= 0:
+            self._backoff[ip] = min(self._backoff[ip] + 1, int(math.log2(self.max_backoff_factor)))
+            interval = min(interval * 2 ** self._backoff[ip], max(self.max_backoff_interval, interval))
+        else:
+            self._backoff[ip] = 0
+        return interval * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reschedule(self, ip, is_down=False, delay=None):
+        """Планирование следующей проверки хоста после получения результата."""
+        if ip not in self._intervals:
+            return
+        self.wheel.schedule(ip, self.next_interval(ip, is_down) if delay is None else delay)
+
+    def advance(self):
+        """Следующий такт: список хостов, которые пора проверить."""
+        return self.wheel.advance()
+
+    def snapshot(self):
+        """Положение хостов в расписании: {ip: [секунд до проверки, уровень замедления]}."""
+        tick = self.wheel.tick
+        return {ip: [round(ticks * tick, 2), self._backoff[ip]]
+                for ip, ticks in self.wheel.pending().items() if ip in self._intervals}
+
+    def restore(self, positions, elapsed=0):
+        """Восстановление расписания из снимка, записанного elapsed секунд назад.
+
+        Хосты, срок проверки которых уже прошел, остаются на случайной позиции
+        внутри интервала (add_host), чтобы не проверяться все в первый такт.
+        Возвращает число восстановленных хостов.
+        """
+        count = 0
+        max_backoff = int(math.log2(self.max_backoff_factor))
+        for ip, (due_in, backoff) in positions.items():
+            if ip not in self._intervals:
+                continue
+            self._backoff[ip] = min(max(int(backoff), 0), max_backoff)
+            if due_in > elapsed:
+                self.wheel.schedule(ip, due_in - elapsed)
+            count += 1
+        return count
@@ -0,0 +1,165 @@
+import json
+import time
+from debounce import UP, DOWN, SUSPECT_DOWN, SUSPECT_UP, SUSPECT_STATES
+from db_manager import peek_ip_name
+from metrics import register_route
+
+# Время, в течение которого повторный запрос с теми же параметрами получает готовый ответ (в секундах)
+STATUS_CACHE_TTL = 1.0
+STATUS_CACHE_SIZE = 256
+# Число хостов в ответе по умолчанию (limit=0 — без ограничения)
+DEFAULT_HOSTS_LIMIT = 1000
+
+_JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+
+# Фильтры state: состояния автомата, а также via-parent, degraded и unknown (хост еще не проверялся)
+STATE_FILTERS = (UP, DOWN, SUSPECT_DOWN, SUSPECT_UP, "suspect", "via-parent", "degraded", "unknown")
+
+# Запущенные мониторы процесса: object_name -> ObjectMonitor
+_monitors = {}
+_cache = {}
+
+
+def register_monitor(monitor):
+    _monitors[monitor.object_name] = monitor
+
+
+def unregister_monitor(monitor):
+    if _monitors.get(monitor.object_name) is monitor:
+        del _monitors[monitor.object_name]
+
+
+def _host_status(monitor, ip, now):
+    host = monitor.tracker.hosts.get(ip)
+    state = host.state if host is not None else None
+    changed_at = host.changed_at if host is not None else None
+    return {
+        "object": monitor.object_name,
+        "ip": ip,
+        "name": peek_ip_name(ip, monitor.object_name),
+        "state": state or "unknown",
+        "since": changed_at,
+        "since_seconds": round(now - changed_at, 1) if changed_at is not None else None,
+        "rtt": monitor.latency.last(ip),
+        "via_parent": ip in monitor.unreachable_via_parent,
+        "degraded": monitor.latency.is_degraded(ip),
+    }
+
+
+def _matches(monitor, ip, states):
+    host = monitor.tracker.hosts.get(ip)
+    state = host.state if host is not None else None
+    for wanted in states:
+        if wanted == "unknown":
+            if state is None:
+                return True
+        elif wanted == "suspect":
+            if state in SUSPECT_STATES:
+                return True
+        elif wanted == "via-parent":
+            if ip in monitor.unreachable_via_parent:
+                return True
+        elif wanted == "degraded":
+            if monitor.latency.is_degraded(ip):
+                return True
+        elif state == wanted:
+            return True
+    return False
+
+
+def _object_summary(monitor):
+    counts = dict.fromkeys((UP, DOWN, "suspect", "unknown"), 0)
+    total = 0
+    hosts = monitor.tracker.hosts
+    for ip in monitor.scheduler:
+        total += 1
+        host = hosts.get(ip)
+        state = host.state if host is not None else None
+        if state is None:
+            counts["unknown"] += 1
+        elif state in SUSPECT_STATES:
+            counts["suspect"] += 1
+        else:
+            counts[state] += 1
+    return {
+        "object": monitor.object_name,
+        "hosts": total,
+        **counts,
+        "via_parent": len(monitor.unreachable_via_parent),
+        "degraded": sum(1 for ip in monitor.scheduler if monitor.latency.is_degraded(ip)),
+        "delay": monitor.delay,
+        "config_version": monitor.config_version,
+    }
+
+
+def _json_response(data, status="200 OK"):
+    return status, _JSON_CONTENT_TYPE, json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _error(status, message):
+    return _json_response({"error": message}, status)
+
+
+def status_summary(params):
+    """Сводка по объектам: число хостов в каждом состоянии."""
+    monitors = [_monitors[name] for name in sorted(_monitors)]
+    if params.get("object"):
+        monitors = [monitor for monitor in monitors if monitor.object_name == params["object"]]
+        if not monitors:
+            return _error("404 Not Found", f"Объект '{params['object']}' не найден.")
+    return _json_response({"time": time.time(), "objects": [_object_summary(monitor) for monitor in monitors]})
+
+
+def status_hosts(params):
+    """Состояние хостов с фильтрами object, ip, state (через запятую) и limit."""
+    monitors = [_monitors[name] for name in sorted(_monitors)]
+    if params.get("object"):
+        monitors = [monitor for monitor in monitors if monitor.object_name == params["object"]]
+        if not monitors:
+            return _error("404 Not Found", f"Объект '{params['object']}' не найден.")
+    states = [state.strip() for state in params.get("state", "").split(",") if state.strip()]
+    unknown = [state for state in states if state not in STATE_FILTERS]
+    if unknown:
+        return _error("400 Bad Request", f"Неизвестное состояние: {', '.join(unknown)}. "
+                                         f"Допустимые: {', '.join(STATE_FILTERS)}.")
+    try:
+        limit = int(params.get("limit", DEFAULT_HOSTS_LIMIT))
+    except ValueError:
+        return _error("400 Bad Request", "Параметр limit должен быть числом.")
+
+    now = time.time()
+    hosts = []
+    total = 0
+    ip_filter = params.get("ip")
+    for monitor in monitors:
+        if ip_filter:
+            candidates = [ip_filter] if ip_filter in monitor.scheduler else []
+        else:
+            candidates = monitor.scheduler
+        for ip in candidates:
+            if states and not _matches(monitor, ip, states):
+                continue
+            total += 1
+            if limit <= 0 or len(hosts) < limit:
+                hosts.append(_host_status(monitor, ip, now))
+    return _json_response({"time": now, "total": total, "hosts": hosts})
+
+
+def _cached(handler):
+    """Ответ из кэша, если такой же запрос выполнялся менее STATUS_CACHE_TTL секунд назад."""
+    def cached_handler(params):
+        key = (handler, tuple(sorted(params.items())))
+        now = time.monotonic()
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        response = handler(params)
+        if len(_cache) >= STATUS_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = (now + STATUS_CACHE_TTL, response)
+        return response
+    return cached_handler
+
+
+register_route("/status", _cached(status_summary))
+register_route("/status/hosts", _cached(status_hosts))
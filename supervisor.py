@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+from db_manager import execute_query, load_object_hosts
+from probe import ProbeEngine
+from notifier import TelegramDispatcher
+from processing import ObjectMonitor, run_with_maintenance, shutdown_service
+from metrics import METRICS_PORT
+from log_config import stop_logging, start_worker_logging, stop_worker_logging, log_to_queue
+
+DEFAULT_DELAY = 10
+
+
+def load_all_objects():
+    """Загрузка конфигурации всех объектов из базы данных."""
+    query = "SELECT object_name, telegram_token, telegram_chat_ids, delay FROM objects"
+    results = execute_query(query)
+    objects = []
+    for object_name, telegram_token, telegram_chat_ids, delay in results or []:
+        # Объект с ошибкой в конфигурации пропускается, остальные мониторятся
+        try:
+            hosts = load_object_hosts(object_name)
+        except ValueError as e:
+            logging.error(f"Объект '{object_name}' пропущен: {e}")
+            continue
+        objects.append({
+            "object_name": object_name,
+            "ip_list": hosts,
+            "telegram_token": telegram_token,
+            "telegram_chat_ids": telegram_chat_ids.split(",") if telegram_chat_ids else [],
+            "delay": delay or DEFAULT_DELAY,
+        })
+    return objects
+
+
+def shard_objects(objects, workers):
+    """Распределение объектов по рабочим процессам с выравниванием числа IP."""
+    shards = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for object_data in sorted(objects, key=lambda o: len(o["ip_list"]), reverse=True):
+        index = loads.index(min(loads))
+        shards[index].append(object_data)
+        loads[index] += len(object_data["ip_list"])
+    return [shard for shard in shards if shard]
+
+
+async def run_objects(objects, engine=None, notifier=None, metrics_port=None, monitor_factory=None):
+    """Мониторинг нескольких объектов в одном цикле событий с общими движком проверок и отправкой уведомлений.
+
+    monitor_factory создает монитор объекта вместо ObjectMonitor с теми же аргументами;
+    движок проверок в этом случае не открывается (например, на коллекторе проверки выполняют агенты).
+    """
+    own_engine = engine is None and monitor_factory is None
+    if own_engine:
+        engine = ProbeEngine()
+    own_notifier = notifier is None
+    if own_notifier:
+        notifier = TelegramDispatcher()
+
+    try:
+        monitors = []
+        factory = monitor_factory or ObjectMonitor
+        for object_data in objects:
+            monitor = factory(object_data, object_data["delay"], engine, notifier)
+            if monitor.is_configured():
+                monitors.append(monitor)
+            else:
+                logging.error(f"Недостаточно данных для мониторинга объекта '{object_data['object_name']}'.")
+
+        logging.info(f"Запущен мониторинг объектов: {', '.join(m.object_name for m in monitors)}.")
+        results = await run_with_maintenance(
+            asyncio.gather(*(monitor.run() for monitor in monitors), return_exceptions=True), metrics_port)
+        for monitor, result in zip(monitors, results):
+            if isinstance(result, Exception):
+                logging.error(f"Мониторинг объекта '{monitor.object_name}' завершился с ошибкой: {result}")
+    finally:
+        if own_notifier:
+            await notifier.close()
+        if own_engine:
+            engine.close()
+
+
+def _run_shard(objects, metrics_port=None, log_queue=None):
+    """Точка входа рабочего процесса."""
+    signal.signal(signal.SIGTERM, shutdown_service)
+    if log_queue is not None:
+        log_to_queue(log_queue)
+    try:
+        asyncio.run(run_objects(objects, metrics_port=metrics_port))
+    finally:
+        # Рабочий процесс завершается без atexit: очередь журнала записывается явно
+        stop_logging()
+
+
+def run_supervisor(workers=1, metrics_port=METRICS_PORT):
+    """Мониторинг всех объектов из базы данных.
+
+    При workers > 1 объекты распределяются между рабочими процессами,
+    каждый из которых ведет свой цикл событий и свой движок проверок,
+    а метрики рабочего процесса N публикуются на порту metrics_port + N.
+    """
+    objects = load_all_objects()
+    if not objects:
+        logging.error("Объекты для мониторинга отсутствуют в базе данных.")
+        return
+
+    if workers <= 1:
+        asyncio.run(run_objects(objects, metrics_port=metrics_port))
+        return
+
+    # Файл журнала пишет и ротирует только супервизор
+    log_queue = start_worker_logging()
+    processes = [
+        multiprocessing.Process(target=_run_shard,
+                                args=(shard, metrics_port + index if metrics_port else None, log_queue),
+                                name=f"monitor-shard-{index}")
+        for index, shard in enumerate(shard_objects(objects, workers))
+    ]
+
+    def terminate_workers(signal_received, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate_workers)
+    for process in processes:
+        process.start()
+        logging.info(f"Рабочий процесс {process.name} запущен с PID {process.pid}.")
+    try:
+        for process in processes:
+            process.join()
+            logging.info(f"Рабочий процесс {process.name} завершен с кодом {process.exitcode}.")
+    finally:
+        stop_worker_logging()
@@ -0,0 +1,149 @@
+import ipaddress
+import socket
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+TargetRange = namedtuple("TargetRange", ["first", "last"])
+TargetRange.__doc__ = "Непрерывный диапазон адресов одного семейства (границы включительно)."
+
+# Предел числа адресов, разворачиваемых в памяти (защита от подсетей вида IPv6 /64)
+MAX_HOSTS = 1 << 20
+
+_HALF = 64
+_HALF_MASK = (1 << _HALF) - 1
+
+
+def parse_target(target):
+    """Разбор одиночного IP, диапазона start-end или подсети CIDR (IPv4 и IPv6)."""
+    target = target.strip()
+    try:
+        if "/" in target:
+            network = ipaddress.ip_network(target, strict=False)
+            first, last = network.network_address, network.broadcast_address
+            # Адреса сети и широковещательный не проверяются, кроме подсетей /31, /32 и /127, /128
+            if network.num_addresses > 2:
+                first, last = first + 1, last - (1 if network.version == 4 else 0)
+            return TargetRange(first, last)
+        if "-" in target:
+            start_ip, end_ip = target.split("-")
+            first = ipaddress.ip_address(start_ip.strip())
+            last = ipaddress.ip_address(end_ip.strip())
+            if first.version != last.version or first > last:
+                raise ValueError(target)
+            return TargetRange(first, last)
+        address = ipaddress.ip_address(target)
+        return TargetRange(address, address)
+    except ValueError:
+        raise ValueError(f"Некорректный ввод IP или диапазона: {target}")
+
+
+def format_target(target_range):
+    """Компактная запись диапазона: одиночный IP или start-end."""
+    if target_range.first == target_range.last:
+        return str(target_range.first)
+    return f"{target_range.first}-{target_range.last}"
+
+
+def range_size(target_range):
+    return int(target_range.last) - int(target_range.first) + 1
+
+
+def check_host_count(ranges):
+    """Число адресов в диапазонах; ValueError, если их больше MAX_HOSTS."""
+    total = sum(range_size(target_range) for target_range in ranges)
+    if total > MAX_HOSTS:
+        raise ValueError(f"Слишком много адресов для мониторинга: {total} (максимум {MAX_HOSTS}).")
+    return total
+
+
+def iter_targets(ranges):
+    """Ленивое перечисление адресов диапазонов в виде строк."""
+    for target_range in ranges:
+        address_class = type(target_range.first)
+        for value in range(int(target_range.first), int(target_range.last) + 1):
+            yield str(address_class(value))
+
+
+def coalesce_ranges(addresses):
+    """Объединение набора адресов и диапазонов в минимальный список непрерывных диапазонов."""
+    intervals = {4: [], 6: []}
+    for item in addresses:
+        target_range = item if isinstance(item, TargetRange) else parse_target(item)
+        intervals[target_range.first.version].append((int(target_range.first), int(target_range.last)))
+
+    result = []
+    for version, address_class in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+        merged = []
+        for first, last in sorted(intervals[version]):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        result.extend(TargetRange(address_class(first), address_class(last)) for first, last in merged)
+    return result
+
+
+class HostSet:
+    """Компактный упорядоченный набор адресов.
+
+    IPv4 хранятся в array('I') по 4 байта на адрес, IPv6 — в array('Q')
+    парами 64-битных половин. Строковое представление адреса создается
+    только при переборе.
+    """
+
+    def __init__(self, ranges=()):
+        self._v4 = array("I")
+        self._v6 = array("Q")
+        ranges = coalesce_ranges(ranges)
+        check_host_count(ranges)
+        for target_range in ranges:
+            first, last = int(target_range.first), int(target_range.last)
+            if target_range.first.version == 4:
+                self._v4.extend(range(first, last + 1))
+            else:
+                for value in range(first, last + 1):
+                    self._v6.append(value >> _HALF)
+                    self._v6.append(value & _HALF_MASK)
+
+    def __len__(self):
+        return len(self._v4) + len(self._v6) // 2
+
+    def __iter__(self):
+        inet_ntoa = socket.inet_ntoa
+        for value in self._v4:
+            yield inet_ntoa(value.to_bytes(4, "big"))
+        v6 = self._v6
+        for index in range(0, len(v6), 2):
+            yield str(ipaddress.IPv6Address((v6[index] << _HALF) | v6[index + 1]))
+
+    def __contains__(self, address):
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        value = int(address)
+        if address.version == 4:
+            index = bisect_left(self._v4, value)
+            return index < len(self._v4) and self._v4[index] == value
+        return self._index_v6(value) is not None
+
+    def _index_v6(self, value):
+        low, high = 0, len(self._v6) // 2
+        while low < high:
+            middle = (low + high) // 2
+            current = (self._v6[2 * middle] << _HALF) | self._v6[2 * middle + 1]
+            if current == value:
+                return middle
+            if current < value:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def ranges(self):
+        """Представление набора в виде списка непрерывных диапазонов."""
+        return coalesce_ranges(TargetRange(address, address) for address in map(ipaddress.ip_address, self))
+
+    def __repr__(self):
+        return f"HostSet({len(self)} адресов)"
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_manager
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Временная база данных с пустыми кэшами db_manager."""
+    monkeypatch.setattr(db_manager, "DB_NAME", str(tmp_path / "config.db"))
+    monkeypatch.chdir(tmp_path)
+    db_manager._ip_name_cache.clear()
+    db_manager._loaded_name_objects.clear()
+    db_manager._history_object_ids.clear()
+    db_manager._transition_buffer.clear()
+    db_manager._rtt_buffer.clear()
+    db_manager.initialize_db()
+    return db_manager
@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import benchmark
+import main
+
+
+def test_quick_commands_do_not_load_monitoring_modules():
+    startup = benchmark.measure_startup(runs=5)
+    for command, result in startup["commands"].items():
+        assert result["heavy_modules"] == [], command
+        assert result["overhead_s"] <= startup["budget_s"], command
+
+
+# Код, после которого в отдельном интерпретаторе проверяется, загружены ли модули Telegram и пинга
+_IMPORT_MAIN = "import main"
+_RUN_STATUS = """
+import runpy, sys
+sys.argv = [{path!r}, "status"]
+try:
+    runpy.run_path({path!r}, run_name="__main__")
+except SystemExit:
+    pass
+"""
+_PRINT_LOADED = """
+import json, sys
+print(json.dumps(sorted({name.split(".")[0] for name in sys.modules} & {"telegram", "httpx", "pythonping"})), file=sys.__stderr__)
+"""
+
+
+def _loaded_heavy_modules(code, cwd):
+    completed = subprocess.run([sys.executable, "-c", code + _PRINT_LOADED], cwd=cwd, capture_output=True, text=True,
+                               env=dict(os.environ, PYTHONPATH=os.path.dirname(main.__file__)))
+    return json.loads(completed.stderr.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("code", [_IMPORT_MAIN, _RUN_STATUS.format(path=main.__file__)], ids=["import", "status"])
+def test_main_does_not_import_telegram_stack(code, tmp_path):
+    assert _loaded_heavy_modules(code, tmp_path) == []
+
+
+def test_notifier_imports_telegram_stack(tmp_path):
+    # Проверка выше имеет смысл, только если модули Telegram установлены и загружаются уведомлениями
+    pytest.importorskip("telegram")
+    assert {"telegram", "httpx"} <= set(_loaded_heavy_modules("import notifier", tmp_path))
+
+
+def test_stop_without_service_does_not_open_log(tmp_path):
+    if main.is_service_running():
+        pytest.skip("на машине запущен сервис мониторинга")
+    completed = subprocess.run([sys.executable, main.__file__, "stop"], cwd=tmp_path, capture_output=True, text=True)
+    assert completed.returncode == 0
+    assert "Сервис не запущен" in completed.stdout
+    assert not os.path.exists(tmp_path / "service.log")
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+import cluster
+import processing
+import supervisor
+from metrics import AGENT_ERRORS
+from probe import ProbeResult, UNREACHABLE
+from test_processing import RecordingNotifier, _statuses
+
+
+class FakeEngine:
+    """Движок проверок агента: хосты из down недоступны, остальные отвечают."""
+
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.down = set()
+        self.probed = set()
+
+    async def sweep(self, ip_addresses, methods=None):
+        if self.fail:
+            raise RuntimeError("нет прав на raw-сокет")
+        self.probed.update(ip_addresses)
+        return {ip: UNREACHABLE if ip in self.down else ProbeResult(True, 1.5) for ip in ip_addresses}
+
+
+async def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнено за отведенное время"
+        await asyncio.sleep(0.05)
+
+
+HOSTS = ("10.0.0.1", "10.0.0.2")
+
+
+def _objects(db, names):
+    for name in names:
+        db.save_object_config(name, list(HOSTS), "token", ["1"], 1)
+    return supervisor.load_all_objects()
+
+
+async def _start(db, objects, engines, token="secret"):
+    processing.service_running = True
+    collector = cluster.Collector("127.0.0.1", 0, token=token)
+    await collector.start()
+    notifier = RecordingNotifier()
+    monitoring = asyncio.ensure_future(
+        supervisor.run_objects(objects, notifier=notifier, monitor_factory=collector.monitor))
+    agents = {name: asyncio.ensure_future(
+        cluster.ProbeAgent("127.0.0.1", collector.port, name, token, engine).run())
+        for name, engine in engines.items()}
+    await _wait_for(lambda: set(collector.agents) == set(engines) and len(collector.monitors) == len(objects))
+    return collector, monitoring, agents, notifier
+
+
+async def _stop(collector, monitoring, agents):
+    processing.service_running = False
+    for task in agents.values():
+        task.cancel()
+    await asyncio.gather(monitoring, *agents.values(), return_exceptions=True)
+    await collector.close()
+
+
+def _all_statuses(db, names, status):
+    return all(db.load_ip_statuses(name) == dict.fromkeys(HOSTS, status) for name in names)
+
+
+def test_agents_stream_transitions_and_objects_move_after_disconnect(db, caplog):
+    engines = {"a": FakeEngine("a"), "b": FakeEngine("b")}
+    names = [f"object-{i}" for i in range(6)]
+    objects = _objects(db, names)
+
+    async def run():
+        collector, monitoring, agents, notifier = await _start(db, objects, engines)
+        assert set(collector.assignments.values()) == {"a", "b"}
+        await _wait_for(lambda: _all_statuses(db, names, "доступен"))
+        assert engines["a"].probed and engines["b"].probed
+
+        agents.pop("a").cancel()
+        await _wait_for(lambda: set(collector.assignments.values()) == {"b"})
+        # Агент b продолжает с состояниями хостов, известными коллектору: повторных уведомлений нет
+        engines["b"].down.add("10.0.0.2")
+        await _wait_for(lambda: len(notifier.messages) == len(names))
+        assert _statuses(notifier.messages) == ["нет соединения! ⛔"] * len(names)
+        assert all(db.load_ip_statuses(name)["10.0.0.2"] == "недоступен" for name in names)
+        assert all(collector.monitors[name].tracker.state_of("10.0.0.1") == "up" for name in names)
+        await _stop(collector, monitoring, agents)
+
+    with caplog.at_level(logging.ERROR, logger="asyncio"):
+        asyncio.run(run())
+    assert not [record for record in caplog.records if record.name == "asyncio"]
+
+
+def test_agent_errors_are_reported_once(db, caplog):
+    objects = _objects(db, ["site"])
+    before = AGENT_ERRORS._values.get(("site",), 0)
+
+    async def run():
+        collector, monitoring, agents, _ = await _start(db, objects, {"broken": FakeEngine("broken", fail=True)})
+        await _wait_for(lambda: AGENT_ERRORS._values.get(("site",), 0) > before)
+        await asyncio.sleep(2.5)
+        await _stop(collector, monitoring, agents)
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(run())
+    assert AGENT_ERRORS._values[("site",)] == before + 1
+    assert any("broken" in record.getMessage() and "raw-сокет" in record.getMessage() for record in caplog.records)
+    assert db.load_ip_statuses("site") == {}
+
+
+def test_probing_waits_for_first_agent(db, caplog):
+    objects = _objects(db, ["site"])
+
+    async def run():
+        collector, monitoring, agents, _ = await _start(db, objects, {})
+        assert collector.assignments == {"site": None}
+        await asyncio.sleep(1.5)
+        assert db.load_ip_statuses("site") == {}
+
+        engine = FakeEngine("late")
+        agents["late"] = asyncio.ensure_future(cluster.ProbeAgent("127.0.0.1", collector.port, "late", "secret", engine).run())
+        await _wait_for(lambda: _all_statuses(db, ["site"], "доступен"))
+        await _stop(collector, monitoring, agents)
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(run())
+    assert any("Нет подключенных агентов для объекта 'site'" in record.getMessage() for record in caplog.records)
+
+
+def test_agent_monitor_needs_no_database(monkeypatch):
+    def no_database():
+        raise AssertionError("агент обратился к базе данных")
+
+    monkeypatch.setattr(cluster.processing, "get_cached_ip_name", lambda *args: no_database())
+    monkeypatch.setattr("db_manager.get_connection", no_database)
+    assignment = {
+        "object": "site", "targets": ["10.0.0.1-10.0.0.2"],
+        "config": {"delay": 1, "config_version": 3, "extended_logging": True, "probe_log_sample_rate": None,
+                   "degraded_rtt": None, "degraded_loss": None, "probe_method": "icmp", "probe_trace": False},
+        "overrides": {}, "methods": {}, "parents": {},
+        "states": [["10.0.0.1", "up", 0, 100.0]], "via_parent": [],
+    }
+    monitor = cluster.AgentMonitor(assignment, None)
+    monitor._schedule_hosts()
+
+    async def run():
+        await monitor._process_results({"10.0.0.1": ProbeResult(True, 2.0), "10.0.0.2": UNREACHABLE})
+        await monitor._process_results({"10.0.0.1": UNREACHABLE, "10.0.0.2": UNREACHABLE})
+        await monitor._process_results({"10.0.0.1": UNREACHABLE})
+
+    asyncio.run(run())
+    report = monitor.take_report(with_rtt=True)
+    # Хост с восстановленным состоянием не инициализируется заново
+    assert [transition[:2] for transition in report["transitions"]] == [
+        ["10.0.0.2", "init"], ["10.0.0.1", "suspect"], ["10.0.0.1", "confirmed"]]
+    assert report["rtt"] == {"10.0.0.1": [3, 2, 2.0, None], "10.0.0.2": [2, 2, 0.0, None]}
+    assert monitor.take_report(with_rtt=True) is None
@@ -0,0 +1,111 @@
+import pytest
+from debounce import (DebounceTracker, Transition, UP, DOWN, SUSPECT_DOWN, SUSPECT_UP,
+                      INIT, SUSPECT, REVERTED, CONFIRMED, is_up)
+
+IP = "10.0.0.1"
+
+
+def _observe(tracker, results, start=100):
+    return [tracker.observe(IP, result, now=start + i) for i, result in enumerate(results)]
+
+
+@pytest.mark.parametrize("reachable, state", [(True, UP), (False, DOWN)])
+def test_first_result_initializes_state(reachable, state):
+    tracker = DebounceTracker(required=2)
+    assert tracker.observe(IP, reachable, now=5) == Transition(IP, INIT, reachable, state)
+    assert tracker.hosts[IP].changed_at == 5
+    assert tracker.observe(IP, reachable, now=6) is None
+    assert tracker.hosts[IP].changed_at == 5
+
+
+def test_outage_is_confirmed_after_required_checks():
+    tracker = DebounceTracker(required=2)
+    assert _observe(tracker, [True, False, False, False]) == [
+        Transition(IP, INIT, True, UP),
+        Transition(IP, SUSPECT, False, SUSPECT_DOWN),
+        None,
+        Transition(IP, CONFIRMED, False, DOWN),
+    ]
+    assert tracker.hosts[IP].changed_at == 103
+    assert tracker.hosts[IP].confirmations == 0
+    assert tracker.suspects() == []
+
+
+def test_recovery_is_confirmed_after_required_checks():
+    tracker = DebounceTracker(required=1)
+    assert _observe(tracker, [False, True, True]) == [
+        Transition(IP, INIT, False, DOWN),
+        Transition(IP, SUSPECT, True, SUSPECT_UP),
+        Transition(IP, CONFIRMED, True, UP),
+    ]
+
+
+@pytest.mark.parametrize("initial, flap, state", [(True, False, UP), (False, True, DOWN)])
+def test_opposite_result_reverts_suspect_state(initial, flap, state):
+    tracker = DebounceTracker(required=3)
+    _observe(tracker, [initial, flap, flap])
+    assert tracker.hosts[IP].confirmations == 1
+    assert tracker.observe(IP, initial, now=200) == Transition(IP, REVERTED, initial, state)
+    assert tracker.hosts[IP].confirmations == 0
+    # Время изменения остается от последнего подтвержденного состояния
+    assert tracker.hosts[IP].changed_at == 100
+    # Новое подозрение начинает подсчет подтверждений заново
+    assert tracker.observe(IP, flap, now=201).kind == SUSPECT
+    assert tracker.observe(IP, flap, now=202) is None
+    assert tracker.observe(IP, flap, now=203) is None
+    assert tracker.observe(IP, flap, now=204).kind == CONFIRMED
+
+
+def test_zero_required_confirms_immediately():
+    tracker = DebounceTracker(required=0)
+    assert _observe(tracker, [True, False, True]) == [
+        Transition(IP, INIT, True, UP),
+        Transition(IP, CONFIRMED, False, DOWN),
+        Transition(IP, CONFIRMED, True, UP),
+    ]
+
+
+@pytest.mark.parametrize("results, state", [([True, False], UP), ([False, True], DOWN)])
+def test_cancel_returns_to_confirmed_state(results, state):
+    tracker = DebounceTracker(required=2)
+    _observe(tracker, results)
+    tracker.cancel(IP)
+    assert tracker.state_of(IP) == state and tracker.hosts[IP].confirmations == 0
+    # Отмена подтвержденного состояния и неизвестного хоста ничего не меняет
+    tracker.cancel(IP)
+    tracker.cancel("10.9.9.9")
+    assert tracker.state_of(IP) == state and "10.9.9.9" not in tracker.hosts
+
+
+def test_hosts_advance_independently():
+    tracker = DebounceTracker(required=1)
+    tracker.observe("10.0.0.1", True)
+    tracker.observe("10.0.0.2", True)
+    tracker.observe("10.0.0.1", False)
+    assert tracker.suspects() == ["10.0.0.1"]
+    assert tracker.observe("10.0.0.2", True) is None
+    assert tracker.observe("10.0.0.1", False).kind == CONFIRMED
+    tracker.forget("10.0.0.2")
+    assert tracker.state_of("10.0.0.2") is None
+
+
+def test_snapshot_restore_round_trip():
+    tracker = DebounceTracker(required=3)
+    tracker.observe("10.0.0.1", True, now=1)
+    tracker.observe("10.0.0.2", True, now=1)
+    tracker.observe("10.0.0.2", False, now=2)
+    tracker.observe("10.0.0.2", False, now=3)
+    rows = tracker.snapshot()
+    assert sorted(rows) == [["10.0.0.1", UP, 0, 1], ["10.0.0.2", SUSPECT_DOWN, 1, 1]]
+
+    restored = DebounceTracker(required=3)
+    # Строки с неизвестным состоянием пропускаются
+    assert restored.restore(rows + [["10.0.0.3", "sleeping", 0, 1]]) == 2
+    assert restored.state_of("10.0.0.3") is None
+    assert restored.observe("10.0.0.2", False, now=4) is None
+    assert restored.observe("10.0.0.2", False, now=5) == Transition("10.0.0.2", CONFIRMED, False, DOWN)
+
+
+@pytest.mark.parametrize("state, expected", [(UP, True), (SUSPECT_DOWN, True), (DOWN, False), (SUSPECT_UP, False)])
+def test_is_up_follows_last_confirmed_status(state, expected):
+    assert is_up(state) is expected
@@ -0,0 +1,68 @@
+BASE = 1_699_920_000  # начало суток UTC
+IP = "10.0.0.1"
+
+
+def _transitions(db, changes):
+    for ts, status in changes:
+        db.record_transition("site", IP, status, ts)
+    db.flush_history()
+
+
+def test_availability_and_outages(db):
+    _transitions(db, [(BASE, db.HISTORY_UP), (BASE + 600, db.HISTORY_DOWN), (BASE + 900, db.HISTORY_UP)])
+    availability, outages = db.get_host_history("site", IP, BASE, BASE + 1200)
+    assert availability == 75.0
+    assert outages == [(BASE + 600, BASE + 900)]
+    assert db.get_object_availability("site", BASE + 700, BASE + 1000, [IP]) == {
+        IP: (100.0 / 3, [(BASE + 700, BASE + 900)])}
+    assert db.get_host_availability("site", "10.0.0.2", BASE, BASE + 1200) is None
+
+
+def test_transitions_in_the_same_second_are_kept(db):
+    _transitions(db, [(BASE, db.HISTORY_UP), (BASE + 10.2, db.HISTORY_DOWN), (BASE + 10.7, db.HISTORY_UP)])
+    db.record_transition("site", IP, db.HISTORY_DOWN, BASE + 10.9)
+    db.flush_history()
+    assert db.get_host_outages("site", IP, BASE, BASE + 100) == [(BASE + 10, BASE + 10), (BASE + 10, BASE + 100)]
+
+
+def test_rollup_rtt(db):
+    for offset, rtt in [(10, 10.0), (20, None), (30, 20.0), (3600 + 10, 30.0)]:
+        db.record_rtt_sample("site", IP, rtt, BASE + offset)
+    db.flush_history()
+    assert db.rollup_rtt(db.ROLLUP_HOUR, BASE + 2 * 3600)
+    assert db.get_rtt_rollups("site", IP, db.ROLLUP_HOUR, BASE, BASE + 86400) == [
+        (BASE, 3, 1, 10.0, 15.0, 20.0), (BASE + 3600, 1, 0, 30.0, 30.0, 30.0)]
+    assert db.execute_query("SELECT COUNT(*) FROM rtt_samples") == [(0,)]
+
+    assert db.rollup_rtt(db.ROLLUP_DAY, BASE + 86400)
+    assert db.get_rtt_rollups("site", IP, db.ROLLUP_DAY, BASE, BASE + 86400) == [(BASE, 4, 1, 10.0, 20.0, 30.0)]
+    assert db.get_rtt_rollups("site", IP, db.ROLLUP_HOUR, BASE, BASE + 86400) == []
+
+
+def test_retention_keeps_status_at_cutoff(db):
+    _transitions(db, [(BASE, db.HISTORY_UP), (BASE + 60, db.HISTORY_DOWN), (BASE + 60, db.HISTORY_UP),
+                      (BASE + 120, db.HISTORY_DOWN)])
+    db.record_rtt_sample("site", IP, 5.0, BASE + 10)
+    now = BASE + 10 * 86400
+    assert db.apply_history_retention(now=now, raw_days=1, hourly_days=5, transitions_days=5)
+
+    cutoff = now - 5 * 86400
+    assert db.execute_query("SELECT ts, status FROM status_transitions") == [(cutoff, db.HISTORY_DOWN)]
+    assert db.get_host_history("site", IP, cutoff, cutoff + 100) == (0.0, [(cutoff, cutoff + 100)])
+    assert db.get_rtt_rollups("site", IP, db.ROLLUP_DAY, BASE, now) == [(BASE, 1, 0, 5.0, 5.0, 5.0)]
+
+
+def test_old_transitions_table_is_migrated(db):
+    conn = db.get_connection()
+    conn.execute("DROP TABLE status_transitions")
+    conn.execute("""
+    CREATE TABLE status_transitions (
+        object_id INTEGER NOT NULL, ip INTEGER NOT NULL, ts INTEGER NOT NULL, status INTEGER NOT NULL,
+        PRIMARY KEY (object_id, ip, ts)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("INSERT INTO status_transitions VALUES (1, 167772161, ?, 0)", (BASE,))
+    conn.commit()
+    db.initialize_db()
+    assert db.execute_query("SELECT object_id, ip, ts, seq, status FROM status_transitions") == [
+        (1, 167772161, BASE, 0, 0)]
@@ -0,0 +1,50 @@
+import json
+import logging
+import multiprocessing
+import pytest
+import log_config
+
+RECORDS_PER_WORKER = 200
+
+
+@pytest.fixture
+def service_log(tmp_path, monkeypatch):
+    """Журнал в файл во временном каталоге; настройки журнала восстанавливаются после теста."""
+    root = logging.getLogger()
+    level = root.level
+    monkeypatch.setattr(log_config, "_settings", None)
+    monkeypatch.setattr(log_config, "_queue_handler", None)
+    monkeypatch.setattr(log_config.atexit, "register", lambda func: None)
+    path = tmp_path / "service.log"
+    log_config.setup_logging(log_file=str(path))
+    yield path
+    log_config.stop_worker_logging()
+    log_config.stop_logging()
+    root.removeHandler(log_config._queue_handler)
+    root.setLevel(level)
+
+
+def _worker(log_queue, name):
+    log_config.log_to_queue(log_queue)
+    for i in range(RECORDS_PER_WORKER):
+        logging.info(f"{name} {i}")
+    log_config.stop_logging()
+
+
+def test_workers_log_through_supervisor(service_log):
+    log_queue = log_config.start_worker_logging()
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_worker, args=(log_queue, f"worker-{i}")) for i in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    log_config.stop_worker_logging()
+    log_config.stop_logging()
+
+    entries = [json.loads(line) for line in service_log.read_text(encoding="utf-8").splitlines()]
+    messages = {entry["message"] for entry in entries}
+    for i in range(2):
+        assert {f"worker-{i} {n}" for n in range(RECORDS_PER_WORKER)} <= messages
+    assert {entry["pid"] for entry in entries} == {worker.pid for worker in workers}
+    assert [p.name for p in service_log.parent.iterdir()] == ["service.log"]
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Пустой реестр: метрики теста не попадают в метрики сервиса."""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def test_labels_are_escaped(registry):
+    counter = Counter("test_events_total", "События.", ("object",))
+    counter.inc('офис "А"\\2\nэтаж')
+    assert metrics.render_metrics() == (
+        "# HELP test_events_total События.\n"
+        "# TYPE test_events_total counter\n"
+        'test_events_total{object="офис \\"А\\"\\\\2\\nэтаж"} 1\n')
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram("test_duration_seconds", "Длительность.", ("object",), buckets=(0.5, 0.25, 1))
+    histogram.observe(0.125, "site")
+    # Значение на границе попадает в эту корзину (le — меньше или равно)
+    histogram.observe(0.25, "site")
+    histogram.observe_many([0.375, 2.5, 7], "site")
+    lines = metrics.render_metrics().splitlines()
+    assert lines[2:] == [
+        'test_duration_seconds_bucket{object="site",le="0.25"} 2',
+        'test_duration_seconds_bucket{object="site",le="0.5"} 3',
+        'test_duration_seconds_bucket{object="site",le="1"} 3',
+        'test_duration_seconds_bucket{object="site",le="+Inf"} 5',
+        'test_duration_seconds_sum{object="site"} 10.25',
+        'test_duration_seconds_count{object="site"} 5',
+    ]
+
+
+def test_gauge_function_and_values(registry):
+    Gauge("test_queue_depth", "Очередь.").set_function(lambda: 3)
+    gauge = Gauge("test_lag_seconds", "Отставание.", ("object",))
+    gauge.set(0.25, "a")
+    gauge.set(2.0, "b")
+    text = metrics.render_metrics()
+    assert "test_queue_depth 3\n" in text
+    assert 'test_lag_seconds{object="a"} 0.25\n' in text
+    assert 'test_lag_seconds{object="b"} 2\n' in text
+
+
+def test_failing_gauge_function_is_skipped(registry, caplog):
+    Gauge("test_broken", "Ошибка.").set_function(lambda: 1 / 0)
+    assert metrics.render_metrics() == "# HELP test_broken Ошибка.\n# TYPE test_broken gauge\n"
+    assert "test_broken" in caplog.text
+
+
+def test_respond_routes(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "_ROUTES", {})
+    Counter("test_total", "Счетчик.").inc()
+    metrics.register_route("/echo", lambda params: ("200 OK", "text/plain", params["q"].encode()))
+    metrics.register_route("/broken", lambda params: 1 / 0)
+
+    status, content_type, body = metrics._respond("GET", "/metrics")
+    assert status == "200 OK" and content_type.startswith("text/plain; version=0.0.4")
+    assert body.decode().endswith("test_total 1\n")
+    assert metrics._respond("GET", "/echo?q=%D0%BE%D0%BA")[2] == "ок".encode()
+    assert metrics._respond("GET", "/missing")[0] == "404 Not Found"
+    assert metrics._respond("POST", "/metrics")[0] == "405 Method Not Allowed"
+    assert metrics._respond("GET", "/broken")[0] == "500 Internal Server Error"
+
+
+async def _read_response(reader):
+    status = (await reader.readline()).decode().strip()
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode().strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    return status, headers, body
+
+
+def test_http_keep_alive(registry):
+    async def run():
+        server = await metrics.start_metrics_server(port=0, host="127.0.0.1")
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # Несколько запросов HTTP/1.1 в одном соединении
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\nGET /missing HTTP/1.1\r\n\r\n")
+            first = await _read_response(reader)
+            second = await _read_response(reader)
+            writer.write(b"PUT / HTTP/1.1\r\nConnection: close\r\n\r\n")
+            third = await _read_response(reader)
+            closed = await reader.read() == b""
+            writer.close()
+
+            # HTTP/1.0 без Connection: keep-alive закрывает соединение после ответа
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+            fourth = await _read_response(reader)
+            closed_old = await reader.read() == b""
+            writer.close()
+        return first, second, third, closed, fourth, closed_old
+
+    first, second, third, closed, fourth, closed_old = asyncio.run(run())
+    assert first[0] == "HTTP/1.1 200 OK" and first[1]["connection"] == "keep-alive"
+    assert second[0] == "HTTP/1.1 404 Not Found" and second[1]["connection"] == "keep-alive"
+    assert third[0] == "HTTP/1.1 405 Method Not Allowed" and third[1]["connection"] == "close"
+    assert closed
+    assert fourth[0] == "HTTP/1.1 200 OK" and fourth[1]["connection"] == "close"
+    assert closed_old
@@ -0,0 +1,122 @@
+import asyncio
+import gc
+import logging
+import time
+import notifier
+from telegram.error import NetworkError, TelegramError
+from notifier import TelegramDispatcher, RateLimiter, split_digest, MAX_MESSAGE_LENGTH, DIGEST_SEPARATOR
+
+
+class FakeBot:
+    """Клиент Telegram: errors — исключения, которые возвращают очередные вызовы send_message."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.attempts = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def send_message(self, chat_id, text):
+        self.attempts.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((time.monotonic(), chat_id, text))
+
+
+def _dispatch(bot, submissions, **options):
+    async def run():
+        dispatcher = TelegramDispatcher(bot_factory=lambda token: bot, **options)
+        started = time.monotonic()
+        for chat_ids, messages in submissions:
+            dispatcher.submit("token", chat_ids, messages)
+        assert await dispatcher.drain(timeout=10)
+        elapsed = time.monotonic() - started
+        await dispatcher.close()
+        return dispatcher, elapsed
+    return asyncio.run(run())
+
+
+def test_rate_limiter_spaces_acquisitions():
+    async def run():
+        limiter = RateLimiter(20)
+        started = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        return time.monotonic() - started
+    assert asyncio.run(run()) >= 0.19
+
+
+def test_split_digest_respects_telegram_limit():
+    messages = ["x" * 1500] * 5 + ["y" * 5000]
+    chunks = split_digest(messages)
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert [chunk.count("x" * 1500) for chunk in chunks[:3]] == [2, 2, 1]
+    assert chunks[-1] == "y" * MAX_MESSAGE_LENGTH
+    assert split_digest(["a", "b"]) == [f"a{DIGEST_SEPARATOR}b"]
+
+
+def test_per_chat_rate_limits_digests_of_one_chat():
+    bot = FakeBot()
+    _, elapsed = _dispatch(bot, [(["1"], ["x" * 3000] * 3)], per_chat_rate=5, global_rate=1000)
+    assert len(bot.sent) == 3
+    times = [sent_at for sent_at, _, _ in bot.sent]
+    assert all(later - earlier >= 0.18 for earlier, later in zip(times, times[1:]))
+
+
+def test_global_rate_limits_all_chats():
+    bot = FakeBot()
+    chats = [str(chat) for chat in range(10)]
+    _, elapsed = _dispatch(bot, [(chats, ["alert"])], per_chat_rate=1000, global_rate=5)
+    assert sorted(chat_id for _, chat_id, _ in bot.sent) == sorted(chats)
+    # Пять сообщений уходят сразу (burst), остальные — со скоростью 5 в секунду
+    assert elapsed >= 0.75
+
+
+def test_network_errors_are_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_BASE_DELAY", 0.05)
+    bot = FakeBot([NetworkError("connection reset"), NetworkError("connection reset")])
+    dispatcher, _ = _dispatch(bot, [(["1"], ["alert"])], global_rate=1000)
+    assert [text for _, _, text in bot.sent] == ["alert"]
+    assert dispatcher.sent == 1 and dispatcher.failed == 0
+    first, second, third = bot.attempts
+    assert second - first >= 0.05
+    assert third - second >= 0.1
+
+
+def test_message_is_dropped_after_max_retries(monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_BASE_DELAY", 0.01)
+    bot = FakeBot([NetworkError("down")] * 3)
+    dispatcher, _ = _dispatch(bot, [(["1"], ["alert"])], global_rate=1000, max_retries=3)
+    assert not bot.sent
+    assert dispatcher.failed == 1 and len(bot.attempts) == 3
+
+
+def test_telegram_error_is_not_retried():
+    bot = FakeBot([TelegramError("chat not found")])
+    dispatcher, _ = _dispatch(bot, [(["1"], ["alert"])], global_rate=1000)
+    assert len(bot.attempts) == 1 and dispatcher.failed == 1
+
+
+def test_unexpected_error_does_not_stop_chat_queue(caplog):
+    bot = FakeBot([RuntimeError("boom")])
+
+    async def run():
+        dispatcher = TelegramDispatcher(bot_factory=lambda token: bot, global_rate=1000, per_chat_rate=1000)
+        dispatcher.submit("token", ["1"], ["first"])
+        assert await dispatcher.drain(timeout=5)
+        dispatcher.submit("token", ["1"], ["second"])
+        assert await dispatcher.drain(timeout=5)
+        await dispatcher.close()
+        return dispatcher
+
+    with caplog.at_level(logging.ERROR):
+        dispatcher = asyncio.run(run())
+        gc.collect()
+    assert [text for _, _, text in bot.sent] == ["second"]
+    assert dispatcher.failed == 1
+    assert not [record for record in caplog.records if "never retrieved" in record.getMessage()]
@@ -0,0 +1,83 @@
+import csv
+import pytest
+import objects
+
+
+def test_probe_overrides_round_trip_through_export(db, tmp_path):
+    db.save_object_config("site", ["10.0.0.0/30"], "token", ["1"], 10)
+    db.set_probe_override("10.0.0.1", "site", 30, 0)
+    db.set_probe_override("10.0.0.2", "site", None, 2)
+    for name in ("site.csv", "site.json"):
+        path = str(tmp_path / name)
+        objects.export_objects_file(path)
+        db.execute_query("DELETE FROM ip_names")
+        objects.import_objects_file(path)
+        assert db.load_probe_overrides("site") == {"10.0.0.1": (30, 0), "10.0.0.2": (None, 2)}
+
+
+def test_import_rejects_bad_probe_interval(db):
+    rows = [{"object_name": "site", "target": "10.0.0.1", "probe_interval": "0", "telegram_token": "t"}]
+    with pytest.raises(ValueError):
+        db.import_object_rows(rows)
+    rows = [{"object_name": "site", "target": "10.0.0.0/30", "probe_priority": "1", "telegram_token": "t"}]
+    with pytest.raises(ValueError):
+        db.import_object_rows(rows)
+    assert db.load_object_config("site") is None
+
+
+def _populate(db):
+    db.save_object_config("office", ["10.0.0.0/29", "10.0.1.5"], "token-1", ["1", "2"], 15)
+    db.set_object_probe_method("office", "tcp:22")
+    db.save_ip_name("10.0.0.1", "office", "шлюз, этаж 1")
+    db.set_host_parent("10.0.0.2", "office", "10.0.0.1")
+    db.set_probe_method("10.0.0.3", "office", "udp:161")
+    db.set_probe_override("10.0.0.4", "office", 60, 1)
+    db.save_object_config("warehouse", ["192.168.1.1-192.168.1.3"], "token-2", ["3"], 30)
+
+
+def _clear(db):
+    for table in ("objects", "object_targets", "ip_names"):
+        db.execute_query(f"DELETE FROM {table}")
+    db.invalidate_ip_names()
+
+
+@pytest.mark.parametrize("name", ["objects.csv", "objects.json"])
+def test_export_import_round_trip(db, tmp_path, name):
+    _populate(db)
+    exported = list(db.export_objects())
+    path = str(tmp_path / name)
+    assert objects.export_objects_file(path) == 2
+    _clear(db)
+    assert objects.import_objects_file(path) == (2, 1)
+    assert list(db.export_objects()) == exported
+    assert db.get_ip_name("10.0.0.1", "office") == "шлюз, этаж 1"
+
+
+@pytest.mark.parametrize("bad_row", [
+    {"object_name": "office", "target": "10.0.0.300"},
+    {"object_name": "", "target": "10.0.2.1"},
+    {"object_name": "office", "target": "10.0.2.1", "parent_ip": "gateway"},
+    {"object_name": "office", "target": "10.0.2.0/30", "ip_name": "сеть"},
+    {"object_name": "office", "target": "10.0.2.1", "probe": "http"},
+    {"object_name": "new", "delay": "often"},
+], ids=["target", "object", "parent", "range-name", "probe", "delay"])
+def test_invalid_row_rolls_back_whole_import(db, tmp_path, bad_row):
+    _populate(db)
+    before = list(db.export_objects())
+    rows = [
+        {"object_name": "office", "telegram_token": "token-new", "delay": "5"},
+        {"object_name": "office", "target": "10.0.2.0/24"},
+        {"object_name": "office", "target": "10.0.0.1", "ip_name": "переименован"},
+        {"object_name": "new", "target": "172.16.0.1", "ip_name": "новый", "telegram_token": "t"},
+        bad_row,
+    ]
+    path = str(tmp_path / "import.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=db.TRANSFER_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    with pytest.raises(ValueError):
+        objects.import_objects_file(path)
+    assert list(db.export_objects()) == before
+    assert db.load_object_config("new") is None
+    assert db.get_ip_name("10.0.0.1", "office") == "шлюз, этаж 1"
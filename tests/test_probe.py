@@ -0,0 +1,264 @@
+import asyncio
+import socket
+import struct
+import time
+import pytest
+import probe
+from probe import IcmpSweeper, ProbeEngine, UNREACHABLE
+
+
+def echo_reply(identifier, sequence):
+    """Пакет Echo Reply с IPv4-заголовком, как его возвращает raw-сокет."""
+    ip_header = bytes([0x45]) + bytes(19)
+    icmp = struct.pack("!BBHHH", probe.ICMP_ECHO_REPLY, 0, 0, identifier, sequence)
+    return ip_header + icmp + b"ping_dev"
+
+
+class FakeNetwork:
+    """Имитация raw ICMP-сокета на socketpair.
+
+    respond(ip, identifier, sequence) возвращает список ответов [(адрес источника, пакет)]
+    на запрос к ip; по умолчанию хосты не отвечают.
+    """
+
+    def __init__(self, respond=None):
+        self._socket, self._peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.respond = respond or (lambda ip, identifier, sequence: [])
+        self.sent = []
+        self.fail_send = set()
+
+    def setblocking(self, flag):
+        self._socket.setblocking(flag)
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def sendto(self, packet, address):
+        ip = address[0]
+        if ip in self.fail_send:
+            raise OSError("Network is unreachable")
+        _, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+        self.sent.append((ip, identifier, sequence))
+        for source, reply in self.respond(ip, identifier, sequence):
+            self._peer.send(source.encode() + b"\0" + reply)
+        return len(packet)
+
+    def recvfrom(self, size):
+        data = self._socket.recv(size)
+        source, _, packet = data.partition(b"\0")
+        return packet, (source.decode(), 0)
+
+    def close(self):
+        self._socket.close()
+        self._peer.close()
+
+
+def _sweep(sweeper, ip_addresses):
+    async def run():
+        started = time.monotonic()
+        results = await sweeper.sweep(ip_addresses)
+        return results, time.monotonic() - started
+    return asyncio.run(run())
+
+
+def test_replies_are_matched_by_key_and_source():
+    network = FakeNetwork(lambda ip, identifier, sequence: [(ip, echo_reply(identifier, sequence))]
+                          if ip != "10.0.0.3" else [])
+    sweeper = IcmpSweeper(timeout=0.3, sock=network)
+    results, _ = _sweep(sweeper, ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+    assert results["10.0.0.1"].reachable and results["10.0.0.1"].rtt is not None
+    assert results["10.0.0.2"].reachable
+    assert results["10.0.0.3"] == UNREACHABLE
+    # Каждый хост получил свою пару (identifier, sequence)
+    assert len({(identifier, sequence) for _, identifier, sequence in network.sent}) == 3
+    sweeper.close()
+
+
+def test_foreign_and_duplicate_replies_are_ignored():
+    def respond(ip, identifier, sequence):
+        if ip == "10.0.0.1":
+            # Ответ дважды: второй приходит, когда запрос уже сопоставлен
+            return [(ip, echo_reply(identifier, sequence))] * 2
+        if ip == "10.0.0.2":
+            # Правильная пара, но ответил другой адрес
+            return [("10.9.9.9", echo_reply(identifier, sequence))]
+        # Ответ на чужой запрос (другой identifier)
+        return [(ip, echo_reply((identifier + 1) & 0xFFFF, sequence))]
+
+    sweeper = IcmpSweeper(timeout=0.2, sock=FakeNetwork(respond))
+    results, _ = _sweep(sweeper, ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+    assert results["10.0.0.1"].reachable
+    assert results["10.0.0.2"] == UNREACHABLE
+    assert results["10.0.0.3"] == UNREACHABLE
+    assert not sweeper._pending
+    sweeper.close()
+
+
+def test_whole_batch_shares_one_deadline():
+    sweeper = IcmpSweeper(timeout=0.3, sock=FakeNetwork())
+    ip_addresses = [f"10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    results, elapsed = _sweep(sweeper, ip_addresses)
+    assert not any(result.reachable for result in results.values())
+    assert 0.3 <= elapsed < 0.9
+    sweeper.close()
+
+
+def test_batch_finishes_early_when_all_hosts_reply():
+    network = FakeNetwork(lambda ip, identifier, sequence: [(ip, echo_reply(identifier, sequence))])
+    sweeper = IcmpSweeper(timeout=5, sock=network)
+    results, elapsed = _sweep(sweeper, [f"10.0.0.{i}" for i in range(1, 101)])
+    assert all(result.reachable for result in results.values())
+    assert elapsed < 1
+    sweeper.close()
+
+
+def test_send_error_marks_only_that_host_unreachable():
+    network = FakeNetwork(lambda ip, identifier, sequence: [(ip, echo_reply(identifier, sequence))])
+    network.fail_send.add("10.0.0.2")
+    sweeper = IcmpSweeper(timeout=0.2, sock=network)
+    results, _ = _sweep(sweeper, ["10.0.0.1", "10.0.0.2"])
+    assert results["10.0.0.1"].reachable
+    assert results["10.0.0.2"] == UNREACHABLE
+    sweeper.close()
+
+
+def dgram_echo_reply(identifier, sequence):
+    """Пакет Echo Reply без IP-заголовка, как его возвращает ping-сокет."""
+    return echo_reply(identifier, sequence)[20:]
+
+
+def _ping_socket_network():
+    # Ядро заменяет identifier запроса номером ping-сокета
+    return FakeNetwork(lambda ip, identifier, sequence: [(ip, dgram_echo_reply(0x4242, sequence))]
+                       if ip != "10.0.0.2" else [])
+
+
+def test_datagram_sweeper_matches_replies_by_sequence():
+    network = _ping_socket_network()
+    sweeper = IcmpSweeper(timeout=0.2, sock=network, datagram=True)
+    for _ in range(2):
+        results, _ = _sweep(sweeper, ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        assert results["10.0.0.1"].reachable and results["10.0.0.3"].reachable
+        assert results["10.0.0.2"] == UNREACHABLE
+    # Номера sequence сквозные между пакетами
+    assert [sequence for _, _, sequence in network.sent] == list(range(6))
+    sweeper.close()
+
+
+def test_engine_falls_back_to_ping_socket_without_root(monkeypatch):
+    def open_socket(family=socket.AF_INET, datagram=False):
+        if not datagram:
+            raise PermissionError("Operation not permitted")
+        return _ping_socket_network()
+
+    monkeypatch.setattr(probe, "open_icmp_socket", open_socket)
+    engine = ProbeEngine(timeout=0.2)
+    assert engine._sweeper.datagram
+    results = asyncio.run(engine.sweep(["10.0.0.1", "10.0.0.2"]))
+    assert results["10.0.0.1"].reachable and results["10.0.0.2"] == UNREACHABLE
+    engine.close()
+
+
+def test_engine_fails_without_icmp_sockets(monkeypatch):
+    def no_socket(family=socket.AF_INET, datagram=False):
+        raise PermissionError("Operation not permitted")
+
+    monkeypatch.setattr(probe, "open_icmp_socket", no_socket)
+    with pytest.raises(OSError, match="ping_group_range"):
+        ProbeEngine()
+
+
+@pytest.mark.parametrize("spec, method", [
+    ("", probe.ICMP),
+    ("ICMP", probe.ICMP),
+    ("tcp", probe.ProbeMethod("tcp", 80)),
+    ("tcp:22", probe.ProbeMethod("tcp", 22)),
+    (" UDP:161 ", probe.ProbeMethod("udp", 161)),
+    ("udp", probe.ProbeMethod("udp", 33434)),
+])
+def test_parse_probe_method(spec, method):
+    assert probe.parse_probe_method(spec) == method
+    assert probe.parse_probe_method(probe.format_probe_method(method)) == method
+
+
+@pytest.mark.parametrize("spec", ["icmp:1", "http", "tcp:0", "tcp:65536", "udp:-1", "tcp:ssh"])
+def test_parse_probe_method_rejects_invalid_spec(spec):
+    with pytest.raises(ValueError):
+        probe.parse_probe_method(spec)
+
+
+def _free_port(kind):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_tcp_probe_open_port():
+    async def run():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await probe.tcp_probe("127.0.0.1", port, timeout=1)
+
+    result = asyncio.run(run())
+    assert result.reachable and 0 <= result.rtt < 1000
+
+
+def test_tcp_probe_refused_port_means_host_is_up():
+    result = asyncio.run(probe.tcp_probe("127.0.0.1", _free_port(socket.SOCK_STREAM), timeout=1))
+    assert result.reachable and result.rtt is not None
+
+
+def test_tcp_probe_silent_port_times_out():
+    # Очередь соединений заполнена: ядро отбрасывает SYN без ответа
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(0)
+        port = server.getsockname()[1]
+        clients = [socket.socket() for _ in range(3)]
+        for client in clients:
+            client.setblocking(False)
+            client.connect_ex(("127.0.0.1", port))
+        time.sleep(0.1)
+        started = time.monotonic()
+        result = asyncio.run(probe.tcp_probe("127.0.0.1", port, timeout=0.3))
+        elapsed = time.monotonic() - started
+        for client in clients:
+            client.close()
+    assert result == UNREACHABLE
+    assert 0.3 <= elapsed < 1
+
+
+def test_udp_probe_reply_means_host_is_up():
+    class Echo(asyncio.DatagramProtocol):
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, address):
+            self.transport.sendto(data, address)
+
+    async def run():
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(Echo, local_addr=("127.0.0.1", 0))
+        try:
+            return await probe.udp_probe("127.0.0.1", transport.get_extra_info("sockname")[1], timeout=1)
+        finally:
+            transport.close()
+
+    result = asyncio.run(run())
+    assert result.reachable and result.rtt is not None
+
+
+def test_udp_probe_port_unreachable_means_host_is_up():
+    result = asyncio.run(probe.udp_probe("127.0.0.1", _free_port(socket.SOCK_DGRAM), timeout=1))
+    assert result.reachable and result.rtt is not None
+
+
+def test_udp_probe_silent_port_times_out():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+        server.bind(("127.0.0.1", 0))
+        started = time.monotonic()
+        result = asyncio.run(probe.udp_probe("127.0.0.1", server.getsockname()[1], timeout=0.3))
+        elapsed = time.monotonic() - started
+        assert server.recv(64) == probe._UDP_PAYLOAD
+    assert result == UNREACHABLE
+    assert 0.3 <= elapsed < 1
@@ -0,0 +1,56 @@
+import asyncio
+import replay
+from probe import ProbeResult, UNREACHABLE
+from probe_trace import TraceWriter, read_trace, trace_path
+
+
+def test_reopen_restores_hosts_and_drops_torn_block(tmp_path):
+    path = str(tmp_path / "site.trace")
+    writer = TraceWriter(path, "site")
+    writer.record(100.0, {"10.0.0.1": ProbeResult(True, 12.3), "10.0.0.2": UNREACHABLE}, 10)
+    writer.close()
+    with open(path, "ab") as f:
+        f.write(b"\x03\x00\x00\x01\x00partial")
+
+    writer = TraceWriter(path, "site")
+    writer.record(101.0, {"10.0.0.2": ProbeResult(True, None), "10.0.0.3": ProbeResult(True, 1.0)}, 10)
+    writer.close()
+
+    sweeps = list(read_trace(path))
+    assert [sweep.timestamp for sweep in sweeps] == [100.0, 101.0]
+    assert {sweep.object_name for sweep in sweeps} == {"site"}
+    assert {sweep.delay for sweep in sweeps} == {10}
+    assert sweeps[0].results == {"10.0.0.1": ProbeResult(True, 12.3), "10.0.0.2": UNREACHABLE}
+    assert sweeps[1].results == {"10.0.0.2": ProbeResult(True, None), "10.0.0.3": ProbeResult(True, 1.0)}
+
+
+def test_replay_of_one_outage_sends_two_alerts(db):
+    db.save_object_config("site", ["10.0.0.1"], "token", ["1"], 10)
+    db.save_ip_name("10.0.0.1", "site", "router")
+    writer = TraceWriter(trace_path("site"), "site")
+    good = ProbeResult(True, 10.0)
+    for second, result in enumerate([good] * 40 + [UNREACHABLE] * 15 + [good] * 40):
+        writer.record(1000.0 + second, {"10.0.0.1": result}, 10)
+    writer.close()
+
+    report, messages = asyncio.run(replay.replay_trace(trace_path("site")))
+    assert report["sweeps"] == 95
+    assert report["alerts"] == 2
+    assert [text.split("Статус: ", 1)[1].split("\n", 1)[0] for _, _, text in messages] == [
+        "нет соединения! ⛔", "соединение восстановлено! ✅"]
+
+
+def test_run_replay_releases_the_copy_and_keeps_the_working_db(db):
+    db.save_object_config("site", ["10.0.0.1"], "token", ["1"], 2)
+    db_name = db.DB_NAME
+    writer = TraceWriter(trace_path("site"), "site")
+    for second, result in enumerate([ProbeResult(True, 1.0)] * 3 + [UNREACHABLE] * 5):
+        writer.record(1000.0 + second, {"10.0.0.1": result}, 2)
+    writer.close()
+
+    report, messages = replay.run_replay(trace_path("site"))
+    assert report["alerts"] == 1 and len(messages) == 1
+    assert db.DB_NAME == db_name
+    assert db._local.conn is None
+    assert db.load_ip_statuses("site") == {}
+    assert db.get_host_outages("site", "10.0.0.1", 0, 2000) == []
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+import processing
+from probe import ProbeResult, UNREACHABLE
+
+
+class RecordingNotifier:
+    def __init__(self):
+        self.messages = []
+
+    def submit(self, token, chat_ids, messages):
+        self.messages.extend(messages)
+
+
+def _monitor(db, delay=10, loss=None, start_delay=None):
+    db.save_object_config("site", ["10.0.0.1"], "token", ["1"], delay)
+    db.set_degraded_thresholds("site", loss=loss)
+    db.save_ip_name("10.0.0.1", "site", "router")
+    notifier = RecordingNotifier()
+    object_data = {"object_name": "site", "ip_list": db.load_object_hosts("site"),
+                   "telegram_token": "token", "telegram_chat_ids": ["1"]}
+    monitor = processing.ObjectMonitor(object_data, start_delay or delay, None, notifier)
+    monitor._schedule_hosts()
+    return monitor, notifier
+
+
+def _feed(monitor, results):
+    async def run():
+        for result in results:
+            await monitor._process_results({"10.0.0.1": result})
+    asyncio.run(run())
+
+
+def _statuses(messages):
+    return [message.split("Статус: ", 1)[1].split("\n", 1)[0] for message in messages]
+
+
+def test_outage_sends_only_status_alerts(db):
+    monitor, notifier = _monitor(db, delay=10, loss=0.2)
+    good = ProbeResult(True, 10.0)
+    _feed(monitor, [good] * 40 + [UNREACHABLE] * 15 + [good] * 40)
+    assert _statuses(notifier.messages) == ["нет соединения! ⛔", "соединение восстановлено! ✅"]
+
+
+def test_lossy_host_is_reported_as_degraded(db):
+    monitor, notifier = _monitor(db, delay=3, loss=0.2)
+    good = ProbeResult(True, 10.0)
+    _feed(monitor, [good] * 20 + [good, good, UNREACHABLE] * 10 + [good] * 60)
+    assert _statuses(notifier.messages) == ["деградация связи! ⚠️", "качество связи восстановлено ✅"]
+
+
+def test_reload_keeps_start_delay_until_config_changes(db):
+    monitor, _ = _monitor(db, delay=10, start_delay=3)
+    monitor.reload()
+    assert monitor.delay == 3
+    db.save_object_config("site", ["10.0.0.1"], "token", ["1"], 20)
+    monitor.reload()
+    assert monitor.delay == 20
+    assert monitor.tracker.required == 20
+
+
+def test_extended_logging_samples_probe_results(db, caplog, monkeypatch):
+    monitor, _ = _monitor(db)
+    assert monitor.probe_log_sample_rate == 1.0
+    db.toggle_logging("site", True, sample_rate=0.25)
+    monitor.reload()
+    assert monitor.extended_logging and monitor.probe_log_sample_rate == 0.25
+
+    monkeypatch.setattr(processing.random, "random", iter([0.1, 0.3, 0.2, 0.9] * 10).__next__)
+    caplog.set_level("INFO")
+    _feed(monitor, [ProbeResult(True, 10.0)] * 40)
+    assert sum(1 for record in caplog.records if getattr(record, "event", None) == "probe") == 20
+
+    with pytest.raises(ValueError):
+        db.toggle_logging("site", True, sample_rate=1.5)
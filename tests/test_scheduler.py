@@ -0,0 +1,67 @@
+import random
+from collections import Counter
+from scheduler import TimingWheel, ProbeScheduler
+
+
+def _run(wheel, ticks):
+    """Элементы, срок которых наступил, по номерам тактов: {такт: [элементы]}."""
+    fired = {}
+    for _ in range(ticks):
+        due = wheel.advance()
+        if due:
+            fired[wheel.current_tick] = due
+    return fired
+
+
+def test_wheel_keeps_items_beyond_one_revolution():
+    wheel = TimingWheel(tick=0.25, slots=8)
+    wheel.schedule("far", 5)
+    wheel.schedule("near", 0.5)
+    assert _run(wheel, 30) == {2: ["near"], 20: ["far"]}
+    assert len(wheel) == 0
+
+
+def test_wheel_reschedule_and_cancel():
+    wheel = TimingWheel(tick=1, slots=8)
+    wheel.schedule("a", 2)
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 3)
+    wheel.cancel("b")
+    assert _run(wheel, 10) == {5: ["a"]}
+
+
+def test_first_probes_are_spread_over_the_interval():
+    scheduler = ProbeScheduler(10, tick=0.25)
+    scheduler._random = random.Random(1)
+    for i in range(4000):
+        scheduler.add_host(f"10.0.{i // 256}.{i % 256}")
+    per_tick = Counter({tick: len(due) for tick, due in _run(scheduler.wheel, 60).items()})
+    assert sum(per_tick.values()) == 4000
+    assert max(per_tick) <= 40
+    assert max(per_tick.values()) < 2 * 4000 / 40
+
+
+def test_backoff_doubles_up_to_the_cap():
+    scheduler = ProbeScheduler(10, jitter=0, max_backoff_factor=32, max_backoff_interval=600)
+    scheduler.add_host("10.0.0.1")
+    scheduler.add_host("10.0.0.2", interval=30)
+    assert [scheduler.next_interval("10.0.0.1", True) for _ in range(7)] == [20, 40, 80, 160, 320, 320, 320]
+    assert [scheduler.next_interval("10.0.0.2", True) for _ in range(6)] == [60, 120, 240, 480, 600, 600]
+    assert scheduler.next_interval("10.0.0.1", False) == 10
+    assert scheduler.next_interval("10.0.0.1", True) == 20
+
+
+def test_priority_disables_backoff():
+    scheduler = ProbeScheduler(10, jitter=0)
+    scheduler.add_host("10.0.0.1", priority=1)
+    assert [scheduler.next_interval("10.0.0.1", True) for _ in range(5)] == [10] * 5
+    scheduler.set_override("10.0.0.1", interval=5, priority=0)
+    assert [scheduler.next_interval("10.0.0.1", True) for _ in range(3)] == [10, 20, 40]
+
+
+def test_jitter_stays_within_bounds():
+    scheduler = ProbeScheduler(10, jitter=0.1)
+    scheduler._random = random.Random(2)
+    scheduler.add_host("10.0.0.1")
+    intervals = [scheduler.next_interval("10.0.0.1", False) for _ in range(1000)]
+    assert 9 <= min(intervals) < 9.2 and 10.8 < max(intervals) <= 11
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+import zlib
+import pytest
+import processing
+from probe import ProbeResult, UNREACHABLE
+from scheduler import ProbeScheduler
+from test_processing import RecordingNotifier, _statuses
+
+HOSTS = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+UP = ProbeResult(True, 5.0)
+
+
+def _monitor(db):
+    db.save_object_config("site", HOSTS, "token", ["1"], 3)
+    notifier = RecordingNotifier()
+    object_data = {"object_name": "site", "ip_list": db.load_object_hosts("site"),
+                   "telegram_token": "token", "telegram_chat_ids": ["1"]}
+    return processing.ObjectMonitor(object_data, 3, None, notifier), notifier
+
+
+def _feed(monitor, *batches):
+    async def run():
+        for batch in batches:
+            await monitor._process_results(batch)
+    asyncio.run(run())
+
+
+def _saved_monitor(db):
+    """Монитор с хостом в каждом состоянии: up, suspect-down (одно подтверждение из трех) и down."""
+    monitor, notifier = _monitor(db)
+    monitor._schedule_hosts()
+    _feed(monitor, dict.fromkeys(HOSTS, UP),
+          {"10.0.0.2": UNREACHABLE, "10.0.0.3": UNREACHABLE},
+          {"10.0.0.2": UNREACHABLE, "10.0.0.3": UNREACHABLE},
+          {"10.0.0.3": UNREACHABLE}, {"10.0.0.3": UNREACHABLE})
+    assert _statuses(notifier.messages) == ["нет соединения! ⛔"]
+    monitor.scheduler.reschedule("10.0.0.1", delay=30)
+    for _ in range(3):
+        monitor.scheduler.reschedule("10.0.0.3", is_down=True)
+    monitor.save_state()
+    return monitor
+
+
+def test_snapshot_restores_states_confirmations_and_schedule(db):
+    saved = _saved_monitor(db)
+    backoff = saved.scheduler.snapshot()["10.0.0.3"][1]
+    assert backoff == 3
+
+    monitor, notifier = _monitor(db)
+    assert monitor.restore_state()
+    monitor._schedule_hosts()
+    assert [monitor.tracker.state_of(ip) for ip in HOSTS] == ["up", "suspect-down", "down"]
+    assert monitor.tracker.hosts["10.0.0.2"].confirmations == 1
+    assert monitor.tracker.hosts["10.0.0.3"].changed_at == saved.tracker.hosts["10.0.0.3"].changed_at
+    positions = monitor.scheduler.snapshot()
+    assert 29 <= positions["10.0.0.1"][0] <= 30
+    assert positions["10.0.0.3"][1] == backoff
+
+    # Ожидающее изменение подтверждается с того же места, а уже подтвержденное не отправляется повторно
+    _feed(monitor, {"10.0.0.2": UNREACHABLE, "10.0.0.3": UNREACHABLE}, {"10.0.0.2": UNREACHABLE})
+    assert _statuses(notifier.messages) == ["нет соединения! ⛔"]
+    assert "10.0.0.2" in notifier.messages[0]
+
+
+def test_stale_snapshot_is_ignored(db):
+    _saved_monitor(db)
+    db.execute_query("UPDATE monitor_snapshots SET saved_at = ? WHERE object_name = 'site'",
+                     (time.time() - processing.SNAPSHOT_MAX_AGE - 60,))
+    monitor, _ = _monitor(db)
+    assert not monitor.restore_state()
+    assert monitor.tracker.hosts == {}
+
+
+@pytest.mark.parametrize("data", [
+    b"not zlib",
+    zlib.compress(b"{not json"),
+    zlib.compress(json.dumps({"hosts": 5}).encode()),
+    zlib.compress(json.dumps({"schedule": {}}).encode()),
+    zlib.compress(json.dumps({"hosts": [["10.0.0.1", "up"]]}).encode()),
+], ids=["zlib", "json", "hosts", "no-hosts", "row"])
+def test_corrupt_snapshot_is_ignored(db, data):
+    _saved_monitor(db)
+    db.execute_query("UPDATE monitor_snapshots SET data = ? WHERE object_name = 'site'", (data,))
+    monitor, _ = _monitor(db)
+    assert not monitor.restore_state()
+    assert monitor.tracker.hosts == {}
+
+
+def test_overdue_hosts_are_spread_over_interval():
+    scheduler = ProbeScheduler(10)
+    scheduler.add_host("10.0.0.1")
+    scheduler.add_host("10.0.0.2")
+    before = scheduler.snapshot()["10.0.0.2"][0]
+    assert scheduler.restore({"10.0.0.1": [20, 2], "10.0.0.2": [5, 1], "10.0.0.9": [1, 0]}, elapsed=8) == 2
+    positions = scheduler.snapshot()
+    assert positions["10.0.0.1"] == [12, 2]
+    assert positions["10.0.0.2"] == [before, 1]
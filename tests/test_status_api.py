@@ -0,0 +1,116 @@
+import asyncio
+import json
+import pytest
+import metrics
+import processing
+import status_api
+from probe import ProbeResult, UNREACHABLE
+from test_processing import RecordingNotifier
+
+HOSTS = [f"10.0.0.{i}" for i in range(1, 7)]
+GOOD = ProbeResult(True, 10.0)
+
+
+@pytest.fixture
+def monitor(db):
+    """Объект со всеми состояниями хостов.
+
+    10.0.0.1 доступен, 10.0.0.2 недоступен, 10.0.0.3 подозревается в недоступности,
+    10.0.0.4 с деградацией связи, 10.0.0.5 недоступен через 10.0.0.2 (сохраняет последнее
+    подтвержденное состояние up), 10.0.0.6 еще не проверялся.
+    """
+    db.save_object_config("site", HOSTS, "token", ["1"], 3)
+    db.set_degraded_thresholds("site", loss=0.2)
+    db.set_host_parent("10.0.0.5", "site", "10.0.0.2")
+    object_data = {"object_name": "site", "ip_list": db.load_object_hosts("site"),
+                   "telegram_token": "token", "telegram_chat_ids": ["1"]}
+    monitor = processing.ObjectMonitor(object_data, 3, None, RecordingNotifier())
+    monitor._schedule_hosts()
+
+    async def run():
+        await monitor._process_results(dict.fromkeys(HOSTS[:5], GOOD))
+        for result in [GOOD] * 20 + [GOOD, GOOD, UNREACHABLE] * 10 + [GOOD]:
+            await monitor._process_results({"10.0.0.4": result})
+        for _ in range(4):
+            await monitor._process_results({"10.0.0.2": UNREACHABLE, "10.0.0.5": UNREACHABLE})
+        await monitor._process_results({"10.0.0.3": UNREACHABLE})
+
+    asyncio.run(run())
+    status_api.register_monitor(monitor)
+    status_api._cache.clear()
+    yield monitor
+    status_api.unregister_monitor(monitor)
+    status_api._cache.clear()
+
+
+def _get(path, **params):
+    status, content_type, body = metrics._ROUTES[path]({key: str(value) for key, value in params.items()})
+    assert content_type.startswith("application/json")
+    return status, json.loads(body)
+
+
+def _ips(**params):
+    status, data = _get("/status/hosts", **params)
+    assert status == "200 OK"
+    return [host["ip"] for host in data["hosts"]]
+
+
+def test_summary_counts_hosts_by_state(monitor):
+    status, data = _get("/status")
+    assert status == "200 OK"
+    assert data["objects"] == [{
+        "object": "site", "hosts": 6, "up": 3, "down": 1, "suspect": 1, "unknown": 1,
+        "via_parent": 1, "degraded": 1, "delay": 3, "config_version": monitor.config_version,
+    }]
+
+
+def test_summary_unknown_object_is_not_found(monitor):
+    status, data = _get("/status", object="other")
+    assert status == "404 Not Found"
+    assert "other" in data["error"]
+
+
+@pytest.mark.parametrize("state, ips", [
+    ("up", ["10.0.0.1", "10.0.0.4", "10.0.0.5"]),
+    ("down", ["10.0.0.2"]),
+    ("suspect-down", ["10.0.0.3"]),
+    ("suspect", ["10.0.0.3"]),
+    ("unknown", ["10.0.0.6"]),
+    ("via-parent", ["10.0.0.5"]),
+    ("degraded", ["10.0.0.4"]),
+    ("down,via-parent", ["10.0.0.2", "10.0.0.5"]),
+])
+def test_hosts_state_filter(monitor, state, ips):
+    assert sorted(_ips(state=state)) == ips
+
+
+def test_hosts_via_parent_and_degraded_fields(monitor):
+    hosts = {host["ip"]: host for host in _get("/status/hosts")[1]["hosts"]}
+    assert hosts["10.0.0.5"]["via_parent"] and not hosts["10.0.0.2"]["via_parent"]
+    assert hosts["10.0.0.4"]["degraded"] and hosts["10.0.0.4"]["state"] == "up"
+    assert hosts["10.0.0.1"]["rtt"] == 10.0
+    assert hosts["10.0.0.6"]["since"] is None and hosts["10.0.0.6"]["state"] == "unknown"
+
+
+def test_hosts_ip_and_object_filters(monitor):
+    assert _ips(ip="10.0.0.2") == ["10.0.0.2"]
+    assert _ips(ip="10.9.9.9") == []
+    assert _ips(ip="10.0.0.2", state="up") == []
+    assert len(_ips(object="site")) == 6
+    status, _ = _get("/status/hosts", object="other")
+    assert status == "404 Not Found"
+
+
+def test_hosts_limit_keeps_total(monitor):
+    status, data = _get("/status/hosts", limit=2)
+    assert len(data["hosts"]) == 2 and data["total"] == 6
+    status, data = _get("/status/hosts", limit=0)
+    assert len(data["hosts"]) == 6
+    status, data = _get("/status/hosts", limit="many")
+    assert status == "400 Bad Request"
+
+
+def test_hosts_unknown_state_is_rejected(monitor):
+    status, data = _get("/status/hosts", state="up,sleeping")
+    assert status == "400 Bad Request"
+    assert "sleeping" in data["error"]
@@ -0,0 +1,30 @@
+import pytest
+import supervisor
+from targets import HostSet, parse_target
+
+
+def test_host_set_rejects_too_many_hosts():
+    with pytest.raises(ValueError):
+        HostSet([parse_target("10.0.0.0/8")])
+
+
+def test_save_object_config_rejects_too_many_hosts(db):
+    with pytest.raises(ValueError):
+        db.save_object_config("big", ["10.0.0.0/8"], "token", ["1"], 10)
+    assert db.load_object_config("big") is None
+
+
+def test_import_rejects_too_many_hosts_in_total(db):
+    rows = [{"object_name": "big", "target": "10.0.0.0/12", "telegram_token": "t", "telegram_chat_ids": "1"},
+            {"object_name": "big", "target": "10.16.0.0/12"}]
+    with pytest.raises(ValueError):
+        db.import_object_rows(rows)
+    assert db.load_object_config("big") is None
+
+
+def test_supervisor_skips_object_that_cannot_be_loaded(db):
+    db.save_object_config("small", ["10.0.0.0/30"], "token", ["1"], 10)
+    db.save_object_config("big", ["10.1.0.0/30"], "token", ["1"], 10)
+    # Объект, сохраненный до появления проверки
+    db.save_object_targets("big", [parse_target("11.0.0.0/8")])
+    assert [object_data["object_name"] for object_data in supervisor.load_all_objects()] == ["small"]
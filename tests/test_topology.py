@@ -0,0 +1,82 @@
+import asyncio
+import processing
+from probe import ProbeEngine
+from test_probe import FakeNetwork, echo_reply
+from test_processing import RecordingNotifier, _statuses
+
+PARENT = "10.0.0.1"
+CHILDREN = ["10.0.0.2", "10.0.0.3"]
+HOSTS = [PARENT] + CHILDREN
+
+
+def _monitor(db, network):
+    db.save_object_config("site", HOSTS, "token", ["1"], 2)
+    for ip in CHILDREN:
+        db.set_host_parent(ip, "site", PARENT)
+    object_data = {"object_name": "site", "ip_list": HOSTS, "telegram_token": "token", "telegram_chat_ids": ["1"]}
+    monitor = processing.ObjectMonitor(object_data, 2, ProbeEngine(timeout=0.05, sock=network), RecordingNotifier())
+    monitor._schedule_hosts()
+    return monitor
+
+
+def _network():
+    network = FakeNetwork(lambda ip, identifier, sequence: [(ip, echo_reply(identifier, sequence))]
+                          if ip not in network.down else [])
+    network.down = set()
+    return network
+
+
+async def _scheduled(monitor, network):
+    """Плановая проверка всех хостов и подтверждение изменений. Возвращает хосты, которым отправлены запросы."""
+    network.sent.clear()
+    await monitor._probe_batch(HOSTS)
+    while monitor.tracker.suspects():
+        await monitor._process_results(await monitor._timed_sweep(
+            monitor._with_parents(monitor.tracker.suspects()), "confirm"))
+    return {ip for ip, _, _ in network.sent}
+
+
+def test_down_parent_blocks_children_until_it_recovers(db):
+    network = _network()
+    monitor = _monitor(db, network)
+
+    async def run():
+        await _scheduled(monitor, network)
+        network.down = set(HOSTS)
+        await _scheduled(monitor, network)
+        assert monitor.unreachable_via_parent == set(CHILDREN)
+        assert await _scheduled(monitor, network) == {PARENT}
+        assert db.load_ip_statuses("site") == {PARENT: "недоступен", **dict.fromkeys(CHILDREN, processing.VIA_PARENT_STATUS)}
+
+        network.down = set()
+        await _scheduled(monitor, network)
+        assert not monitor.unreachable_via_parent
+        assert await _scheduled(monitor, network) == set(HOSTS)
+
+    asyncio.run(run())
+    messages = monitor.notifier.messages
+    assert _statuses(messages) == ["нет соединения! ⛔", "соединение восстановлено! ✅"]
+    assert messages[0].startswith(f"{PARENT}: ") and messages[0].endswith("Недоступны через этот узел: 2")
+    assert db.load_ip_statuses("site") == dict.fromkeys(HOSTS, "доступен")
+    monitor.engine.close()
+
+
+def test_via_parent_state_survives_restart(db):
+    network = _network()
+    monitor = _monitor(db, network)
+
+    async def run():
+        await _scheduled(monitor, network)
+        network.down = set(HOSTS)
+        await _scheduled(monitor, network)
+
+    asyncio.run(run())
+    monitor.save_state()
+    monitor.engine.close()
+
+    restarted = _monitor(db, _network())
+    assert restarted.restore_state()
+    restarted._schedule_hosts()
+    assert restarted.unreachable_via_parent == set(CHILDREN)
+    assert restarted.tracker.state_of(PARENT) == processing.DOWN
+    restarted.engine.close()
@@ -0,0 +1,49 @@
+import logging
+
+
+class Topology:
+    """Зависимости хостов объекта: каждый хост может иметь один родительский узел
+    (например, коммутатор или канал связи), через который он доступен.
+
+    Циклические зависимости не допускаются: ребро, замыкающее цикл, отбрасывается.
+    """
+
+    def __init__(self, parents=None):
+        self.parents = {}
+        self.children = {}
+        for child, parent in (parents or {}).items():
+            if not parent or parent == child:
+                continue
+            if child in self._ancestors_of(parent, include_self=True):
+                logging.warning(f"Циклическая зависимость {child} -> {parent} проигнорирована.")
+                continue
+            self.parents[child] = parent
+            self.children.setdefault(parent, []).append(child)
+
+    def __bool__(self):
+        return bool(self.parents)
+
+    def _ancestors_of(self, ip, include_self=False):
+        chain = [ip] if include_self else []
+        parent = self.parents.get(ip)
+        while parent is not None:
+            chain.append(parent)
+            parent = self.parents.get(parent)
+        return chain
+
+    def ancestors(self, ip):
+        """Родительские узлы хоста от ближайшего к корневому."""
+        return self._ancestors_of(ip)
+
+    def depth(self, ip):
+        return len(self._ancestors_of(ip))
+
+    def descendants(self, ip):
+        """Все хосты, доступные только через данный узел."""
+        result = []
+        stack = list(self.children.get(ip, ()))
+        while stack:
+            child = stack.pop()
+            result.append(child)
+            stack.extend(self.children.get(child, ()))
+        return result